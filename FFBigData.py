@@ -1,47 +1,24 @@
-import tbapy
 import csv
 from tqdm import tqdm
-from dotenv import load_dotenv
-import os
 from concurrent.futures import ThreadPoolExecutor
-from functools import lru_cache
 import queue
 import threading
 import time
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util import Retry
 import concurrent.futures
 from cachetools import TTLCache, cached
 from collections import defaultdict
+import tba_utils
+from tba_utils import tba, iter_teams, batched, get_executor
+from compact_records import compact_matches, compact_awards, team_ids
+from team_registry import registry
+from slff_score_cache import EventScore, EventScoreCache, NO_SCORE
+from profiling import timed, take_timings, add_timings
 
 def log_progress(message):
     """Unified logging function"""
     tqdm.write(f"[{time.strftime('%H:%M:%S')}] {message}")
 
-# Load environment variables and initialize TBA client
-load_dotenv()
-tba_key = os.getenv("TBAKEY")
-if not tba_key:
-    raise Exception("TBA API key not found in environment variables")
-log_progress(f"Loaded TBA API key: {tba_key[:4]}...")  # Only show first 4 chars for security
-tba = tbapy.TBA(tba_key)
-
-# Configure retry strategy
-retry_strategy = Retry(
-    total=3,
-    backoff_factor=0.5,
-    status_forcelist=[429, 500, 502, 503, 504],
-)
-adapter = HTTPAdapter(
-    max_retries=retry_strategy,
-    pool_connections=25,
-    pool_maxsize=25
-)
-tba.session.mount("http://", adapter)
-tba.session.mount("https://", adapter)
-
-# Define YEARS at the top level
+# Default scoring window, most recent first; main(years=...) scores another without changing it
 YEARS = [2024, 2023, 2022]
 
 CHAMPS_AWARD_VALUES = {
@@ -85,62 +62,73 @@ REGULAR_AWARD_VALUES = {
     14: 0
 }
 
+# Events per scoring task sent to the process pool
+SHARD_SIZE = 10
+
+# Bump whenever the scoring rules above change, so cached event scores are recomputed
+# (2: district points computed locally by district_points instead of read from TBA)
+SCORE_VERSION = 2
+
 # Create a queue for CSV writing
 results_queue = queue.Queue()
 
-# Add batch processing for API calls
+class IncompleteBatch(Exception):
+    """Some of a batch's data couldn't be fetched; `rows` are the rows built from what could"""
+
+    def __init__(self, failures, rows):
+        super().__init__(f"{len(failures)} fetches failed: " + '; '.join(failures[:5]))
+        self.failures = failures
+        self.rows = rows
+
+# The fetchers raise once the client's retries are used up, so failures aren't cached
 @cached(cache=TTLCache(maxsize=2000, ttl=3600))
 def get_team_info(team):
-    """Get team info with retry logic"""
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            time.sleep(0.02)  # Add small delay to avoid rate limiting
-            return tba.team(team)
-        except Exception as e:
-            if attempt == max_retries - 1:
-                tqdm.write(f"Failed to get team info for {team} after {max_retries} attempts: {str(e)}")
-                return None
-            time.sleep(1 * (attempt + 1))  # Exponential backoff
-
-def safe_api_call(func, *args, **kwargs):
-    """Generic function for safe API calls with retry logic"""
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            time.sleep(0.02)  # Add small delay to avoid rate limiting
-            return func(*args, **kwargs)
-        except Exception as e:
-            if attempt == max_retries - 1:
-                tqdm.write(f"Failed API call after {max_retries} attempts: {str(e)}")
-                return None
-            time.sleep(1 * (attempt + 1))
+    """Get team info; the client paces and retries requests"""
+    return tba.team(team)
 
-# Update other API calling functions to use safe_api_call
 @cached(cache=TTLCache(maxsize=1000, ttl=3600))
 def get_team_events(team, year):
-    return safe_api_call(tba.team_events, team, year=year) or []
+    return tba.team_events(team, year=year) or []
+
+# The event fetchers raise once the client's retries are used up, rather than
+# returning nothing, so a failed fetch is neither cached here nor scored as an
+# empty event; batch_get_event_data() records it instead. tba_structs (msgspec),
+# district_points, change_feed and the process pool are imported where they're
+# used, keeping this module (and everything importing it) cheap to import
 
 @cached(cache=TTLCache(maxsize=1000, ttl=3600))
-def get_event_district_points(event_key):
-    try:
-        result = safe_api_call(tba.event_district_points, event_key)
-        return result.get('points', {}) if result else {}
-    except (KeyError, TypeError, tbapy.TBAError) as e:
-        tqdm.write(f"Error getting district points for {event_key}: {str(e)}")
-        return {}
+def get_event_rankings(event_key):
+    """Team IDs in rank order; district points are computed from these locally"""
+    import tba_structs
+    rankings = tba_structs.event_rankings(tba, event_key) or []
+    return team_ids(row['team_key'] for row in sorted(rankings, key=lambda row: row['rank'] or 0))
+
+def add_district_points(events, event_cache):
+    """Fill in each event's SLFF district points: qualification plus alliance selection points"""
+    from district_points import season_points
+    points = season_points([(event, event_cache[event['key']]) for event in events],
+                           components=('qual', 'alliance'))
+    for event in events:
+        event_cache[event['key']]['district_points'] = {
+            team: team_points.qual_points + team_points.alliance_points
+            for team, team_points in points[event['key']].items()}
 
 @cached(cache=TTLCache(maxsize=1000, ttl=3600))
 def get_event_matches(event_key):
-    return safe_api_call(tba.event_matches, event_key) or []
+    # Compact at ingest so full match JSON (score breakdowns, videos) is never held on to
+    import tba_structs
+    return compact_matches(tba_structs.event_matches(tba, event_key))
 
 @cached(cache=TTLCache(maxsize=1000, ttl=3600))
 def get_event_awards(event_key):
-    return safe_api_call(tba.event_awards, event_key) or []
+    import tba_structs
+    return compact_awards(tba_structs.event_awards(tba, event_key))
 
 @cached(cache=TTLCache(maxsize=1000, ttl=3600))
 def get_event_alliances(event_key):
-    return safe_api_call(tba.event_alliances, event_key) or []
+    import tba_structs
+    alliances = tba_structs.event_alliances(tba, event_key) or []
+    return [team_ids(alliance['picks']) for alliance in alliances]
 
 @cached(cache=TTLCache(maxsize=1000, ttl=3600))
 def has_valid_events(team, year):
@@ -162,9 +150,15 @@ def score_award(tba_award, tba_event_type):
     return 0
 
 def csv_writer_thread(filename, header):
-    """Separate thread for writing to CSV"""
+    """Separate thread for writing to CSV.
+
+    Rows arrive on results_queue until "DONE", or "INCOMPLETE" when some teams
+    couldn't be scored; the change feed then lists them as skipped, not deleted.
+    """
+    from change_feed import ChangeFeed
     log_progress(f"Starting CSV writer thread for {filename}")
     rows_written = 0
+    feed = ChangeFeed(filename, header, ['Team Number'])
     
     with open(filename, 'w', newline='', encoding='utf-8') as file:
         writer = csv.writer(file)
@@ -173,11 +167,13 @@ def csv_writer_thread(filename, header):
         while True:
             try:
                 result = results_queue.get(timeout=10)
-                if result == "DONE":
+                if result in ("DONE", "INCOMPLETE"):
                     log_progress(f"CSV writer completed. Total rows written: {rows_written}")
+                    partial = result == "INCOMPLETE"
                     break
                 if result:
                     writer.writerow(result)
+                    feed.add(result)
                     file.flush()
                     rows_written += 1
                     if rows_written % 100 == 0:  # Log progress every 100 rows
@@ -188,94 +184,162 @@ def csv_writer_thread(filename, header):
                 continue
             except Exception as e:
                 log_progress(f"Error writing to CSV: {str(e)}")
+    feed.close(partial=partial)
 
-def get_active_teams():
-    """Get active teams with retry logic"""
-    max_retries = 3
-    retry_delay = 5  # seconds
-    
-    for attempt in range(max_retries):
-        try:
-            log_progress(f"Attempting to fetch teams (attempt {attempt + 1}/{max_retries})")
-            log_progress("Making API call to TBA for active teams...")
-            teams = tba.teams(year=2025, keys=True)
-            
-            if not teams:
-                log_progress("Warning: TBA returned an empty team list")
-                raise Exception("Received empty team list from TBA")
-            
-            rookie_teams = len([t for t in teams if t.startswith('frc2024') or t.startswith('frc2025')])
-            log_progress(f'Successfully found {len(teams)} active teams ({rookie_teams} rookie teams)')
-            log_progress(f'Sample of teams found: {", ".join(sorted(teams)[:5])}...')
-            
-            # Verify the data looks correct
-            if not all(t.startswith('frc') for t in teams):
-                log_progress("Warning: Some team keys don't start with 'frc'")
-            
-            return teams
-            
-        except requests.exceptions.RequestException as e:
-            log_progress(f"Network error while fetching teams: {str(e)}")
-            log_progress(f"Request URL: {tba.URL}/teams/{2025}/keys")
-            if attempt < max_retries - 1:
-                log_progress(f"Waiting {retry_delay} seconds before retry...")
-                time.sleep(retry_delay)
-            else:
-                raise Exception(f"Failed to fetch teams after {max_retries} attempts: {str(e)}")
-                
-        except Exception as e:
-            log_progress(f"Unexpected error while fetching teams: {str(e)}")
-            if attempt < max_retries - 1:
-                log_progress(f"Waiting {retry_delay} seconds before retry...")
-                time.sleep(retry_delay)
-            else:
-                raise Exception(f"Failed to fetch teams after {max_retries} attempts: {str(e)}")
-    
-    raise Exception("Failed to fetch teams after all retries")
+def iter_active_teams(window=4, years=None):
+    """Stream the keys of teams active after the `years` window (default: YEARS) page by page"""
+    years = years or YEARS
+    log_progress("Streaming active teams from TBA...")
+    team_count = 0
+    rookie_teams = 0
+
+    # Active teams are those registered for the season after the most recent scored one
+    for team in iter_teams(tba, year=max(years) + 1, keys=True, window=window):
+        # Verify the data looks correct
+        if not team.startswith('frc'):
+            log_progress(f"Warning: Team key {team} doesn't start with 'frc'")
+        team_count += 1
+        if team.startswith('frc2024') or team.startswith('frc2025'):
+            rookie_teams += 1
+        yield team
+
+    if not team_count:
+        log_progress("Warning: TBA returned an empty team list")
+        raise Exception("Received empty team list from TBA")
+    log_progress(f'Successfully found {team_count} active teams ({rookie_teams} rookie teams)')
 
-def process_team_batch(teams):
-    """Process a batch of teams more efficiently"""
+def process_team_batch(teams, scoring_pool, score_cache, years=None):
+    """Fetch and score the events a batch of teams attended, and return each team's BIG DATA row.
+
+    Rows cover the `years` window (default: YEARS). Events already in the
+    score cache aren't fetched or scored again. If any
+    fetch failed, IncompleteBatch is raised after scoring, carrying the rows
+    built from what did arrive; scores of fully fetched events are stored either way.
+    """
     log_progress(f"Processing batch of {len(teams)} teams...")
-    results = []
-    event_cache = {}
+    years = years or YEARS
+    failures = []
     
-    # Collect all event keys first
-    all_event_keys = set()
+    # Collect all events first
+    all_events = {}
     team_events_map = {}
     
     for team in tqdm(teams, desc="Collecting team events", leave=False):
         team_events = []
-        for year in YEARS:
-            year_events = get_team_events(team, year)
-            team_events.extend([(event, year) for event in year_events if event['event_type'] in [0, 1]])
+        for year in years:
+            try:
+                year_events = get_team_events(team, year)
+            except Exception as e:
+                log_progress(f"Failed to get {year} events for team {team}: {str(e)}")
+                failures.append(f"{team} {year} events")
+                year_events = []
+            team_events.extend([(compact_event(event), year) for event in year_events if event['event_type'] in [0, 1]])
         team_events_map[team] = team_events
-        all_event_keys.update(event['key'] for event, _ in team_events)
+        all_events.update((event['key'], event) for event, _ in team_events)
     
-    # Batch fetch all event data
-    if all_event_keys:
-        event_cache = batch_get_event_data(all_event_keys)
+    event_scores = score_cache.get_many(all_events)
+    new_events = [event for event_key, event in all_events.items() if event_key not in event_scores]
+    log_progress(f"{len(event_scores)} events already scored, {len(new_events)} to score")
+    if new_events:
+        scores, failed_events = score_new_events(new_events, scoring_pool, score_cache)
+        event_scores.update(scores)
+        failures.extend(f"{event_key} data" for event_key in failed_events)
+    info_futures = [get_executor().submit(get_team_info, team) for team in teams]
     
-    # Process teams using cached event data
-    log_progress("Processing individual teams...")
-    for team in tqdm(teams, desc="Processing teams", leave=False):
-        result = process_team_with_cache(team, team_events_map[team], event_cache)
+    results = []
+    for team, info_future in zip(teams, info_futures):
+        try:
+            team_info = info_future.result()
+        except Exception as e:
+            log_progress(f"Failed to get info for team {team}: {str(e)}")
+            failures.append(f"{team} info")
+            continue
+        team_event_scores = {event['key']: event_scores.get(event['key'], {}).get(team, NO_SCORE)
+                             for event, _ in team_events_map[team]}
+        result = process_team_with_cache(team, team_info['nickname'], team_events_map[team], team_event_scores,
+                                         years)
         if result:
-            results_queue.put(result)
+            results.append(result)
     
     log_progress(f"Completed batch processing for {len(teams)} teams")
+    if failures:
+        raise IncompleteBatch(failures, results)
     return results
 
-def process_team_with_cache(team, team_events, event_cache):
-    """Process a single team using cached event data"""
+def score_new_events(events, scoring_pool, score_cache):
+    """Fetch and score events in the process pool, storing the results in the score cache.
+
+    Returns ({event key: {team key: EventScore}}, keys of events with a failed
+    fetch). Those are scored from what did arrive for this run only, and
+    aren't stored, so the next run fetches them again.
+    """
+    event_cache = batch_get_event_data([event['key'] for event in events])
+    add_district_points(events, event_cache)
+    
+    # Split the events into small shards so every core has work, and only ship
+    # each shard the compact tables for its own events
+    futures = [scoring_pool.submit(score_event_shard,
+                                   [(event, compact_event_data(event_cache[event['key']])) for event in shard])
+               for shard in batched(events, SHARD_SIZE)]
+    
+    event_scores = {}
+    failed = []
+    for future in futures:
+        shard_scores, worker_timings = future.result()
+        add_timings(worker_timings)
+        for event, team_scores in shard_scores:
+            # Worker processes return the IDs they were shipped; store by team key
+            team_scores = {registry.key(team_id): score for team_id, score in team_scores.items()}
+            if event_cache[event['key']]['fetch_failed']:
+                log_progress(f"Not storing scores for {event['key']}: some of its data couldn't be fetched")
+                failed.append(event['key'])
+            else:
+                score_cache.put(event, team_scores)
+            event_scores[event['key']] = team_scores
+    return event_scores, failed
+
+def compact_event(event):
+    """Keep only the event fields scoring reads"""
+    return {key: event[key] for key in ('key', 'year', 'event_type', 'end_date')}
+
+def compact_event_data(event_data):
+    """Reduce fetched event data to the parts scoring reads.
+
+    Matches, awards and alliances are already compact records from ingest;
+    qualification matches are dropped here since only playoffs are scored.
+    """
+    return {
+        'district_points': event_data.get('district_points') or {},
+        'matches': [match for match in event_data.get('matches') or [] if match.comp_level != 'qm'],
+        'alliances': event_data.get('alliances') or [],
+        'awards': event_data.get('awards') or [],
+    }
+
+def score_event_shard(shard):
+    """Score a shard in a worker process; returns its scores and the worker's timings (see take_timings)"""
+    return score_events(shard), take_timings()
+
+@timed
+def score_events(shard):
+    """Score every team at each (event, event data) in a shard"""
+    results = []
+    for event, event_data in shard:
+        teams = set(event_data['district_points'])
+        teams.update(team for match in event_data['matches'] for team in match.red + match.blue)
+        teams.update(team for picks in event_data['alliances'] for team in picks)
+        teams.update(team for award in event_data['awards'] for team in award.teams)
+        team_scores = {}
+        for team_id in teams:
+            score = event_components(team_id, event, event_data)
+            if score != NO_SCORE:
+                team_scores[team_id] = score
+        results.append((event, team_scores))
+    return results
+
+def process_team_with_cache(team, team_name, team_events, event_scores, years=None):
+    """Assemble a team's row from its per-event scores ({event key: EventScore})"""
+    years = years or YEARS
     try:
-        team_info = get_team_info(team)
-        if not team_info:
-            log_progress(f"Failed to get info for team {team}")
-            return None
-            
-        team_name = team_info['nickname']
-        log_progress(f"Processing team {team} ({team_name})")
-        
         # Initialize score tracking
         team_scores = defaultdict(int)  # First two events only
         full_year_scores = defaultdict(int)  # All events
@@ -286,41 +350,32 @@ def process_team_with_cache(team, team_events, event_cache):
         engineering_awards = defaultdict(int)
         robot_awards = defaultdict(int)
         sustainability_awards = defaultdict(int)
+        award_counters = (impact_awards, engineering_awards, robot_awards, sustainability_awards)
         years_with_participation = set()
         
         # Process events by year, sorting by date
-        for year in YEARS:
+        for year in years:
             year_events = [(event, year) for event, yr in team_events if yr == year]
             # Sort events by end_date
-            year_events.sort(key=lambda x: x[0]['end_date'])
+            year_events.sort(key=lambda x: x[0]['end_date'] or '')
             
             # Process only first two events for regular scoring
             for event, _ in year_events[:2]:
-                event_key = event['key']
-                if event_cache[event_key]:
-                    score = process_event_with_cache(
-                        team, event, event_cache[event_key],
-                        impact_awards, engineering_awards,
-                        robot_awards, sustainability_awards, year
-                    )
-                    team_scores[year] += score
-                    event_counts[year] += 1
-                    years_with_participation.add(year)
+                score = event_scores[event['key']]
+                add_award_counts(score, award_counters, year)
+                team_scores[year] += score.total
+                event_counts[year] += 1
+                years_with_participation.add(year)
             
             # Process all events for full year average
             for event, _ in year_events:
-                event_key = event['key']
-                if event_cache[event_key]:
-                    score = process_event_with_cache(
-                        team, event, event_cache[event_key],
-                        impact_awards, engineering_awards,
-                        robot_awards, sustainability_awards, year
-                    )
-                    full_year_scores[year] += score
-                    full_year_event_counts[year] += 1
+                score = event_scores[event['key']]
+                add_award_counts(score, award_counters, year)
+                full_year_scores[year] += score.total
+                full_year_event_counts[year] += 1
         
         # Calculate averages
-        for year in YEARS:
+        for year in years:
             if event_counts[year] > 0:
                 team_scores[year] = team_scores[year] / event_counts[year]
             if full_year_event_counts[year] > 0:
@@ -331,65 +386,65 @@ def process_team_with_cache(team, team_events, event_cache):
                           len(years_with_participation)) if years_with_participation else 0
         
         # Calculate full year average score
-        full_year_avg = (sum(full_year_scores[year] for year in YEARS if full_year_event_counts[year] > 0) / 
-                        sum(1 for year in YEARS if full_year_event_counts[year] > 0)) if any(full_year_event_counts.values()) else 0
+        full_year_avg = (sum(full_year_scores[year] for year in years if full_year_event_counts[year] > 0) / 
+                        sum(1 for year in years if full_year_event_counts[year] > 0)) if any(full_year_event_counts.values()) else 0
         
         # Format all numerical values to one decimal place
-        return [
-            team[3:], team_name, 
-            round(total_avg_score, 1),
-            round(team_scores[2024], 1), round(team_scores[2023], 1), round(team_scores[2022], 1),
-            impact_awards[2024], impact_awards[2023], impact_awards[2022],  # Award counts remain as integers
-            engineering_awards[2024], engineering_awards[2023], engineering_awards[2022],
-            robot_awards[2024], robot_awards[2023], robot_awards[2022],
-            sustainability_awards[2024], sustainability_awards[2023], sustainability_awards[2022],
-            round(full_year_avg, 1),
-            round(full_year_scores[2024], 1), round(full_year_scores[2023], 1), round(full_year_scores[2022], 1)
-        ]
+        return ([team[3:], team_name, round(total_avg_score, 1)] +
+                [round(team_scores[year], 1) for year in years] +
+                # Award counts remain as integers
+                [impact_awards[year] for year in years] +
+                [engineering_awards[year] for year in years] +
+                [robot_awards[year] for year in years] +
+                [sustainability_awards[year] for year in years] +
+                [round(full_year_avg, 1)] +
+                [round(full_year_scores[year], 1) for year in years])
             
     except Exception as e:
         tqdm.write(f"Error processing team {team}: {str(e)}")
         return None
 
-def process_event_with_cache(team, event, event_data, impact_awards, engineering_awards, robot_awards, sustainability_awards, year):
-    """Process a single event for a team using cached event data"""
-    score = 0
-    event_key = event['key']
-    
+def add_award_counts(score, award_counters, year):
+    impact_awards, engineering_awards, robot_awards, sustainability_awards = award_counters
+    impact_awards[year] += score.impact
+    engineering_awards[year] += score.engineering
+    robot_awards[year] += score.robot
+    sustainability_awards[year] += score.sustainability
+
+@timed(sample_every=16)
+def event_components(team, event, event_data):
+    """Score a single event for a team, keeping each SLFF component separate"""
     # Process district points
-    event_points = event_data.get('district_points', {})
-    if team in event_points:
-        score += event_points[team]['alliance_points'] + event_points[team]['qual_points']
+    district_points = event_data.get('district_points', {}).get(team, 0)
     
     # Process matches using cached match data
+    playoff_points = 0
     matches = event_data.get('matches', [])
     if matches:
         if event['year'] <= 2022:  # single elims
-            score += process_matches_single_elim(team, matches)
+            playoff_points = process_matches_single_elim(team, matches)
         else:  # double elims (2023 and later)
-            score += process_matches_double_elim(team, matches, event_data.get('alliances', []))
+            playoff_points = process_matches_double_elim(team, matches, event_data.get('alliances', []))
     
     # Process awards using cached award data
+    award_points = 0
+    award_counts = [defaultdict(int) for _ in range(4)]
     awards = event_data.get('awards', [])
     if awards:
-        score += process_awards_with_cache(team, awards, event['event_type'], 
-                                         impact_awards, engineering_awards, 
-                                         robot_awards, sustainability_awards, year)
+        award_points = process_awards_with_cache(team, awards, event['event_type'], *award_counts, 0)
     
-    return score
+    return EventScore(district_points, playoff_points, award_points,
+                      *(counts[0] for counts in award_counts))
 
 def process_matches_single_elim(team, matches):
     """Process matches for single elimination format"""
     score = 0
     comp_level = ["f", "sf", "qf"]
     for current_match in matches:
-        if current_match['comp_level'] in comp_level:
-            red_alliance = current_match["alliances"]["red"]["team_keys"]
-            blue_alliance = current_match["alliances"]["blue"]["team_keys"]
-
-            if current_match['winning_alliance'] == 'red' and team in red_alliance:
+        if current_match.comp_level in comp_level:
+            if current_match.winner == 'red' and team in current_match.red:
                 score += 5
-            elif current_match['winning_alliance'] == 'blue' and team in blue_alliance:
+            elif current_match.winner == 'blue' and team in current_match.blue:
                 score += 5
     return score
 
@@ -401,27 +456,20 @@ def process_matches_double_elim(team, matches, alliances):
     match_11_teams = []
 
     for current_match in matches:
-        if current_match['comp_level'] in comp_level:
-            red_alliance = current_match["alliances"]["red"]["team_keys"]
-            blue_alliance = current_match["alliances"]["blue"]["team_keys"]
-            
-            if current_match['comp_level'] == 'sf' and current_match['set_number'] == 11:
-                match_11_teams.extend([
-                    current_match["alliances"]["red"]["team_keys"][0],
-                    current_match["alliances"]["blue"]["team_keys"][0]
-                ])
+        if current_match.comp_level in comp_level:
+            if current_match.comp_level == 'sf' and current_match.set_number == 11:
+                match_11_teams.extend([current_match.red[0], current_match.blue[0]])
 
-            if current_match['winning_alliance'] == 'red' and team in red_alliance:
+            if current_match.winner == 'red' and team in current_match.red:
                 score += points_per_win
-            elif current_match['winning_alliance'] == 'blue' and team in blue_alliance:
+            elif current_match.winner == 'blue' and team in current_match.blue:
                 score += points_per_win
 
     # bonus points to the alliances in upper bracket finals
     if match_11_teams and alliances:
-        for alliance in alliances:
-            if (match_11_teams[0] in alliance['picks'] or 
-                match_11_teams[1] in alliance['picks']):
-                if team in alliance['picks']:
+        for picks in alliances:
+            if match_11_teams[0] in picks or match_11_teams[1] in picks:
+                if team in picks:
                     score += points_per_win
     
     return score
@@ -431,94 +479,124 @@ def process_awards_with_cache(team, awards, event_type, impact_awards, engineeri
     score = 0
     
     for award in awards:
-        for recipient in award['recipient_list']:
-            if recipient['team_key'] == team:
-                if award['award_type'] == 0:
-                    impact_awards[year] += 1
-                elif award['award_type'] == 9:
-                    engineering_awards[year] += 1
-                elif award['award_type'] in [20, 71, 17, 29, 16, 21]:
-                    robot_awards[year] += 1
-                elif award['award_type'] == 82:
-                    sustainability_awards[year] += 1
-                score += score_award(award['award_type'], event_type)
+        if team in award.teams:
+            if award.award_type == 0:
+                impact_awards[year] += 1
+            elif award.award_type == 9:
+                engineering_awards[year] += 1
+            elif award.award_type in [20, 71, 17, 29, 16, 21]:
+                robot_awards[year] += 1
+            elif award.award_type == 82:
+                sustainability_awards[year] += 1
+            score += score_award(award.award_type, event_type)
     
     return score
 
 # Batch API calls for events
 def batch_get_event_data(event_keys):
-    """Batch fetch event data to reduce API calls"""
+    """Batch fetch event data to reduce API calls.
+
+    Data that couldn't be fetched is left empty, and the event's
+    'fetch_failed' is set so its scores aren't kept beyond this run.
+    """
     log_progress(f"Fetching data for {len(event_keys)} events...")
-    event_data = defaultdict(dict)
+    event_data = defaultdict(lambda: {'fetch_failed': False})
     
-    # Parallel fetch of different data types
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        log_progress("Starting parallel data fetch...")
-        # Create futures for different types of data
-        futures = {
-            'district_points': {event_key: executor.submit(get_event_district_points, event_key) 
-                              for event_key in event_keys},
-            'matches': {event_key: executor.submit(get_event_matches, event_key) 
-                       for event_key in event_keys},
-            'awards': {event_key: executor.submit(get_event_awards, event_key) 
-                      for event_key in event_keys},
-            'alliances': {event_key: executor.submit(get_event_alliances, event_key) 
-                         for event_key in event_keys}
-        }
-        
-        # Collect results with progress tracking
-        for data_type, future_dict in futures.items():
-            log_progress(f"Processing {data_type} data...")
-            for event_key, future in tqdm(future_dict.items(), 
-                                        desc=f"Fetching {data_type}",
-                                        leave=False):
-                try:
-                    event_data[event_key][data_type] = future.result()
-                except Exception as e:
-                    log_progress(f"Error fetching {data_type} for {event_key}: {str(e)}")
-                    event_data[event_key][data_type] = None
+    # Parallel fetch of different data types on the shared worker pool
+    executor = get_executor()
+    log_progress("Starting parallel data fetch...")
+    # Create futures for different types of data
+    futures = {
+        'rankings': {event_key: executor.submit(get_event_rankings, event_key)
+                     for event_key in event_keys},
+        'matches': {event_key: executor.submit(get_event_matches, event_key) 
+                   for event_key in event_keys},
+        'awards': {event_key: executor.submit(get_event_awards, event_key) 
+                  for event_key in event_keys},
+        'alliances': {event_key: executor.submit(get_event_alliances, event_key) 
+                     for event_key in event_keys}
+    }
+    
+    # Collect results with progress tracking
+    for data_type, future_dict in futures.items():
+        log_progress(f"Processing {data_type} data...")
+        for event_key, future in tqdm(future_dict.items(), 
+                                    desc=f"Fetching {data_type}",
+                                    leave=False):
+            try:
+                event_data[event_key][data_type] = future.result()
+            except Exception as e:
+                log_progress(f"Error fetching {data_type} for {event_key}: {str(e)}")
+                event_data[event_key][data_type] = []
+                event_data[event_key]['fetch_failed'] = True
     
     log_progress("Completed event data fetch")
     return event_data
 
-def main():
+def build_header(years):
+    """Build the BIG DATA.csv header for the given seasons, most recent first"""
+    return (['Team Number', 'Team Name', 'Avg SLFF Points'] +
+            [f'{year} Avg SLFF' for year in years] +
+            [f'{year} Impact' for year in years] +
+            [f'{year} EI' for year in years] +
+            [f'{year} Robot' for year in years] +
+            [f'{year} Sustainability' for year in years] +
+            ['Full Year Avg SLFF'] +  # Add full year average
+            [f'{year} Full Year Avg' for year in years])  # Add individual year full averages
+
+def main(years=None, output='BIG DATA.csv', scoring_workers=None, cache_path='slff_scores.sqlite3', rebuild=False):
+    """Score every active team over the `years` window (default: YEARS).
+
+    Per-event scores are kept in `cache_path`, so moving the window to a new
+    season only fetches and scores that season's events. `rebuild` rescores
+    everything.
+    """
+    # Passed down rather than assigned to YEARS, so pipeline stages running at once keep their own windows
+    from concurrent.futures import ProcessPoolExecutor
+    years = sorted(years or YEARS, reverse=True)
     try:
         log_progress("Starting FFBigData script...")
+        score_cache = EventScoreCache(cache_path, version=SCORE_VERSION)
+        if rebuild:
+            score_cache.reset()
         
-        TEAM_LIST = get_active_teams()
-        log_progress(f"Retrieved {len(TEAM_LIST)} active teams")
-        
-        if not TEAM_LIST:
-            raise Exception("Failed to get team list from TBA")
-            
-        header = ['Team Number', 'Team Name', 'Avg SLFF Points', '2024 Avg SLFF', '2023 Avg SLFF', '2022 Avg SLFF',
-                  '2024 Impact', '2023 Impact', '2022 Impact', '2024 EI', '2023 EI', '2022 EI',
-                  '2024 Robot', '2023 Robot', '2022 Robot',
-                  '2024 Sustainability', '2023 Sustainability', '2022 Sustainability',
-                  'Full Year Avg SLFF',  # Add full year average
-                  '2024 Full Year Avg', '2023 Full Year Avg', '2022 Full Year Avg']  # Add individual year full averages
+        header = build_header(years)
         
         log_progress("Starting CSV writer thread...")
         csv_thread = threading.Thread(
             target=csv_writer_thread, 
-            args=('BIG DATA.csv', header)
+            args=(output, header)
         )
         csv_thread.start()
         
         log_progress("Beginning team processing...")
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            chunks = [TEAM_LIST[i:i + 50] for i in range(0, len(TEAM_LIST), 50)]
-            log_progress(f"Created {len(chunks)} chunks of teams")
-            
-            list(tqdm(
-                executor.map(process_team_batch, chunks),
-                total=len(chunks),
-                desc="Processing team batches"
-            ))
+        incomplete = 0
+        # Threads fetch while a process pool scores, so scoring isn't bound by the GIL
+        with ThreadPoolExecutor(max_workers=tba_utils.settings['workers']) as executor, \
+                ProcessPoolExecutor(max_workers=scoring_workers) as scoring_pool:
+            # Start processing each chunk as soon as its teams arrive instead of
+            # waiting for the whole team list
+            futures = [executor.submit(process_team_batch, chunk, scoring_pool, score_cache, years)
+                       for chunk in batched(iter_active_teams(years=years), 50)]
+            log_progress(f"Created {len(futures)} chunks of teams")
+
+            for future in tqdm(concurrent.futures.as_completed(futures),
+                               total=len(futures),
+                               desc="Processing team batches"):
+                try:
+                    rows = future.result()
+                except IncompleteBatch as e:
+                    # Keep what could be scored; the next run refetches the rest
+                    log_progress(f"Incomplete batch: {str(e)}")
+                    rows = e.rows
+                    incomplete += 1
+                for result in rows:
+                    results_queue.put(result)
         
         log_progress("Team processing complete, waiting for CSV writer to finish...")
-        results_queue.put("DONE")
+        results_queue.put("INCOMPLETE" if incomplete else "DONE")
         csv_thread.join()
+        score_cache.close()
         
         log_progress("Script completed successfully!")
         
@@ -0,0 +1,65 @@
+"""Check that every script stays cheap to import.
+
+Each module is imported in a fresh interpreter under `python -X importtime`.
+The check fails if its cumulative import time is over budget, or if importing
+it loads a heavy library that should only be imported by the code that uses it.
+
+    python bench_importtime.py
+    python bench_importtime.py --budget-ms 80 --repeat 5
+"""
+import argparse
+import subprocess
+import sys
+from tbascripts import COMMANDS
+
+MODULES = ['tbascripts'] + [module for module, _ in COMMANDS.values()]
+
+# Libraries that must only be imported inside the functions that need them
+HEAVY_MODULES = ['pandas', 'numpy', 'scipy', 'matplotlib', 'PIL', 'tbapy', 'requests', 'urllib3', 'dotenv']
+
+DEFAULT_BUDGET_MS = 100
+
+
+def measure(module):
+    """(cumulative import time in ms, heavy modules loaded) for one fresh import of `module`"""
+    # __import__ rather than importlib.import_module, which -X importtime doesn't report
+    code = (f"import sys; __import__({module!r}); "
+            f"print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))")
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, check=True)
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.strip() == module:
+            cumulative_us = int(cumulative)
+    heavy = [name for name in result.stdout.strip().split(',') if name]
+    return cumulative_us / 1000, heavy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help=f'maximum cumulative import time per module (default: {DEFAULT_BUDGET_MS})')
+    parser.add_argument('--repeat', type=int, default=3, help='imports per module; the fastest counts')
+    args = parser.parse_args(argv)
+
+    failures = 0
+    print(f"{'module':<36}{'import ms':>10}  heavy imports")
+    for module in MODULES:
+        runs = [measure(module) for _ in range(args.repeat)]
+        best_ms = min(ms for ms, _ in runs)
+        heavy = runs[0][1]
+        failed = best_ms > args.budget_ms or heavy
+        failures += bool(failed)
+        print(f"{module:<36}{best_ms:>10.1f}  {', '.join(heavy) or '-'}{'  FAIL' if failed else ''}")
+
+    if failures:
+        print(f"{failures} modules over the {args.budget_ms:.0f} ms budget or importing heavy libraries eagerly")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,12 @@
-import tbapy
 import csv
 from tqdm import tqdm
-from dotenv import load_dotenv
-import os
+from tba_utils import tba, fetch_event_rankings, season_rankings, report_missing_rankings
+from team_registry import registry
+from elo_store import EloStore, DEFAULT_STORE_PATH, years_namespace
+from profiling import timed
 
 # Function to calculate Elo rank
+@timed(sample_every=64)
 def calculate_elo_rank(higher_value_elo, lower_value_elo, K=32):
     expected_score_higher = 1 / (1 + 10 ** ((lower_value_elo - higher_value_elo) / 400))
     expected_score_lower = 1 / (1 + 10 ** ((higher_value_elo - lower_value_elo) / 400))
@@ -14,75 +16,108 @@ def calculate_elo_rank(higher_value_elo, lower_value_elo, K=32):
 
     return new_higher_value_elo, new_lower_value_elo
 
-# Load environment variables and initialize TBA client
-load_dotenv()
-tba = tbapy.TBA(os.getenv("TBAKEY"))
+# Seasons rated when none are given
+DEFAULT_YEARS = [2023]
 
-# Initialize Elo ratings and RPs data
+# Initialize Elo ratings and RPs data, keyed by team registry ID
 elo_total_rps = {}
 elo_bonus_rps = {}
 total_rps_all = {}
 bonus_rps_all = {}
 
-def calculate_event(key):
-    # Fetch rankings
-    rankings = tba.event_rankings(key)
-    real_rankings = rankings["rankings"]
+def team_rps(team):
+    """(total RPs, bonus RPs) from one TBA ranking row"""
+    total_rps = int(team["sort_orders"][0]*team["matches_played"])
+    win_rps = team['record']['wins']*2
+    bonus_rps = int(round(total_rps - win_rps,0))
+    return total_rps, bonus_rps
 
-    
-
-    # Calculate RPs and bonus RPs for each team
-    for team in real_rankings:
-        team_key = team["team_key"]
-        
+def apply_event_rps(event_rps, elo_total, elo_bonus, total_all, bonus_all):
+    """Update the four tables in place from one event's (team ID, total RPs, bonus RPs) rows"""
+    for team_id, total_rps, bonus_rps in event_rps:
         # Initialize Elo rating for the team if it doesn't exist
-        if team_key not in elo_total_rps:
-            elo_total_rps[team_key] = 1500
-        if team_key not in elo_bonus_rps:
-            elo_bonus_rps[team_key] = 1500
-
-        total_rps = int(team["sort_orders"][0]*team["matches_played"])
-        win_rps = team['record']['wins']*2
-        bonus_rps = int(round(total_rps - win_rps,0))
-        
-        bonus_rps_all[team["team_key"]] = bonus_rps
-        total_rps_all[team["team_key"]] = total_rps
+        if team_id not in elo_total:
+            elo_total[team_id] = 1500
+        if team_id not in elo_bonus:
+            elo_bonus[team_id] = 1500
+
+        bonus_all[team_id] = bonus_rps
+        total_all[team_id] = total_rps
 
     # Compare teams and update Elo ratings
-    for team1_key, team1_rps in total_rps_all.items():
-        for team2_key, team2_rps in total_rps_all.items():
-            if team1_key != team2_key:
+    for team1_id, team1_rps in total_all.items():
+        for team2_id, team2_rps in total_all.items():
+            if team1_id != team2_id:
                 if team1_rps > team2_rps:
-                    elo_total_rps[team1_key], elo_total_rps[team2_key] = \
-                        calculate_elo_rank(elo_total_rps[team1_key], elo_total_rps[team2_key])
-                if bonus_rps_all[team1_key] > bonus_rps_all[team2_key]:
-                    elo_bonus_rps[team1_key], elo_bonus_rps[team2_key] = \
-                        calculate_elo_rank(elo_bonus_rps[team1_key], elo_bonus_rps[team2_key])
-
-def calculate_year(year):                  
-    events = tba.events(year, simple=True)
-    events.sort(key=lambda x: x['end_date'], reverse=False)
-    for event in tqdm(events, desc="Processing Events"):
-        if event['event_type'] == 99 or event['event_type'] == 100:
-            pass
-        else:
-            try:
-                calculate_event(event['key'])
-                tqdm.write(f"{event['key']} {event['event_type']}") 
-            except:
-                tqdm.write(f"Error {event['key']} {event['event_type']}")
-
-calculate_year(2023)
-
-# Save the Elo ratings to CSV files
-with open('elo_total_rps.csv', 'w', newline='') as file:
-    writer = csv.writer(file)
-    writer.writerow(['Team', 'Elo Rating for Total RPs'])
-    for team_key, rating in elo_total_rps.items():
-        writer.writerow([team_key, rating])
-
-with open('elo_bonus_rps.csv', 'w', newline='') as file:
-    writer = csv.writer(file)
-    writer.writerow(['Team', 'Elo Rating for Bonus RPs'])
-    for team_key, rating in elo_bonus_rps.items():
-        writer.writerow([team_key, rating])
+                    elo_total[team1_id], elo_total[team2_id] = \
+                        calculate_elo_rank(elo_total[team1_id], elo_total[team2_id])
+                if bonus_all[team1_id] > bonus_all[team2_id]:
+                    elo_bonus[team1_id], elo_bonus[team2_id] = \
+                        calculate_elo_rank(elo_bonus[team1_id], elo_bonus[team2_id])
+
+def apply_event(state, event_input):
+    """EloStore update for one event: [team key, total RPs, bonus RPs] rows.
+
+    The latest RPs of every team seen so far are compared each event, so they
+    are kept in the store alongside the ratings.
+    """
+    apply_event_rps(((registry.id(team_key), total, bonus) for team_key, total, bonus in event_input),
+                    state.setdefault('total_rps', {}), state.setdefault('bonus_rps', {}),
+                    state.setdefault('total_rps_last', {}), state.setdefault('bonus_rps_last', {}))
+
+def open_store(years=None, path=DEFAULT_STORE_PATH):
+    """The stored ratings for `years` (default DEFAULT_YEARS); each year range is kept separately"""
+    return EloStore(years_namespace('bonus_rp', years or DEFAULT_YEARS), apply_event, path)
+
+def apply_event_rankings(key, end_date, rankings, store=None):
+    # Calculate RPs and bonus RPs for each team
+    event_input = [[team["team_key"], *team_rps(team)] for team in rankings]
+    if store is None:
+        apply_event_rps(((registry.id(team_key), total, bonus) for team_key, total, bonus in event_input),
+                        elo_total_rps, elo_bonus_rps, total_rps_all, bonus_rps_all)
+    else:
+        store.apply(key, end_date, event_input)
+
+def calculate_event(key, store=None, end_date=None):
+    rankings = fetch_event_rankings(tba, key)
+    if rankings is not None:
+        apply_event_rankings(key, end_date, rankings, store)
+
+def calculate_years(years, store=None):
+    # Events already in the store were applied on an earlier run
+    processed = store.processed_events() if store is not None else set()
+    # Rankings are all fetched up front; only the Elo updates run in end_date order
+    ranked, missing = season_rankings(tba, years, skip=processed)
+    for event, rankings in tqdm(ranked, desc="Processing Events"):
+        apply_event_rankings(event['key'], event['end_date'], rankings, store)
+    report_missing_rankings(missing)
+
+def main(years=None, store_path=DEFAULT_STORE_PATH, rebuild=False, as_of=None):
+    if years is None:
+        years = DEFAULT_YEARS
+
+    store = open_store(years, store_path)
+    if rebuild:
+        store.reset()
+    calculate_years(years, store)
+
+    for table, series in [(elo_total_rps, 'total_rps'), (elo_bonus_rps, 'bonus_rps')]:
+        table.clear()
+        table.update(store.values_as_of(as_of, series) if as_of else store.current(series))
+    store.close()
+
+    # Save the Elo ratings to CSV files
+    with open('elo_total_rps.csv', 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Team', 'Elo Rating for Total RPs'])
+        for team_id, rating in elo_total_rps.items():
+            writer.writerow([registry.key(team_id), rating])
+
+    with open('elo_bonus_rps.csv', 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Team', 'Elo Rating for Bonus RPs'])
+        for team_id, rating in elo_bonus_rps.items():
+            writer.writerow([registry.key(team_id), rating])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Row-level change feeds between successive runs of a generated CSV.
+
+Next to each artifact, `{output}.rowhashes` keeps a hash of every row it
+wrote, keyed by the artifact's key columns, plus a CRC of each cell. As the
+next run writes its rows, each one is looked up by key (a hash join against
+the previous run), and at the end `{stem}.changes.jsonl` lists what changed:
+
+    {"op": "run", "artifact": "BIG DATA.csv", "base": "9c0f...", "result": "41aa...", "columns": [...]}
+    {"op": "insert", "key": "9999", "row": {"Team Number": "9999", ...}}
+    {"op": "update", "key": "254", "changed": {"2025 Robot": "40.5", ...}}
+    {"op": "delete", "key": "1"}
+
+Values are the strings written to the CSV; a column added to the artifact
+is only sent for rows where it isn't empty. `base` and `result` digest the
+artifact before and after the run, so a consumer can check that the patch
+applies to the copy it holds; apply_changes() applies one to rows keyed like
+the feed. The first run of an artifact (or a run after its hashes were
+deleted) lists every row as an insert with no base. A run that couldn't
+produce every row closes with `partial=True`: rows it didn't write aren't
+deleted, but listed under "skipped" in the run record, so consumers keep
+their copies. `result` and the saved hashes still cover only the rows
+written, so the next run sends the skipped rows again as inserts.
+"""
+import hashlib
+import os
+import zlib
+import fast_json
+
+ROW_HASH_BYTES = 16
+
+
+def cell_text(value):
+    """A value as csv.writer writes it"""
+    return '' if value is None else str(value)
+
+
+def row_hash(cells):
+    # Unit separators keep ('ab', 'c') and ('a', 'bc') apart
+    return hashlib.blake2b('\x1f'.join(cells).encode('utf-8'), digest_size=ROW_HASH_BYTES).hexdigest()
+
+
+def feed_path(output):
+    return f'{os.path.splitext(output)[0]}.changes.jsonl'
+
+
+def state_path(output):
+    return f'{output}.rowhashes'
+
+
+class ChangeFeed:
+    """Collects an artifact's rows as they're written and diffs them against the previous run's.
+
+    `key_columns` name the header columns identifying a row; a feed key is
+    that column's value, or a list of values for several columns.
+    """
+
+    def __init__(self, output, header, key_columns):
+        self.output = output
+        self.header = [str(column) for column in header]
+        self.key_positions = [self.header.index(column) for column in key_columns]
+        self.previous_columns, self.previous = self._load()
+        self.base = self._digest(self.previous_columns, self.previous) if self.previous is not None else None
+        # Each column's position in the previous header, for comparing cell CRCs by name
+        previous_positions = {column: position for position, column in enumerate(self.previous_columns)}
+        self._column_map = [(position, previous_positions.get(column)) for position, column in enumerate(self.header)]
+        self.rows = {}
+        self.changes = []
+        self.counts = {'insert': 0, 'update': 0, 'delete': 0}
+
+    def _load(self):
+        try:
+            with open(state_path(self.output), 'rb') as file:
+                state = fast_json.loads(file.read())
+        except FileNotFoundError:
+            return [], None
+        return state['columns'], state['rows']
+
+    def key(self, cells):
+        if len(self.key_positions) == 1:
+            return cells[self.key_positions[0]]
+        return [cells[position] for position in self.key_positions]
+
+    def add(self, row):
+        """Record one written row"""
+        cells = [cell_text(value) for value in row]
+        key = self.key(cells)
+        state_key = key if isinstance(key, str) else '\x1f'.join(key)
+        digest = row_hash(cells)
+        crcs = [zlib.crc32(cell.encode('utf-8')) for cell in cells]
+        self.rows[state_key] = [digest, crcs]
+
+        # Each matched key is popped, so whatever is left in `previous` at close() was deleted
+        old = self.previous.pop(state_key, None) if self.previous is not None else None
+        if old is None:
+            self.changes.append({'op': 'insert', 'key': key, 'row': dict(zip(self.header, cells))})
+            self.counts['insert'] += 1
+        elif old[0] != digest or self.previous_columns != self.header:
+            old_crcs = old[1]
+            changed = {self.header[position]: cells[position] for position, previous in self._column_map
+                       if (old_crcs[previous] != crcs[position] if previous is not None else cells[position])}
+            if changed or (old[0] != digest and self.previous_columns == self.header):
+                # A row whose hash changed but whose cell CRCs all collided is sent whole
+                self.changes.append({'op': 'update', 'key': key,
+                                     'changed': changed or dict(zip(self.header, cells))})
+                self.counts['update'] += 1
+
+    def close(self, partial=False):
+        """Write the change feed and the new row hashes; returns the counts of each change.
+
+        With `partial`, rows of the previous run that weren't added this time
+        are listed as skipped rather than deleted.
+        """
+        skipped = []
+        if self.previous and partial:
+            skipped = [state_key if len(self.key_positions) == 1 else state_key.split('\x1f')
+                       for state_key in self.previous]
+        elif self.previous:
+            for state_key in self.previous:
+                key = state_key if len(self.key_positions) == 1 else state_key.split('\x1f')
+                self.changes.append({'op': 'delete', 'key': key})
+            self.counts['delete'] = len(self.previous)
+        header = {'op': 'run', 'artifact': os.path.basename(self.output), 'base': self.base,
+                  'result': self._digest(self.header, self.rows), 'columns': self.header}
+        if skipped:
+            header['skipped'] = skipped
+
+        path = feed_path(self.output)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            for record in [header] + self.changes:
+                file.write(fast_json.dumps(record) + b'\n')
+        os.replace(tmp_path, path)
+
+        tmp_path = f'{state_path(self.output)}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(fast_json.dumps({'columns': self.header, 'rows': self.rows}))
+        os.replace(tmp_path, state_path(self.output))
+        print(f"{os.path.basename(self.output)}: {self.counts['insert']} inserted, {self.counts['update']} updated, "
+              f"{self.counts['delete']} deleted" + (f", {len(skipped)} skipped by this partial run" if skipped else '') +
+              f"; wrote {path}")
+        return self.counts
+
+    @staticmethod
+    def _digest(columns, rows):
+        """Order-independent digest of an artifact's columns and row hashes"""
+        digest = hashlib.blake2b('\x1f'.join(columns).encode('utf-8'), digest_size=ROW_HASH_BYTES)
+        for state_key in sorted(rows):
+            digest.update(f'{state_key}\x1e{rows[state_key][0]}\x1e'.encode('utf-8'))
+        return digest.hexdigest()
+
+
+def apply_changes(rows, path, base=None):
+    """Apply the change feed at `path` to `rows`, {key: {column: value}}, in place; returns its run record.
+
+    Keys of several columns are tuples. With `base` (the `result` of the
+    last feed applied), a feed for a different version of the artifact
+    raises ValueError instead of being applied.
+    """
+    with open(path, 'rb') as file:
+        records = [fast_json.loads(line) for line in file]
+    run = records[0]
+    if base is not None and run['base'] != base:
+        raise ValueError(f"{path} patches {run['artifact']} version {run['base']}, not {base}")
+    columns = set(run['columns'])
+    for record in records[1:]:
+        key = record['key'] if isinstance(record['key'], str) else tuple(record['key'])
+        if record['op'] == 'insert':
+            rows[key] = record['row']
+        elif record['op'] == 'update':
+            rows[key].update(record['changed'])
+        else:
+            del rows[key]
+    # Columns dropped from the artifact, e.g. a season leaving the window
+    for row in rows.values():
+        for column in [column for column in row if column not in columns]:
+            del row[column]
+    return run
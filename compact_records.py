@@ -0,0 +1,57 @@
+import sys
+from typing import NamedTuple
+from team_registry import registry
+
+
+class CompactMatch(NamedTuple):
+    """The parts of a TBA match that scoring needs, with teams as registry IDs"""
+    key: str
+    comp_level: str
+    set_number: int
+    match_number: int
+    red: tuple
+    blue: tuple
+    winner: str
+    # Payload fields a consumer asked to keep (e.g. score_breakdown), otherwise None
+    extra: dict = None
+
+
+class CompactAward(NamedTuple):
+    """A TBA award reduced to its type and recipient team IDs"""
+    award_type: int
+    teams: tuple
+
+
+def team_ids(team_keys):
+    return tuple(registry.id(team_key) for team_key in team_keys)
+
+
+def compact_match(match, keep=()):
+    """Build a CompactMatch, dropping everything but the fields listed in `keep`"""
+    alliances = match['alliances']
+    extra = {field: match.get(field) for field in keep} if keep else None
+    return CompactMatch(
+        sys.intern(match['key']),
+        sys.intern(match['comp_level']),
+        match['set_number'],
+        match['match_number'],
+        team_ids(alliances['red']['team_keys']),
+        team_ids(alliances['blue']['team_keys']),
+        sys.intern(match['winning_alliance'] or ''),
+        extra,
+    )
+
+
+def compact_matches(matches, keep=()):
+    return [compact_match(match, keep) for match in matches or []]
+
+
+def compact_award(award):
+    return CompactAward(
+        award['award_type'],
+        team_ids(recipient['team_key'] for recipient in award['recipient_list'] if recipient['team_key']),
+    )
+
+
+def compact_awards(awards):
+    return [compact_award(award) for award in awards or []]
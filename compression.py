@@ -0,0 +1,160 @@
+import glob
+import gzip
+import io
+import os
+import threading
+import zlib
+
+# Frames are recognised by their magic bytes, so any file can be read whichever codec wrote it
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+GZIP_MAGIC = b'\x1f\x8b'
+
+# zstd's guidance is roughly 100x the dictionary size in samples
+DICTIONARY_SIZE = 112 * 1024
+TRAINING_BYTES = 100 * DICTIONARY_SIZE
+MIN_TRAINING_SAMPLES = 200
+
+
+def load_zstandard():
+    """The zstandard module, or None when it isn't installed"""
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+class Codec:
+    """Compresses cached JSON with zstd and a dictionary trained on TBA responses.
+
+    Without the zstandard package everything is written with gzip instead.
+    Trained dictionaries are saved in `dictionary_dir` under their zstd
+    dictionary ID, and every frame records the ID it was written with, so
+    entries written before a dictionary existed (or under an older one) stay
+    readable. Until a dictionary exists, the first responses written are kept
+    as samples and one is trained from them automatically.
+    """
+
+    def __init__(self, dictionary_dir=None, level=9, gzip_level=6):
+        self.zstandard = load_zstandard()
+        self.dictionary_dir = dictionary_dir
+        self.level = level
+        self.gzip_level = gzip_level
+        self.dictionaries = {}
+        self.dictionary = None
+        self._samples = []
+        self._sample_bytes = 0
+        self._training = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if self.zstandard and dictionary_dir:
+            self._load_dictionaries()
+
+    def _load_dictionaries(self):
+        newest = None
+        for path in glob.glob(os.path.join(self.dictionary_dir, '*.zdict')):
+            with open(path, 'rb') as file:
+                dictionary = self.zstandard.ZstdCompressionDict(file.read())
+            self.dictionaries[dictionary.dict_id()] = dictionary
+            if newest is None or os.path.getmtime(path) > newest[0]:
+                newest = (os.path.getmtime(path), dictionary)
+        if newest:
+            self.dictionary = newest[1]
+
+    def _compressor(self):
+        # zstd compressors aren't thread-safe; keep one per thread per dictionary
+        key = self.dictionary.dict_id() if self.dictionary else 0
+        compressors = self._local.__dict__.setdefault('compressors', {})
+        if key not in compressors:
+            compressors[key] = self.zstandard.ZstdCompressor(level=self.level, dict_data=self.dictionary)
+        return compressors[key]
+
+    def compress(self, data):
+        if self.zstandard is None:
+            return gzip.compress(data, compresslevel=self.gzip_level)
+        return self._compressor().compress(data)
+
+    def decompress(self, blob):
+        """The original bytes of `blob`; raises ValueError if it's corrupt or truncated"""
+        if blob.startswith(ZSTD_MAGIC):
+            if self.zstandard is None:
+                raise ValueError("Cache entry is zstd-compressed but zstandard isn't installed")
+            try:
+                return self._decompress_zstd(blob)
+            except self.zstandard.ZstdError as e:
+                raise ValueError(f"Corrupt zstd cache entry: {e}") from e
+        if blob.startswith(GZIP_MAGIC):
+            try:
+                return gzip.decompress(blob)
+            except (zlib.error, EOFError, gzip.BadGzipFile) as e:
+                raise ValueError(f"Corrupt gzip cache entry: {e}") from e
+        # Entries written before the cache was compressed
+        return blob
+
+    def _decompress_zstd(self, blob):
+        dict_id = self.zstandard.get_frame_parameters(blob).dict_id
+        dictionary = self.dictionaries.get(dict_id) if dict_id else None
+        if dict_id and dictionary is None and self.dictionary_dir:
+            # Another process sharing the cache may have trained it since this one started
+            with self._lock:
+                self._load_dictionaries()
+            dictionary = self.dictionaries.get(dict_id)
+        if dict_id and dictionary is None:
+            raise ValueError(f"Cache entry needs zstd dictionary {dict_id}, which isn't in {self.dictionary_dir}")
+        return self.zstandard.ZstdDecompressor(dict_data=dictionary).decompress(blob)
+
+    def observe(self, data):
+        """Offer a freshly written response as a training sample for the first dictionary"""
+        if self.zstandard is None or self.dictionary is not None or not self.dictionary_dir:
+            return
+        with self._lock:
+            if self.dictionary is not None or self._training:
+                return
+            # Prefixes are enough to learn the shared keys and structure, and keep memory bounded
+            sample = data[:TRAINING_BYTES // MIN_TRAINING_SAMPLES]
+            self._samples.append(sample)
+            self._sample_bytes += len(sample)
+            enough_bytes = self._sample_bytes >= TRAINING_BYTES and len(self._samples) >= MIN_TRAINING_SAMPLES
+            if not enough_bytes and len(self._samples) < 10 * MIN_TRAINING_SAMPLES:
+                return
+            samples, self._samples = self._samples, []
+            self._training = True
+        try:
+            self.train(samples)
+        except Exception:
+            # Too little variety to train on; stay on plain zstd rather than fail the write
+            pass
+
+    def train(self, samples, size=DICTIONARY_SIZE):
+        """Train a dictionary from sample responses, save it and use it for new entries"""
+        dictionary = self.zstandard.train_dictionary(size, samples)
+        os.makedirs(self.dictionary_dir, exist_ok=True)
+        path = os.path.join(self.dictionary_dir, f'{dictionary.dict_id()}.zdict')
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(dictionary.as_bytes())
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.dictionaries[dictionary.dict_id()] = dictionary
+            self.dictionary = dictionary
+        return dictionary
+
+
+def open_text(path, mode='r'):
+    """Open a text file, compressing or decompressing by extension (.gz, .zst).
+
+    Appending adds a new gzip member or zstd frame, which readers treat as one stream.
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    if path.endswith('.zst'):
+        zstandard = load_zstandard()
+        if zstandard is None:
+            raise ValueError(f"Reading or writing {path} needs the zstandard package")
+        raw = open(path, mode + 'b')
+        if 'r' in mode:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
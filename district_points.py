@@ -0,0 +1,287 @@
+"""FIRST district points computed locally from rankings, alliances, matches and awards.
+
+Follows the district points rules TBA implements: qualification points from
+rank (an inverse error function curve from 4 to 22 points), alliance
+selection points (17 minus the alliance number for captains and first picks,
+the alliance number for second picks), playoff points and award points, with
+District Championship points tripled. Team age points are a season-level bonus
+and are not part of an event's points.
+
+PointRules holds every constant, so points can be recomputed under
+alternative rules. Qualification and alliance points for a whole season are
+computed as arrays in one pass.
+
+    python district_points.py 2024mibb 2024micmp4
+compares the local calculation with TBA's event_district_points per team, and
+
+    python district_points.py --record tests/fixtures/district_points 2022miket 2024mibb 2023micmp
+saves the responses that comparison reads, so tests can repeat it offline.
+"""
+import json
+import os
+import sys
+from collections import defaultdict
+from typing import NamedTuple
+from team_registry import registry, team_sort_key
+
+# Judged awards worth the standard award points (Impact, Engineering Inspiration
+# and Rookie All Star have their own values in PointRules.award_points)
+JUDGED_AWARD_TYPES = frozenset({
+    11,  # Gracious Professionalism
+    13,  # Judges'
+    15,  # Rookie Inspiration
+    16,  # Industrial Design
+    17,  # Quality
+    18,  # Safety
+    20,  # Creativity
+    21,  # Engineering Excellence
+    22,  # Entrepreneurship
+    27,  # Imagery
+    29,  # Innovation in Control
+    30,  # Team Spirit
+    71,  # Autonomous
+    82,  # Sustainability
+})
+
+# District Championship and District Championship Division
+CHAMPIONSHIP_EVENT_TYPES = (2, 5)
+
+
+class PointRules(NamedTuple):
+    """Every constant in the district points calculation"""
+    alpha: float = 1.07
+    qual_scale: float = 10.0
+    qual_offset: float = 12.0
+    # Captains and first picks earn draft_base - alliance number; second picks earn the alliance number
+    draft_base: int = 17
+    # Double elimination (2023 onward): winner, finalist, third and fourth place alliances
+    playoff_finish: tuple = (30, 20, 13, 7)
+    # Single elimination (2022 and earlier): points per playoff match won
+    elim_win_points: int = 5
+    award_points: tuple = ((0, 10), (9, 8), (10, 8))
+    judged_award_points: int = 5
+    judged_award_types: frozenset = JUDGED_AWARD_TYPES
+    championship_multiplier: int = 3
+
+
+DEFAULT_RULES = PointRules()
+
+
+class DistrictPoints(NamedTuple):
+    """One team's district points at one event"""
+    qual_points: int = 0
+    alliance_points: int = 0
+    elim_points: int = 0
+    award_points: int = 0
+
+    @property
+    def total(self):
+        return self.qual_points + self.alliance_points + self.elim_points + self.award_points
+
+
+def qual_points(ranks, team_counts, rules=DEFAULT_RULES):
+    """Qualification points for arrays of ranks (1 = first) at events of `team_counts` ranked teams"""
+    import numpy as np
+    from scipy.special import erfinv
+
+    ranks = np.asarray(ranks, dtype=float)
+    team_counts = np.asarray(team_counts, dtype=float)
+    curve = erfinv((team_counts - 2 * ranks + 2) / (rules.alpha * team_counts))
+    points = curve * (rules.qual_scale / erfinv(1 / rules.alpha)) + rules.qual_offset
+    # Round away float noise first so values that land on an integer aren't pushed up by ceil
+    return np.ceil(np.round(points, 9)).astype(int)
+
+
+def alliance_points(alliances, rules=DEFAULT_RULES):
+    """{team: points} for an event's alliances (lists of picks, captain first), in alliance order"""
+    points = {}
+    for number, picks in enumerate(alliances, start=1):
+        for order, team in enumerate(picks[:3]):
+            points[team] = rules.draft_base - number if order < 2 else number
+    return points
+
+
+def playoff_points(matches, alliances, year, rules=DEFAULT_RULES):
+    """{team: points} from compact playoff matches (see compact_records)"""
+    points = defaultdict(int)
+    playoff_matches = [match for match in matches if match.comp_level != 'qm']
+    if year <= 2022:
+        for match in playoff_matches:
+            if match.winner in ('red', 'blue'):
+                for team in (match.red if match.winner == 'red' else match.blue):
+                    points[team] += rules.elim_win_points
+        return dict(points)
+
+    alliance_of = {team: number for number, picks in enumerate(alliances) for team in picks}
+    played = defaultdict(set)  # alliance -> teams that played a playoff match for it
+    for match in playoff_matches:
+        for side in (match.red, match.blue):
+            if side and side[0] in alliance_of:
+                played[alliance_of[side[0]]].update(side)
+
+    def alliance_in(side):
+        return alliance_of.get(side[0]) if side else None
+
+    finish = {}
+    finals = [match for match in playoff_matches if match.comp_level == 'f']
+    if finals:
+        red, blue = alliance_in(finals[0].red), alliance_in(finals[0].blue)
+        red_wins = sum(match.winner == 'red' for match in finals)
+        blue_wins = sum(match.winner == 'blue' for match in finals)
+        if max(red_wins, blue_wins) >= 2:
+            finish[red if red_wins > blue_wins else blue] = 0
+            finish[blue if red_wins > blue_wins else red] = 1
+    # Losers of the lower bracket final (match 13) and lower bracket match 12 place third and fourth
+    for set_number, place in ((13, 2), (12, 3)):
+        for match in playoff_matches:
+            if match.comp_level == 'sf' and match.set_number == set_number and match.winner in ('red', 'blue'):
+                finish[alliance_in(match.blue if match.winner == 'red' else match.red)] = place
+    for alliance, place in finish.items():
+        if alliance is None:
+            continue
+        for team in played[alliance]:
+            points[team] += rules.playoff_finish[place]
+    return dict(points)
+
+
+def award_points(awards, rules=DEFAULT_RULES):
+    """{team: points} from compact awards"""
+    special = dict(rules.award_points)
+    points = defaultdict(int)
+    for award in awards:
+        if award.award_type in special:
+            value = special[award.award_type]
+        elif award.award_type in rules.judged_award_types:
+            value = rules.judged_award_points
+        else:
+            continue
+        for team in award.teams:
+            points[team] += value
+    return dict(points)
+
+
+def season_points(events, rules=DEFAULT_RULES, components=('qual', 'alliance', 'elim', 'award')):
+    """{event key: {team: DistrictPoints}} for many events at once.
+
+    `events` is a list of (event, data) pairs: `event` has 'key', 'year' and
+    'event_type'; `data` may hold 'rankings' (team IDs in rank order),
+    'alliances' (lists of team IDs, captain first), 'matches' and 'awards'
+    (compact records). Only the requested components are computed;
+    qualification points for every event come from one vectorized call.
+    """
+    import numpy as np
+
+    totals = {event['key']: defaultdict(lambda: [0, 0, 0, 0]) for event, _ in events}
+
+    if 'qual' in components:
+        keys, teams, ranks, counts = [], [], [], []
+        for event, data in events:
+            ranked = data.get('rankings') or []
+            for rank, team in enumerate(ranked, start=1):
+                keys.append(event['key'])
+                teams.append(team)
+                ranks.append(rank)
+                counts.append(len(ranked))
+        if ranks:
+            for key, team, points in zip(keys, teams, qual_points(np.array(ranks), np.array(counts), rules).tolist()):
+                totals[key][team][0] = points
+
+    for event, data in events:
+        event_totals = totals[event['key']]
+        alliances = data.get('alliances') or []
+        if 'alliance' in components:
+            for team, points in alliance_points(alliances, rules).items():
+                event_totals[team][1] = points
+        if 'elim' in components:
+            for team, points in playoff_points(data.get('matches') or [], alliances, event['year'], rules).items():
+                event_totals[team][2] = points
+        if 'award' in components:
+            for team, points in award_points(data.get('awards') or [], rules).items():
+                event_totals[team][3] = points
+
+    multiplier = {event['key']: rules.championship_multiplier if event['event_type'] in CHAMPIONSHIP_EVENT_TYPES else 1
+                  for event, _ in events}
+    return {key: {team: DistrictPoints(*(value * multiplier[key] for value in values))
+                  for team, values in event_totals.items()}
+            for key, event_totals in totals.items()}
+
+
+def event_data(tba, event_key):
+    """(event, data) for one event, fetched in the shape season_points() takes, with teams as registry IDs"""
+    import tba_structs
+    from compact_records import compact_matches, compact_awards, team_ids
+
+    event = tba.event(event_key, simple=True)
+    rankings = tba_structs.event_rankings(tba, event_key) or []
+    data = {
+        'rankings': team_ids(row['team_key'] for row in sorted(rankings, key=lambda row: row['rank'] or 0)),
+        'alliances': [team_ids(alliance['picks']) for alliance in tba_structs.event_alliances(tba, event_key)],
+        'matches': compact_matches(tba_structs.event_matches(tba, event_key)),
+        'awards': compact_awards(tba_structs.event_awards(tba, event_key)),
+    }
+    return {'key': event_key, 'year': event['year'], 'event_type': event['event_type']}, data
+
+
+# Everything event_data() and compare() request for one event
+FIXTURE_URLS = ('event/{}/simple', 'event/{}/rankings', 'event/{}/alliances', 'event/{}/matches', 'event/{}/awards',
+                'event/{}/district_points')
+
+# Match fields nothing here reads, left out of recorded fixtures to keep them small
+UNUSED_MATCH_FIELDS = ('score_breakdown', 'videos', 'time', 'actual_time', 'predicted_time', 'post_result_time')
+
+
+def published_and_local(tba, event_key, rules=DEFAULT_RULES):
+    """({team key: DistrictPoints} published by TBA, the same computed locally) for one event"""
+    event, data = event_data(tba, event_key)
+    local = season_points([(event, data)], rules)[event_key]
+    published = (tba._get(f'event/{event_key}/district_points') or {}).get('points') or {}
+    theirs = {team_key: DistrictPoints(*(points.get(field, 0) for field in DistrictPoints._fields))
+              for team_key, points in published.items()}
+    return theirs, {registry.key(team): points for team, points in local.items()}
+
+
+def compare(tba, event_keys, rules=DEFAULT_RULES):
+    """Print each team whose locally computed points differ from TBA's; returns the number of differences"""
+    fields = DistrictPoints._fields
+    differences = 0
+    for event_key in event_keys:
+        published, local = published_and_local(tba, event_key, rules)
+        teams = set(local) | set(published)
+        mismatched = 0
+        for team_key in sorted(teams, key=team_sort_key):
+            theirs = published.get(team_key, DistrictPoints())
+            ours = local.get(team_key, DistrictPoints())
+            diff = [f"{field} {getattr(ours, field)} vs {getattr(theirs, field)}"
+                    for field in fields if getattr(ours, field) != getattr(theirs, field)]
+            if diff:
+                mismatched += 1
+                print(f"{event_key} {team_key[3:]}: " + ', '.join(diff))
+        print(f"{event_key}: {len(teams) - mismatched}/{len(teams)} teams match TBA")
+        differences += mismatched
+    return differences
+
+
+def record_fixture(tba, event_key, directory):
+    """Save every response compare() reads for `event_key` to `{directory}/{event_key}.json`"""
+    responses = {url.format(event_key): tba._get(url.format(event_key)) for url in FIXTURE_URLS}
+    for match in responses[f'event/{event_key}/matches'] or []:
+        for field in UNUSED_MATCH_FIELDS:
+            match.pop(field, None)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{event_key}.json')
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({'source': 'recorded from the TBA API', 'responses': responses}, file, indent=1, sort_keys=True)
+    print(f"Wrote {path}")
+
+
+def main(argv):
+    from tba_utils import tba
+    if argv[:1] == ['--record']:
+        for event_key in argv[2:]:
+            record_fixture(tba, event_key, argv[1])
+        return 0
+    return 1 if compare(tba, argv) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,223 @@
+import json
+import sqlite3
+import threading
+from team_registry import registry
+
+DEFAULT_STORE_PATH = 'elo_state.sqlite3'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS events (
+    namespace TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    event_key TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    event_input TEXT NOT NULL,
+    PRIMARY KEY (namespace, seq),
+    UNIQUE (namespace, event_key)
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    namespace TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    series TEXT NOT NULL,
+    team_key TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (namespace, series, team_key, seq)
+);
+CREATE TABLE IF NOT EXISTS current (
+    namespace TEXT NOT NULL,
+    series TEXT NOT NULL,
+    team_key TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (namespace, series, team_key)
+);
+'''
+
+
+class TrackedSeries(dict):
+    """One series' values, remembering what each team held before its first assignment since `before` was cleared"""
+
+    __slots__ = ('before',)
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.before = {}
+
+    def __setitem__(self, key, value):
+        if key not in self.before:
+            self.before[key] = self.get(key)
+        super().__setitem__(key, value)
+
+
+def years_namespace(name, years):
+    """Namespace for state computed over `years`, so runs over different seasons never share or replay it"""
+    years = sorted(set(years))
+    if years == list(range(years[0], years[-1] + 1)):
+        return f'{name}:{years[0]}-{years[-1]}'
+    return f"{name}:{','.join(map(str, years))}"
+
+
+class EloStore:
+    """Persisted Elo state that new events update as deltas.
+
+    Every processed event is stored with its end_date, the input it was applied
+    with, and the values it changed (snapshots). Current values are kept in their
+    own table, so applying a new event only touches the teams it changed, and
+    "value as of event X" is one indexed lookup. Events arriving out of end_date
+    order roll the state back to just before them and replay the later events
+    from their stored inputs.
+
+    `apply_event(state, event_input)` mutates `state`, a dict of
+    series -> {team ID: value}, for one event. Everything the function needs
+    between events (not just ratings) should live in `state` so replays are exact.
+    Values must be changed by item assignment (`values[team] = ...`): that's
+    how the store finds the teams an event touched without copying the state.
+
+    Ratings depend on which seasons were applied, so callers give each year
+    range its own namespace (see years_namespace()).
+    """
+
+    def __init__(self, namespace, apply_event, path=DEFAULT_STORE_PATH):
+        self.namespace = namespace
+        self.apply_event = apply_event
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.state = self._load_current()
+
+    def _load_current(self):
+        # Reload in the order teams were first seen, matching the in-memory dicts;
+        # updates that loop over every known team depend on that order
+        state = {}
+        rows = self.connection.execute(
+            'SELECT c.series, c.team_key, c.value FROM current AS c JOIN '
+            '(SELECT series, team_key, MIN(rowid) AS first_seen FROM snapshots WHERE namespace = ? '
+            ' GROUP BY series, team_key) AS f USING (series, team_key) '
+            'WHERE c.namespace = ? ORDER BY f.first_seen',
+            (self.namespace, self.namespace))
+        for series, team_key, value in rows:
+            state.setdefault(series, TrackedSeries())[registry.id(team_key)] = value
+        return state
+
+    def processed_events(self):
+        rows = self.connection.execute('SELECT event_key FROM events WHERE namespace = ?', (self.namespace,))
+        return {event_key for (event_key,) in rows}
+
+    def current(self, series):
+        """Current values for one series, keyed by team ID"""
+        return dict(self.state.get(series, {}))
+
+    def _last_event(self):
+        return self.connection.execute(
+            'SELECT seq, end_date FROM events WHERE namespace = ? ORDER BY seq DESC LIMIT 1',
+            (self.namespace,)).fetchone()
+
+    def _apply_and_record(self, seq, event_key, end_date, event_input):
+        for values in self.state.values():
+            values.before.clear()
+        self.apply_event(self.state, event_input)
+        changes = []
+        for series, values in list(self.state.items()):
+            if isinstance(values, TrackedSeries):
+                touched = values.before
+            else:
+                # A series this event started: every value in it is new
+                values = self.state[series] = TrackedSeries(values)
+                touched = dict.fromkeys(values)
+            for team_id, previous in touched.items():
+                value = values[team_id]
+                if previous != value:
+                    changes.append((self.namespace, seq, series, registry.key(team_id), value))
+        self.connection.execute(
+            'INSERT INTO events (namespace, seq, event_key, end_date, event_input) VALUES (?, ?, ?, ?, ?)',
+            (self.namespace, seq, event_key, end_date, json.dumps(event_input)))
+        self.connection.executemany(
+            'INSERT INTO snapshots (namespace, seq, series, team_key, value) VALUES (?, ?, ?, ?, ?)', changes)
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO current (namespace, series, team_key, value) VALUES (?, ?, ?, ?)',
+            [(namespace, series, team_key, value) for namespace, _, series, team_key, value in changes])
+        return len(changes)
+
+    def apply(self, event_key, end_date, event_input):
+        """Apply one event; returns False if it was already processed"""
+        # Events TBA hasn't dated yet sort first, as season_rankings() orders them
+        end_date = end_date or ''
+        with self._lock, self.connection:
+            if self.connection.execute('SELECT 1 FROM events WHERE namespace = ? AND event_key = ?',
+                                       (self.namespace, event_key)).fetchone():
+                return False
+
+            last = self._last_event()
+            if last is None or end_date >= last[1]:
+                self._apply_and_record((last[0] + 1) if last else 0, event_key, end_date, event_input)
+                return True
+
+            # Out of order: rewind to before the first later event, then replay
+            later = self.connection.execute(
+                'SELECT seq, event_key, end_date, event_input FROM events '
+                'WHERE namespace = ? AND end_date > ? ORDER BY seq',
+                (self.namespace, end_date)).fetchall()
+            first_seq = later[0][0]
+            self._rollback_to_seq(first_seq - 1)
+            replay = [(event_key, end_date, event_input)] + [
+                (key, date, json.loads(stored)) for _, key, date, stored in later]
+            for offset, (key, date, replay_input) in enumerate(replay):
+                self._apply_and_record(first_seq + offset, key, date, replay_input)
+            return True
+
+    def _seq_of(self, event_key):
+        row = self.connection.execute('SELECT seq FROM events WHERE namespace = ? AND event_key = ?',
+                                      (self.namespace, event_key)).fetchone()
+        if row is None:
+            raise KeyError(f"{event_key} hasn't been processed in {self.namespace}")
+        return row[0]
+
+    def _rollback_to_seq(self, seq):
+        """Drop every event after `seq` and rebuild current values as of `seq`"""
+        self.connection.execute('DELETE FROM events WHERE namespace = ? AND seq > ?', (self.namespace, seq))
+        self.connection.execute('DELETE FROM snapshots WHERE namespace = ? AND seq > ?', (self.namespace, seq))
+        self.connection.execute('DELETE FROM current WHERE namespace = ?', (self.namespace,))
+        self.connection.execute(
+            'INSERT INTO current (namespace, series, team_key, value) '
+            'SELECT namespace, series, team_key, value FROM snapshots AS s '
+            'WHERE namespace = ? AND seq = (SELECT MAX(seq) FROM snapshots '
+            '    WHERE namespace = s.namespace AND series = s.series AND team_key = s.team_key)',
+            (self.namespace,))
+        self.state = self._load_current()
+
+    def rollback(self, event_key=None, before_date=None):
+        """Forget every event after `event_key`, or every event ending after `before_date`"""
+        with self._lock, self.connection:
+            if event_key is not None:
+                seq = self._seq_of(event_key)
+            else:
+                row = self.connection.execute(
+                    'SELECT MAX(seq) FROM events WHERE namespace = ? AND end_date <= ?',
+                    (self.namespace, before_date)).fetchone()
+                seq = row[0] if row[0] is not None else -1
+            self._rollback_to_seq(seq)
+
+    def value_as_of(self, team_key, event_key, series):
+        """A team's value right after `event_key` was applied, or None if it had none yet"""
+        row = self.connection.execute(
+            'SELECT value FROM snapshots WHERE namespace = ? AND series = ? AND team_key = ? AND seq <= ? '
+            'ORDER BY seq DESC LIMIT 1',
+            (self.namespace, series, team_key, self._seq_of(event_key))).fetchone()
+        return row[0] if row else None
+
+    def values_as_of(self, event_key, series):
+        """Every team's value right after `event_key` was applied, keyed by team ID"""
+        rows = self.connection.execute(
+            'SELECT team_key, value FROM snapshots AS s WHERE namespace = ? AND series = ? AND seq = '
+            '(SELECT MAX(seq) FROM snapshots WHERE namespace = s.namespace AND series = s.series '
+            ' AND team_key = s.team_key AND seq <= ?)',
+            (self.namespace, series, self._seq_of(event_key)))
+        return {registry.id(team_key): value for team_key, value in rows}
+
+    def reset(self):
+        with self._lock, self.connection:
+            for table in ('events', 'snapshots', 'current'):
+                self.connection.execute(f'DELETE FROM {table} WHERE namespace = ?', (self.namespace,))
+            self.state = {}
+
+    def close(self):
+        self.connection.close()
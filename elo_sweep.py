@@ -0,0 +1,193 @@
+"""Hyperparameter sweep for the seeding Elo ratings, scored on predicting rankings.
+
+Replays every ranked event of the given seasons in end date order, exactly as
+seedingELO.apply_rankings does, for a grid of configurations at once:
+
+- k: the update size (seedingELO uses 32)
+- initial: where teams first seen after the first season start. Ratings are
+  only meaningful relative to each other, so this is measured against the
+  first season's field, which starts at 1500 (seedingELO starts everyone at 1500)
+- regression: the fraction of each rating's distance from the field's mean
+  taken away between seasons (seedingELO uses 0)
+- margin: how much a pair's update grows with the rank gap between the two
+  teams, as (gap / mean gap) ** margin (seedingELO uses 0, every pair equal)
+
+Before each event is applied, every pair of its teams is predicted with the
+ratings as they stood: the probability that the higher ranked team finishes
+above the other is the usual Elo expectation. Configurations are scored by
+the mean log-loss and Brier score of those predictions, leaving out the first
+season while ratings warm up.
+
+Ratings are arrays of (teams, configurations), so each pairwise update is a
+handful of NumPy operations covering every configuration. The grid is split
+into chunks replayed in parallel processes.
+
+    python elo_sweep.py 2019 2020 2021 2022 2023
+"""
+import csv
+import itertools
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+from tqdm import tqdm
+from tba_utils import tba, season_rankings, report_missing_rankings
+from team_registry import registry
+
+BASE_RATING = 1500.0
+
+# seedingELO's current behaviour, always included in the grid for comparison
+CURRENT = {'k': 32.0, 'initial': BASE_RATING, 'regression': 0.0, 'margin': 0.0}
+
+DEFAULT_GRID = {
+    'k': (8, 12, 16, 24, 32, 48),
+    'initial': (1350, 1400, 1450, 1500),
+    'regression': (0.0, 0.1, 0.2, 0.3, 0.5),
+    'margin': (0.0, 0.5, 1.0),
+}
+
+RESULT_COLUMNS = ['k', 'initial', 'regression', 'margin', 'log_loss', 'brier', 'pairs']
+
+
+class SweepEvent(NamedTuple):
+    """One ranked event: its season and its teams as dense indices, best rank first"""
+    year: int
+    ranked: object  # int array
+
+
+def build_grid(grid=None):
+    """Configurations as a dict of equal-length arrays, one entry per combination"""
+    import numpy as np
+
+    grid = {**DEFAULT_GRID, **(grid or {})}
+    combinations = set(itertools.product(*(grid[name] for name in CURRENT)))
+    combinations.add(tuple(CURRENT.values()))
+    combinations = sorted(combinations)
+    return {name: np.array([combination[i] for combination in combinations], dtype=float)
+            for i, name in enumerate(CURRENT)}
+
+
+def load_events(years):
+    """(events, team count): every ranked event of `years` in end date order, teams as dense indices"""
+    import numpy as np
+
+    ranked, missing = season_rankings(tba, years)
+    report_missing_rankings(missing)
+    index = {}
+    events = []
+    for event, rankings in ranked:
+        team_ids = registry.ids([row['team_key'] for row in rankings])
+        events.append(SweepEvent(int(event['key'][:4]),
+                                 np.array([index.setdefault(team_id, len(index)) for team_id in team_ids])))
+    return events, len(index)
+
+
+def replay(events, teams, configs, warmup_seasons=1):
+    """(log-loss sums, Brier sums, pairs scored) for every configuration in `configs`"""
+    import numpy as np
+
+    k, initial, regression, margin = (configs[name] for name in CURRENT)
+    width = len(k)
+    # Elo expectation 1 / (1 + 10 ** (diff / 400)) computed with exp, which is cheaper than power
+    scale = np.log(10) / 400
+    ratings = np.zeros((teams, width))
+    seen = np.zeros(teams, bool)
+    log_loss = np.zeros(width)
+    brier = np.zeros(width)
+    pairs = 0
+    multipliers = {}
+
+    first_year = events[0].year if events else 0
+    year = first_year
+    for event in events:
+        ranked = event.ranked
+        if event.year != year:
+            rated = np.flatnonzero(seen)
+            mean = ratings[rated].mean(axis=0)
+            ratings[rated] = mean + (1 - regression) * (ratings[rated] - mean)
+            year = event.year
+        new = ranked[~seen[ranked]]
+        ratings[new] = BASE_RATING if event.year == first_year else initial
+        seen[new] = True
+        size = len(ranked)
+        if size < 2:
+            continue
+
+        if event.year >= first_year + warmup_seasons:
+            current = ratings[ranked]  # (size, configurations)
+            upper = np.triu_indices(size, 1)
+            # Probability that each higher ranked team finishes above each lower ranked one
+            diff = current[upper[0]] - current[upper[1]]
+            p_above = 1 / (1 + np.exp(-diff * scale))
+            log_loss -= np.log(np.maximum(p_above, 1e-15)).sum(axis=0)
+            brier += ((1 - p_above) ** 2).sum(axis=0)
+            pairs += len(upper[0])
+
+        if size not in multipliers:
+            gaps = np.arange(size, dtype=float)
+            mean_gap = (size + 1) / 3
+            multipliers[size] = k * (gaps[:, None] / mean_gap) ** margin
+        pair_k = multipliers[size]
+        # Same order as seedingELO.apply_rankings: the higher team's rating carries through its pairs
+        for i in range(size - 1):
+            higher = ratings[ranked[i]].copy()
+            for gap, lower in enumerate(ranked[i + 1:], start=1):
+                lower_rating = ratings[lower]
+                delta = pair_k[gap] / (1 + np.exp((higher - lower_rating) * scale))
+                higher += delta
+                lower_rating -= delta
+            ratings[ranked[i]] = higher
+    return log_loss, brier, pairs
+
+
+def replay_chunk(events, teams, configs, warmup_seasons):
+    """replay() for one slice of the grid; runs in a worker process"""
+    log_loss, brier, pairs = replay(events, teams, configs, warmup_seasons)
+    return log_loss.tolist(), brier.tolist(), pairs
+
+
+def sweep(events, teams, configs, workers=None, warmup_seasons=1):
+    """Score every configuration; returns rows of RESULT_COLUMNS, best log-loss first"""
+    import numpy as np
+
+    width = len(configs['k'])
+    chunks = np.array_split(np.arange(width), min(workers or os.cpu_count() or 1, width))
+    with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+        futures = [pool.submit(replay_chunk, events, teams, {name: values[chunk] for name, values in configs.items()},
+                               warmup_seasons)
+                   for chunk in chunks]
+        rows = []
+        for chunk, future in zip(chunks, tqdm(futures, desc="Replaying configurations")):
+            log_loss, brier, pairs = future.result()
+            for i, position in enumerate(chunk):
+                rows.append([*(float(configs[name][position]) for name in CURRENT),
+                             log_loss[i] / max(pairs, 1), brier[i] / max(pairs, 1), pairs])
+    rows.sort(key=lambda row: row[4])
+    return rows
+
+
+def main(years=None, output='elo_sweep.csv', grid=None, workers=None, top=10):
+    if years is None:
+        years = list(range(2007, 2024))
+    events, teams = load_events(sorted(years))
+    if len({event.year for event in events}) < 2:
+        raise ValueError("The sweep needs at least two seasons: the first only warms the ratings up")
+    configs = build_grid(grid)
+    print(f"Replaying {len(events)} events for {len(configs['k'])} configurations")
+    rows = sweep(events, teams, configs, workers)
+
+    with open(output, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(RESULT_COLUMNS)
+        writer.writerows(rows)
+
+    current = next(row for row in rows if row[:4] == list(CURRENT.values()))
+    print(f"{'k':>6}{'initial':>9}{'regress':>9}{'margin':>8}{'log-loss':>10}{'brier':>9}")
+    for row in rows[:top] + [current]:
+        print(f"{row[0]:>6g}{row[1]:>9g}{row[2]:>9g}{row[3]:>8g}{row[4]:>10.4f}{row[5]:>9.4f}"
+              f"{'  (current)' if row is current else ''}")
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main([int(year) for year in sys.argv[1:]] or None)
@@ -1,153 +1,169 @@
-import tbapy
 import csv
-from tqdm import tqdm
-from dotenv import load_dotenv
-import os
-import pandas as pd
+from tba_utils import tba, iter_teams
+from team_registry import registry
+from profiling import timed
+from change_feed import ChangeFeed
 
-# Load environment variables and initialize TBA client
-load_dotenv()
-tba = tbapy.TBA(os.getenv("TBAKEY"))
+# Weights for each season of EPA data, most recent season first
+EPA_WEIGHTS = [0.5, 0.3, 0.2]
+
+# EPA tables keyed by season, most recent first, each indexed by team registry ID;
+# filled in by load_epa_data()
+epa_tables = {}
 
 def load_year_data(filename):
+    import pandas as pd
     try:
         df = pd.read_csv(filename)
-        # Use 'num' column as team numbers and set as index
+        # Index by team registry ID, keeping 'num' as the team number
         df['num'] = df['num'].astype(int)
-        df.set_index('num', inplace=True)
+        df.index = list(registry.ids_for_numbers(df['num']))
         return df
     except FileNotFoundError:
         print(f"Warning: {filename} not found")
         return pd.DataFrame()
 
-# Load data from all years
-df_2024 = load_year_data('2024_insights.csv')
-df_2023 = load_year_data('2023_insights.csv')
-df_2022 = load_year_data('2022_insights.csv')
+def load_opr_year(year):
+    """A season's OPR solved from TBA matches, shaped like an insights export"""
+    import opr
+    df = opr.season_table(year)
+    if df.empty:
+        print(f"Warning: no qualification matches played in {year}")
+        return df
+    names = {team['key']: team['nickname'] for team in iter_teams(tba, year=year, simple=True)}
+    df['team'] = [names.get(registry.key(team_id)) for team_id in df.index]
+    df['norm_epa'] = df['norm_opr']
+    return df
+
+# Load data from all years, from Statbotics exports or ('opr') computed locally
+def load_epa_data(years, ratings='epa'):
+    epa_tables.clear()
+    for year in sorted(years, reverse=True)[:len(EPA_WEIGHTS)]:
+        if ratings == 'opr':
+            epa_tables[year] = load_opr_year(year)
+        else:
+            epa_tables[year] = load_year_data(f'{year}_insights.csv')
 
 # Calculate weighted EPA
-def calculate_weighted_epa(team_number):
-    epa_2024 = df_2024.loc[team_number, 'norm_epa'] if team_number in df_2024.index else None
-    epa_2023 = df_2023.loc[team_number, 'norm_epa'] if team_number in df_2023.index else None
-    epa_2022 = df_2022.loc[team_number, 'norm_epa'] if team_number in df_2022.index else None
-    
+@timed
+def calculate_weighted_epa(team_id):
     # Count how many years have data
     weights = []
     epas = []
-    
-    if epa_2024 is not None:
-        weights.append(0.5)
-        epas.append(epa_2024)
-    if epa_2023 is not None:
-        weights.append(0.3)
-        epas.append(epa_2023)
-    if epa_2022 is not None:
-        weights.append(0.2)
-        epas.append(epa_2022)
-    
+
+    for weight, df in zip(EPA_WEIGHTS, epa_tables.values()):
+        if team_id in df.index:
+            weights.append(weight)
+            epas.append(df.loc[team_id, 'norm_epa'])
+
     # If no data available, return 0
     if not weights:
         return 0
-    
+
     # Normalize weights to sum to 1
     total_weight = sum(weights)
     normalized_weights = [w/total_weight for w in weights]
-    
+
     # Calculate weighted average
     weighted_epa = sum(epa * weight for epa, weight in zip(epas, normalized_weights))
     return weighted_epa
 
 # Create team data dictionary with weighted EPAs
-team_data = {}
-all_teams = set(df_2024.index) | set(df_2023.index) | set(df_2022.index)
-
-for team in all_teams:
-    weighted_epa = calculate_weighted_epa(team)
-    # Get team name from most recent year's data available
-    team_name = None
-    for df in [df_2024, df_2023, df_2022]:
-        if team in df.index:
-            team_name = df.loc[team, 'team']
-            break
-    team_name = team_name if team_name is not None else str(team)
-    
-    team_data[team] = {
-        'team': team,
-        'name': team_name,
-        'weighted_epa': weighted_epa
-    }
+def build_team_data():
+    team_data = {}
+    all_teams = set()
+    for df in epa_tables.values():
+        all_teams |= set(df.index)
+
+    for team in all_teams:
+        weighted_epa = calculate_weighted_epa(team)
+        # Get team name from most recent year's data available
+        team_name = None
+        for df in epa_tables.values():
+            if team in df.index:
+                team_name = df.loc[team, 'team']
+                break
+        team_name = team_name if team_name is not None else str(registry.number(team))
+
+        team_data[team] = {
+            'team': registry.number(team),
+            'name': team_name,
+            'weighted_epa': weighted_epa
+        }
+    return team_data
 
 # Export weighted EPA data to CSV
 def export_to_csv(team_data, file_name):
     with open(file_name, mode='w', newline='', encoding='utf-8') as file:
         writer = csv.writer(file)
-        writer.writerow(['Team Number', 'Team Name', '2024 EPA', '2023 EPA', '2022 EPA', 'Weighted EPA'])
-        for team_info in team_data.values():
-            team_num = team_info['team']
-            epa_2024 = df_2024.loc[team_num, 'norm_epa'] if team_num in df_2024.index else ''
-            epa_2023 = df_2023.loc[team_num, 'norm_epa'] if team_num in df_2023.index else ''
-            epa_2022 = df_2022.loc[team_num, 'norm_epa'] if team_num in df_2022.index else ''
-            
-            writer.writerow([
+        header = ['Team Number', 'Team Name'] + [f'{year} EPA' for year in epa_tables] + ['Weighted EPA']
+        feed = ChangeFeed(file_name, header, ['Team Number'])
+        writer.writerow(header)
+        for team_id, team_info in team_data.items():
+            epas = [df.loc[team_id, 'norm_epa'] if team_id in df.index else '' for df in epa_tables.values()]
+            row = [
                 team_info['team'],
                 team_info['name'],
-                epa_2024,
-                epa_2023,
-                epa_2022,
+                *epas,
                 team_info['weighted_epa']
-            ])
-
-# Function to get team number from team key
-def get_team_number(team_key):
-    try:
-        if team_key.startswith('frc'):
-            return int(team_key[3:])  # Removes the first three characters "frc"
+            ]
+            writer.writerow(row)
+            feed.add(row)
+    feed.close()
+
+def event_rosters(index, event_year):
+    """{event key: team IDs} for every `event_year` event in a refreshed SeasonIndex, by event key"""
+    return {event.key: registry.ids(index.rosters.get(event.key, ()))
+            for event in sorted(index.events.values(), key=lambda event: event.key)
+            if event.year == event_year}
+
+def calculate_event_strength(event_year, team_data):
+    from season_index import SeasonIndex
+    from strength_index import StrengthIndex, TOP_KS
+
+    # Rosters come from the season index, which only refetches those of events that haven't finished
+    index = SeasonIndex()
+    index.refresh(tba, [event_year])
+    rosters = event_rosters(index, event_year)
+    index.close()
+
+    # Keep each event's teams in rating order, so Top2/4/8/24 are lookups rather than sorts
+    strength = StrengthIndex({team_id: team['weighted_epa'] for team_id, team in team_data.items()}, rosters)
+
+    # Initialize data for event strength
+    event_strength_data = []
+    for event in rosters:
+        # Only process events with valid teams
+        if strength.rosters[event]:
+            # None for each of Top2, Top4, Top8, Top24 the event has too few rated teams for
+            event_strength_data.append([event, *strength.strength(event, TOP_KS)])
         else:
-            print(f"Warning: Invalid team key format: {team_key}")
-            return None
-    except (ValueError, AttributeError) as e:
-        print(f"Error processing team key: {team_key}")
-        return None
-
-# Retrieve events for the year 2024
-events = tba.events(year=2025, keys=True)
-
-# Initialize data for event strength
-event_strength_data = []
-
-# Process each event
-for event in tqdm(events):
-    # Retrieve teams for the event
-    event_teams = tba.event_teams(event, keys=True)
-    team_epas = []
-
-    # Retrieve weighted EPA for each team
-    for team_key in event_teams:
-        team_number = get_team_number(team_key)
-        if team_number is not None and team_number in team_data:
-            team_epas.append((team_number, team_data[team_number]['weighted_epa']))
-
-    # Only process events with valid teams
-    if team_epas:
-        # Sort teams by EPA
-        sorted_teams = sorted(team_epas, key=lambda x: x[1], reverse=True)
-
-        # Extract top teams for Top2, Top4, Top8, Top24, handling cases with fewer teams
-        top2 = sorted_teams[1][1] if len(sorted_teams) > 1 else None
-        top4 = sorted_teams[3][1] if len(sorted_teams) > 3 else None
-        top8 = sorted_teams[7][1] if len(sorted_teams) > 7 else None
-        top24 = sorted_teams[23][1] if len(sorted_teams) > 23 else None
-
-        # Add data to event strength data
-        event_strength_data.append([event, top2, top4, top8, top24])
-    else:
-        print(f"Warning: No valid teams found for event {event}")
-
-# Export event strength data to CSV
-with open('Event_Strength.csv', mode='w', newline='', encoding='utf-8') as file:
-    writer = csv.writer(file)
-    writer.writerow(['Event Code', 'Top2', 'Top4', 'Top8', 'Top24'])
-    writer.writerows(event_strength_data)
-
-# Export the weighted EPA data
-export_to_csv(team_data, 'EPA_data.csv')
+            print(f"Warning: No valid teams found for event {event}")
+    return event_strength_data
+
+def main(years=None, event_year=None, ratings='epa'):
+    if years is None:
+        years = [2024, 2023, 2022]
+    if event_year is None:
+        event_year = max(years) + 1
+
+    load_epa_data(years, ratings)
+    team_data = build_team_data()
+    event_strength_data = calculate_event_strength(event_year, team_data)
+
+    # Export event strength data to CSV
+    with open('Event_Strength.csv', mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        header = ['Event Code', 'Top2', 'Top4', 'Top8', 'Top24']
+        feed = ChangeFeed('Event_Strength.csv', header, ['Event Code'])
+        writer.writerow(header)
+        writer.writerows(event_strength_data)
+        for row in event_strength_data:
+            feed.add(row)
+    feed.close()
+
+    # Export the weighted EPA data
+    export_to_csv(team_data, 'EPA_data.csv')
+
+if __name__ == "__main__":
+    main()
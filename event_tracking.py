@@ -1,13 +1,332 @@
-import tbapy
-from dotenv import load_dotenv
+import csv
+import datetime
+import hashlib
+import hmac
+import json
 import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from tqdm import tqdm
+import FFBigData
+import seedingELO
+from compression import open_text
+from compact_records import compact_match, compact_awards, team_ids
+from tba_utils import tba, get_client
+from team_registry import registry
 
+# TBA webhook message types the watcher acts on
+HANDLED_MESSAGES = {'match_score', 'awards_posted', 'alliance_selection'}
 
-load_dotenv()
 
-events = tba.district_events("2024ont")
-for event in events:
-    print(event['key'])
-    event_teams = tba.event_teams(event["key"])
-    print(f"Event: {event['key']}, teams: {len(event_teams)}")
\ No newline at end of file
+def log_progress(message):
+    tqdm.write(f"[{time.strftime('%H:%M:%S')}] {message}")
+
+
+def load_elo_ratings(path='updated_elo_ratings.csv'):
+    """Starting Elo ratings keyed by team ID, from the last seedingELO run"""
+    ratings = {}
+    try:
+        with open(path, newline='') as file:
+            for row in csv.DictReader(file):
+                ratings[registry.id(row['Team'])] = float(row['Elo Rating'])
+    except FileNotFoundError:
+        log_progress(f"Warning: {path} not found, starting every team at 1500")
+    return ratings
+
+
+class EventWatcher:
+    """Live per-event state that applies each change incrementally.
+
+    A new match, award list, alliance selection or ranking only rescores the
+    teams it touches at that one event; nothing else in the season is recomputed.
+    """
+
+    def __init__(self, elo_ratings=None, output='live_event_scores.csv'):
+        self.elo_ratings = elo_ratings if elo_ratings is not None else {}
+        self.output = output
+        self.events = {}
+        self._lock = threading.Lock()
+
+    def event_state(self, event_key):
+        if event_key not in self.events:
+            try:
+                event = tba.event(event_key, simple=True)
+            except Exception as e:
+                # Replayed webhooks may arrive with no TBA access; event keys start with the year
+                log_progress(f"Couldn't fetch {event_key} ({str(e)}), scoring it as a regional")
+                event = {'year': int(event_key[:4]), 'event_type': 0}
+            self.events[event_key] = {
+                'event': {'key': event_key, 'year': event['year'], 'event_type': event['event_type']},
+                'matches': {},
+                'alliances': [],
+                'awards': [],
+                'rankings': None,
+                'district_points': {},
+                'slff': {},
+                'elo_baseline': {},
+            }
+        return self.events[event_key]
+
+    def apply(self, message_type, data):
+        """Apply one webhook-style message and return the IDs of teams whose scores changed"""
+        with self._lock:
+            event_key = data.get('event_key')
+            if message_type == 'match_score':
+                affected = self.on_match(event_key, data['match'])
+            elif message_type == 'awards_posted':
+                affected = self.on_awards(event_key, data.get('awards') or tba.event_awards(event_key))
+            elif message_type == 'alliance_selection':
+                alliances = (data.get('event') or {}).get('alliances') or tba.event_alliances(event_key)
+                affected = self.on_alliances(event_key, alliances)
+            elif message_type == 'rankings':
+                affected = self.on_rankings(event_key, data['rankings'])
+            else:
+                return set()
+            if message_type in ('rankings', 'alliance_selection'):
+                affected |= self.recompute_district_points(event_key)
+            self.rescore(event_key, affected)
+            self.write_scores()
+            return affected
+
+    def on_match(self, event_key, match):
+        state = self.event_state(event_key)
+        record = compact_match(match)
+        state['matches'][record.key] = record
+        # Playoff wins can also change the upper bracket bonus for whole alliances
+        affected = set(record.red) | set(record.blue)
+        if record.comp_level != 'qm':
+            for picks in state['alliances']:
+                if affected & set(picks):
+                    affected |= set(picks)
+        return affected
+
+    def on_awards(self, event_key, awards):
+        state = self.event_state(event_key)
+        previous = {team for award in state['awards'] for team in award.teams}
+        state['awards'] = compact_awards(awards)
+        return previous | {team for award in state['awards'] for team in award.teams}
+
+    def on_alliances(self, event_key, alliances):
+        state = self.event_state(event_key)
+        state['alliances'] = [team_ids(alliance['picks']) for alliance in alliances or []]
+        return {team for picks in state['alliances'] for team in picks}
+
+    def on_rankings(self, event_key, rankings):
+        """Re-derive this event's Elo change from the ratings teams arrived with"""
+        state = self.event_state(event_key)
+        rows = sorted((rankings or {}).get('rankings') or [], key=lambda row: row.get('rank') or 0)
+        ranked_ids = registry.ids(row['team_key'] for row in rows)
+        state['rankings'] = ranked_ids
+        baseline = state['elo_baseline']
+        for team_id in ranked_ids:
+            baseline.setdefault(team_id, self.elo_ratings.get(team_id, 1500))
+        ratings = {team_id: baseline[team_id] for team_id in ranked_ids}
+        seedingELO.apply_rankings(ranked_ids, ratings)
+        self.elo_ratings.update(ratings)
+        return set(ranked_ids)
+
+    def refresh_rankings(self, event_key):
+        """Apply the event's current rankings if they changed; webhooks don't carry them"""
+        try:
+            # A conditional request, so rankings aren't served from the cache long after a match
+            changed, rankings = get_client().poll(f'event/{event_key}/rankings')
+        except Exception as e:
+            log_progress(f"Couldn't refresh rankings for {event_key}: {str(e)}")
+            return set()
+        with self._lock:
+            ranked = self.event_state(event_key)['rankings'] is not None
+        if not rankings or (ranked and not changed):
+            return set()
+        return self.apply('rankings', {'event_key': event_key, 'rankings': rankings})
+
+    def recompute_district_points(self, event_key):
+        """SLFF district points (qualification plus alliance selection) from the rankings and alliances held"""
+        from district_points import season_points
+        state = self.event_state(event_key)
+        data = {'rankings': state['rankings'] or [], 'alliances': state['alliances']}
+        points = season_points([(state['event'], data)], components=('qual', 'alliance'))[event_key]
+        previous = state['district_points']
+        state['district_points'] = {team: team_points.qual_points + team_points.alliance_points
+                                    for team, team_points in points.items()}
+        return {team for team in set(previous) | set(state['district_points'])
+                if previous.get(team) != state['district_points'].get(team)}
+
+    def rescore(self, event_key, team_ids_to_score):
+        state = self.event_state(event_key)
+        event_data = {
+            'district_points': state['district_points'],
+            'matches': [match for match in state['matches'].values() if match.comp_level != 'qm'],
+            'alliances': state['alliances'],
+            'awards': state['awards'],
+        }
+        for team_id in team_ids_to_score:
+            state['slff'][team_id] = FFBigData.event_components(team_id, state['event'], event_data).total
+
+    def write_scores(self):
+        tmp_path = f"{self.output}.tmp"
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(['Event', 'Team Number', 'SLFF Points', 'District Points', 'Elo'])
+            for event_key, state in sorted(self.events.items()):
+                teams = set(state['slff']) | set(state['elo_baseline'])
+                for team_id in sorted(teams, key=registry.sort_key):
+                    writer.writerow([event_key, registry.number(team_id), state['slff'].get(team_id, 0),
+                                     state['district_points'].get(team_id, 0),
+                                     round(self.elo_ratings.get(team_id, 1500), 1)])
+        os.replace(tmp_path, self.output)
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """Accepts TBA webhook POSTs ({"message_type": ..., "message_data": ...})"""
+
+    watcher = None
+    secret = None
+    record_path = None
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.secret:
+            expected = hmac.new(self.secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+            if not hmac.compare_digest(expected, self.headers.get('X-TBA-HMAC', '')):
+                self.send_response(401)
+                self.end_headers()
+                return
+        try:
+            message = json.loads(body)
+        except ValueError:
+            self.send_response(400)
+            self.end_headers()
+            return
+
+        if self.record_path:
+            with open_text(self.record_path, 'a') as file:
+                file.write(json.dumps(message) + '\n')
+
+        message_type = message.get('message_type')
+        message_data = message.get('message_data') or {}
+        affected = set()
+        if message_type in HANDLED_MESSAGES:
+            try:
+                affected = self.watcher.apply(message_type, message_data)
+                if message_type == 'match_score' and message_data['match'].get('comp_level') == 'qm':
+                    # Every qualification result can reorder the rankings the Elo is derived from
+                    affected |= self.watcher.refresh_rankings(message_data.get('event_key'))
+            except Exception as e:
+                log_progress(f"Error applying {message_type}: {str(e)}")
+                self.send_response(500)
+                self.end_headers()
+                return
+            log_progress(f"{message_type} for {message_data.get('event_key')}: "
+                         f"updated {len(affected)} teams")
+        elif message_type == 'verification':
+            log_progress(f"Webhook verification key: {message_data.get('verification_key')}")
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({'updated_teams': registry.numbers(sorted(affected))}).encode('utf-8'))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(watcher, port=8080, secret=None, record_path=None):
+    """Run the webhook endpoint until interrupted"""
+    handler = type('BoundWebhookHandler', (WebhookHandler,),
+                   {'watcher': watcher, 'secret': secret, 'record_path': record_path})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    log_progress(f"Listening for TBA webhooks on http://127.0.0.1:{port}/")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def active_event_keys(year=None):
+    """District and regional events running today"""
+    today = datetime.date.today()
+    events = tba.events(year or today.year, simple=True)
+    return [event['key'] for event in events
+            if event['event_type'] in [0, 1] and event['start_date'] <= today.isoformat() <= event['end_date']]
+
+
+def poll_event(watcher, event_key):
+    """Conditionally re-fetch one event and apply whatever changed.
+
+    The ETags sent are persisted with the response cache, so after a restart
+    TBA can answer 304 for data this process has never applied. The first
+    poll of an event therefore applies the cached bodies as well.
+    """
+    client = get_client()
+    first_poll = event_key not in watcher.events
+    state = watcher.event_state(event_key)
+
+    changed, matches = client.poll(f'event/{event_key}/matches')
+    if changed or first_poll:
+        for match in matches or []:
+            known = state['matches'].get(match['key'])
+            if known is None or known != compact_match(match):
+                watcher.apply('match_score', {'event_key': event_key, 'match': match})
+
+    changed, alliances = client.poll(f'event/{event_key}/alliances')
+    if (changed or first_poll) and alliances:
+        watcher.apply('alliance_selection', {'event_key': event_key, 'event': {'alliances': alliances}})
+
+    changed, awards = client.poll(f'event/{event_key}/awards')
+    if (changed or first_poll) and awards:
+        watcher.apply('awards_posted', {'event_key': event_key, 'awards': awards})
+
+    changed, rankings = client.poll(f'event/{event_key}/rankings')
+    if (changed or first_poll) and rankings:
+        watcher.apply('rankings', {'event_key': event_key, 'rankings': rankings})
+
+
+def poll(watcher, event_keys=None, interval=60):
+    """Poll active events until interrupted"""
+    while True:
+        keys = event_keys or active_event_keys()
+        for event_key in keys:
+            try:
+                poll_event(watcher, event_key)
+            except Exception as e:
+                log_progress(f"Error polling {event_key}: {str(e)}")
+        time.sleep(interval)
+
+
+def replay(path, url='http://127.0.0.1:8080/', delay=0.0, secret=None):
+    """POST recorded webhook payloads (one JSON message per line, optionally .gz/.zst) to a running watcher"""
+    import urllib.request
+    with open_text(path) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            body = line.strip().encode('utf-8')
+            headers = {'Content-Type': 'application/json'}
+            if secret:
+                headers['X-TBA-HMAC'] = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+            request = urllib.request.Request(url, data=body, headers=headers, method='POST')
+            with urllib.request.urlopen(request) as response:
+                log_progress(f"{json.loads(body).get('message_type')}: {response.read().decode('utf-8')}")
+            time.sleep(delay)
+
+
+def main(events=None, port=None, interval=60, replay_path=None, secret=None, record_path=None):
+    """Watch events live.
+
+    With `port`, listen for TBA webhooks (optionally recording them to
+    `record_path`); otherwise poll `events` (default: every event running
+    today). With `replay_path`, send recorded webhooks to a watcher on `port`.
+    """
+    if replay_path:
+        replay(replay_path, f'http://127.0.0.1:{port or 8080}/', secret=secret)
+        return
+
+    watcher = EventWatcher(load_elo_ratings())
+    if port:
+        serve(watcher, port, secret=secret or os.getenv("TBA_WEBHOOK_SECRET"), record_path=record_path)
+    else:
+        poll(watcher, events, interval)
+
+if __name__ == "__main__":
+    main()
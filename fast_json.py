@@ -0,0 +1,21 @@
+import json
+
+# orjson parses TBA payloads several times faster than the json module; it's optional
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data):
+    """Parse JSON from bytes or str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj):
+    """Serialize to UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
@@ -0,0 +1,382 @@
+"""FFBigData split into shards of teams, scored by many worker processes or machines.
+
+The coordinator streams the active team list once, splits it into shards and
+queues them in a SQLite work queue. Workers claim one shard at a time under
+a lease, score it with FFBigData.process_team_batch and store the rows in a
+content-addressed result store. A shard whose worker fails is retried on its
+own, up to MAX_ATTEMPTS times, and one whose worker dies is reclaimed once
+its lease runs out. The coordinator then merges every shard's rows into
+`BIG DATA.csv`. Rerunning the coordinator resumes the same plan, so only
+shards that haven't succeeded are run again.
+
+Locally the coordinator starts the workers itself, one per API key (TBAKEYS
+holds several, comma-separated; otherwise TBAKEY is used), all sharing the
+response cache, score cache, queue and result store:
+
+    python ffbigdata_shards.py coordinate --processes 4
+
+Workers on other machines need the queue and result store on shared storage
+(and ideally the response cache too), and their own TBAKEY:
+
+    python ffbigdata_shards.py coordinate --processes 0
+    python ffbigdata_shards.py worker --queue /shared/ffbigdata_queue.sqlite3 --results /shared/ffbigdata_results
+"""
+import argparse
+import csv
+import hashlib
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from typing import NamedTuple
+from tqdm import tqdm
+import fast_json
+import tba_utils
+import FFBigData
+from tba_utils import batched
+from slff_score_cache import EventScoreCache, DEFAULT_CACHE_PATH
+
+DEFAULT_QUEUE_PATH = 'ffbigdata_queue.sqlite3'
+DEFAULT_RESULTS_DIR = 'ffbigdata_results'
+DEFAULT_SHARD_SIZE = 50
+MAX_ATTEMPTS = 3
+# Workers renew their lease every third of it while a shard runs
+LEASE_SECONDS = 300
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shards (
+    shard_id INTEGER PRIMARY KEY,
+    teams TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    result TEXT,
+    error TEXT
+);
+'''
+
+
+class Shard(NamedTuple):
+    shard_id: int
+    teams: list
+    attempts: int
+
+
+class ShardQueue:
+    """Shards of team keys and their status (pending, running, done or failed), in SQLite.
+
+    Claims take a write lock on the database, so any number of worker
+    processes can share one queue file.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH):
+        # Autocommit mode, so claims can take the write lock up front with BEGIN IMMEDIATE
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def years(self):
+        row = self.connection.execute("SELECT value FROM meta WHERE name = 'years'").fetchone()
+        return fast_json.loads(row[0]) if row else None
+
+    def plan(self, shards, years):
+        """Replace the queue with new shards (lists of team keys) for `years`"""
+        with self._lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            self.connection.execute('DELETE FROM shards')
+            self.connection.executemany('INSERT INTO shards (teams) VALUES (?)',
+                                        [(fast_json.dumps(list(teams)).decode('utf-8'),) for teams in shards])
+            self.connection.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('years', ?)",
+                                    (fast_json.dumps(list(years)).decode('utf-8'),))
+            self.connection.execute('COMMIT')
+
+    def retry_failed(self):
+        """Give failed shards a fresh set of attempts; returns how many"""
+        with self._lock:
+            return self.connection.execute(
+                "UPDATE shards SET status = 'pending', attempts = 0, worker = NULL WHERE status = 'failed'").rowcount
+
+    def claim(self, worker, lease=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        """The next shard to run, leased to `worker`, or None once nothing is left to claim"""
+        now = time.time()
+        with self._lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                # Shards whose worker died without finishing come back once their lease runs out
+                self.connection.execute(
+                    "UPDATE shards SET status = 'failed', error = 'lease expired on the last attempt' "
+                    "WHERE status = 'running' AND lease_until < ? AND attempts >= ?", (now, max_attempts))
+                row = self.connection.execute(
+                    "SELECT shard_id, teams, attempts FROM shards "
+                    "WHERE status = 'pending' OR (status = 'running' AND lease_until < ?) "
+                    "ORDER BY shard_id LIMIT 1", (now,)).fetchone()
+                if row is not None:
+                    self.connection.execute(
+                        "UPDATE shards SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                        "WHERE shard_id = ?", (worker, now + lease, row[0]))
+                self.connection.execute('COMMIT')
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+        if row is None:
+            return None
+        return Shard(row[0], fast_json.loads(row[1]), row[2] + 1)
+
+    def renew(self, shard_id, worker, lease=LEASE_SECONDS):
+        with self._lock:
+            self.connection.execute(
+                "UPDATE shards SET lease_until = ? WHERE shard_id = ? AND worker = ? AND status = 'running'",
+                (time.time() + lease, shard_id, worker))
+
+    def complete(self, shard_id, worker, result):
+        """Record the digest of a shard's rows; ignored if the lease was lost and the shard reassigned"""
+        with self._lock:
+            self.connection.execute(
+                "UPDATE shards SET status = 'done', result = ?, error = NULL "
+                "WHERE shard_id = ? AND worker = ? AND status = 'running'", (result, shard_id, worker))
+
+    def fail(self, shard_id, worker, error, max_attempts=MAX_ATTEMPTS):
+        """Put a shard back in the queue, or mark it failed once it has used up its attempts"""
+        with self._lock:
+            self.connection.execute(
+                "UPDATE shards SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "error = ?, worker = NULL WHERE shard_id = ? AND worker = ? AND status = 'running'",
+                (max_attempts, error, shard_id, worker))
+
+    def counts(self):
+        """{status: number of shards}"""
+        counts = dict.fromkeys(['pending', 'running', 'done', 'failed'], 0)
+        counts.update(self.connection.execute('SELECT status, COUNT(*) FROM shards GROUP BY status'))
+        return counts
+
+    def results(self):
+        """Result digests of the finished shards, in shard order"""
+        return [digest for digest, in self.connection.execute(
+            "SELECT result FROM shards WHERE status = 'done' ORDER BY shard_id")]
+
+    def failures(self):
+        """(shard ID, teams, error) for every failed shard"""
+        return [(shard_id, fast_json.loads(teams), error) for shard_id, teams, error in self.connection.execute(
+            "SELECT shard_id, teams, error FROM shards WHERE status = 'failed' ORDER BY shard_id")]
+
+    def close(self):
+        self.connection.close()
+
+
+class ResultStore:
+    """Shard results stored under the SHA-256 of their content.
+
+    Writing the same rows twice (a shard retried after a lost lease) lands on
+    the same file, and reads check the content against its name.
+    """
+
+    def __init__(self, directory=DEFAULT_RESULTS_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, digest):
+        return os.path.join(self.directory, f'{digest}.json')
+
+    def put(self, rows):
+        body = fast_json.dumps(rows)
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as file:
+                file.write(body)
+            os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest):
+        with open(self._path(digest), 'rb') as file:
+            body = file.read()
+        if hashlib.sha256(body).hexdigest() != digest:
+            raise ValueError(f"Shard result {digest} is corrupt")
+        return fast_json.loads(body)
+
+
+class Heartbeat:
+    """Keeps renewing a shard's lease from a background thread while it runs"""
+
+    def __init__(self, queue, shard_id, worker, lease=LEASE_SECONDS):
+        self._stop = threading.Event()
+
+        def run():
+            while not self._stop.wait(lease / 3):
+                queue.renew(shard_id, worker, lease)
+
+        self._thread = threading.Thread(target=run, name=f'lease-{shard_id}', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def worker_name():
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def api_keys():
+    """Every TBA API key available: TBAKEYS (comma-separated), or TBAKEY"""
+    from dotenv import load_dotenv
+    load_dotenv()
+    keys = [key.strip() for key in os.getenv('TBAKEYS', '').split(',') if key.strip()]
+    return keys or [key for key in [os.getenv('TBAKEY')] if key]
+
+
+def run_worker(queue_path=DEFAULT_QUEUE_PATH, results_dir=DEFAULT_RESULTS_DIR, cache_path=DEFAULT_CACHE_PATH,
+               scoring_workers=None, lease=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+    """Claim and score shards until the queue has nothing left; returns the number of shards completed"""
+    from concurrent.futures import ProcessPoolExecutor
+    queue = ShardQueue(queue_path)
+    years = queue.years()
+    if not years:
+        raise ValueError(f"{queue_path} has no planned shards; run the coordinator first")
+    years = sorted(years, reverse=True)
+    store = ResultStore(results_dir)
+    score_cache = EventScoreCache(cache_path, version=FFBigData.SCORE_VERSION)
+    name = worker_name()
+    completed = 0
+    with ProcessPoolExecutor(max_workers=scoring_workers) as scoring_pool:
+        while (shard := queue.claim(name, lease, max_attempts)) is not None:
+            FFBigData.log_progress(f"{name}: shard {shard.shard_id} ({len(shard.teams)} teams, "
+                                   f"attempt {shard.attempts})")
+            heartbeat = Heartbeat(queue, shard.shard_id, name, lease)
+            try:
+                rows = FFBigData.process_team_batch(shard.teams, scoring_pool, score_cache, years)
+                queue.complete(shard.shard_id, name, store.put(rows))
+                completed += 1
+            except Exception as e:
+                FFBigData.log_progress(f"{name}: shard {shard.shard_id} failed: {str(e)}")
+                queue.fail(shard.shard_id, name, f'{type(e).__name__}: {e}', max_attempts)
+            finally:
+                heartbeat.stop()
+    score_cache.close()
+    queue.close()
+    return completed
+
+
+def start_workers(count, queue_path, results_dir, cache_path):
+    """Start `count` local worker processes, spreading the API keys across them"""
+    keys = api_keys()
+    command = [sys.executable, os.path.abspath(__file__), 'worker', '--queue', queue_path,
+               '--results', results_dir, '--score-cache', cache_path,
+               '--cache-dir', tba_utils.settings['cache_dir'], '--workers', str(tba_utils.settings['workers'])]
+    if tba_utils.settings['offline']:
+        command.append('--offline')
+    processes = []
+    for i in range(count):
+        env = dict(os.environ, TBAKEY=keys[i % len(keys)]) if keys else None
+        processes.append(subprocess.Popen(command, env=env))
+    return processes
+
+
+def merge(queue, store, years, output, partial=False):
+    """Write every finished shard's rows to `output`; returns the number of rows.
+
+    With `partial` (some shards failed or never finished), the change feed
+    lists the missing shards' rows as skipped instead of deleting them.
+    """
+    from change_feed import ChangeFeed
+    rows = 0
+    header = FFBigData.build_header(sorted(years, reverse=True))
+    feed = ChangeFeed(output, header, ['Team Number'])
+    with open(output, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        for digest in queue.results():
+            shard_rows = store.get(digest)
+            writer.writerows(shard_rows)
+            for row in shard_rows:
+                feed.add(row)
+            rows += len(shard_rows)
+    feed.close(partial=partial)
+    return rows
+
+
+def main(years=None, rebuild=False, processes=None, shard_size=DEFAULT_SHARD_SIZE, queue_path=DEFAULT_QUEUE_PATH,
+         results_dir=DEFAULT_RESULTS_DIR, cache_path=DEFAULT_CACHE_PATH, output='BIG DATA.csv'):
+    """Coordinate a sharded FFBigData run and merge the results into `output`.
+
+    A queue already planned for the same `years` is resumed (its failed
+    shards retried) unless `rebuild` is set, which also clears the score
+    cache. `processes` local workers are started (default: one per API key,
+    at least two); with 0, only workers started elsewhere take shards.
+    """
+    years = sorted(years or FFBigData.YEARS, reverse=True)
+    queue = ShardQueue(queue_path)
+    store = ResultStore(results_dir)
+    if rebuild:
+        score_cache = EventScoreCache(cache_path, version=FFBigData.SCORE_VERSION)
+        score_cache.reset()
+        score_cache.close()
+    if rebuild or queue.years() != years or not sum(queue.counts().values()):
+        teams = list(FFBigData.iter_active_teams(years=years))
+        queue.plan(batched(teams, shard_size), years)
+        FFBigData.log_progress(f"Planned {queue.counts()['pending']} shards of up to {shard_size} teams")
+    else:
+        retried = queue.retry_failed()
+        FFBigData.log_progress(f"Resuming: {queue.counts()['done']} shards already done, {retried} failed retried")
+
+    if processes is None:
+        processes = max(len(api_keys()), 2)
+    workers = start_workers(processes, queue_path, results_dir, cache_path)
+    counts = queue.counts()
+    with tqdm(total=sum(counts.values()), initial=counts['done'] + counts['failed'], desc="Shards") as progress:
+        while counts['pending'] or counts['running']:
+            if workers and all(worker.poll() is not None for worker in workers):
+                break
+            time.sleep(1)
+            counts = queue.counts()
+            progress.update(counts['done'] + counts['failed'] - progress.n)
+    for worker in workers:
+        worker.wait()
+
+    counts = queue.counts()
+    failures = queue.failures()
+    unfinished = counts['pending'] + counts['running']
+    rows = merge(queue, store, years, output, partial=bool(failures or unfinished))
+    FFBigData.log_progress(f"Merged {counts['done']} shards ({rows} teams) into {output}")
+    for shard_id, teams, error in failures:
+        FFBigData.log_progress(f"Shard {shard_id} failed ({teams[0]}..{teams[-1]}): {error}")
+    if failures or unfinished:
+        FFBigData.log_progress(f"{len(failures)} shards failed and {unfinished} are unfinished; "
+                               f"rerun to retry just those")
+    queue.close()
+    return len(failures) + unfinished
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('role', choices=['coordinate', 'worker'])
+    parser.add_argument('--years', type=int, nargs='+', help='seasons to score (coordinate)')
+    parser.add_argument('--rebuild', action='store_true', help='plan new shards and rescore every event (coordinate)')
+    parser.add_argument('--processes', type=int, help='local workers to start (coordinate; default one per API key)')
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE, help='teams per shard (coordinate)')
+    parser.add_argument('--queue', default=DEFAULT_QUEUE_PATH, help='shared work queue')
+    parser.add_argument('--results', default=DEFAULT_RESULTS_DIR, help='shared result store')
+    parser.add_argument('--score-cache', default=DEFAULT_CACHE_PATH, help='SLFF event score cache')
+    parser.add_argument('--cache-dir', help='TBA response cache shared by the workers')
+    parser.add_argument('--workers', type=int, help='request threads per worker')
+    parser.add_argument('--offline', action='store_true', default=None, help='only use cached responses')
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    tba_utils.configure(workers=args.workers, offline=args.offline, cache_dir=args.cache_dir)
+    if args.role == 'worker':
+        run_worker(args.queue, args.results, args.score_cache)
+    else:
+        sys.exit(1 if main(args.years, args.rebuild, args.processes, args.shard_size, args.queue, args.results,
+                           args.score_cache) else 0)
@@ -0,0 +1,219 @@
+"""OPR, DPR and component OPR from qualification matches, solved locally.
+
+Each event is its own least-squares system: one row per alliance in a played
+qualification match, one column per team, and one right-hand side per rated
+quantity (the alliance's score for OPR, its opponent's score for DPR, and any
+score breakdown fields asked for). OprEngine keeps each event's normal
+equations (AᵀA and AᵀB), so adding or correcting a match is a small sparse
+update and only the events that changed are solved again, each with one
+Cholesky factorization for every rated quantity at once.
+
+    python opr.py 2024 autoPoints teleopPoints
+"""
+import sys
+from tqdm import tqdm
+from tba_utils import tba, get_executor
+from team_registry import registry, team_number
+
+# Keeps the normal equations positive definite before every team has played
+# enough matches to be separable; small enough not to move a determined OPR
+RIDGE = 1e-6
+
+
+class EventSystem:
+    """Normal equations for one event, grown as teams appear"""
+
+    def __init__(self, width):
+        import numpy as np
+
+        self.teams = {}  # team key -> column
+        self.normal = np.zeros((0, 0))
+        self.rhs = np.zeros((0, width))
+        self.matches = 0
+        self.solution = None
+
+    def columns(self, team_keys):
+        import numpy as np
+
+        for team_key in team_keys:
+            if team_key not in self.teams:
+                self.teams[team_key] = len(self.teams)
+        size = len(self.teams)
+        if size > len(self.normal):
+            # Grow by doubling so a team appearing late doesn't copy the arrays every time
+            capacity = max(size, 2 * len(self.normal), 8)
+            normal = np.zeros((capacity, capacity))
+            normal[:len(self.normal), :len(self.normal)] = self.normal
+            rhs = np.zeros((capacity, self.rhs.shape[1]))
+            rhs[:len(self.rhs)] = self.rhs
+            self.normal, self.rhs = normal, rhs
+        return [self.teams[team_key] for team_key in team_keys]
+
+    def update(self, rows, values, weight):
+        """Add (weight 1) or remove (weight -1) alliance rows: team columns and their right-hand sides"""
+        import numpy as np
+        from scipy import sparse
+
+        indices = [self.columns(team_keys) for team_keys in rows]
+        size = len(self.teams)
+        design = sparse.csr_matrix(
+            (np.ones(sum(map(len, indices))), np.concatenate(indices), np.cumsum([0] + [len(i) for i in indices])),
+            shape=(len(indices), size))
+        weighted = design.multiply(weight).tocsr()
+        self.normal[:size, :size] += (design.T @ weighted).toarray()
+        self.rhs[:size] += weighted.T @ np.asarray(values, dtype=float)
+
+    def solve(self):
+        import numpy as np
+        from scipy.linalg import cho_factor, cho_solve
+
+        size = len(self.teams)
+        normal = self.normal[:size, :size] + RIDGE * np.eye(size)
+        self.solution = cho_solve(cho_factor(normal), self.rhs[:size])
+        return self.solution
+
+
+class OprEngine:
+    """OPR, DPR and component OPR for every event added, updated incrementally.
+
+    `components` are alliance-level score breakdown fields (e.g. 'autoPoints');
+    each gets its own OPR column alongside 'opr' and 'dpr'.
+    """
+
+    def __init__(self, components=()):
+        self.components = list(components)
+        self.columns = ['opr', 'dpr'] + self.components
+        self.events = {}
+        self._contributions = {}  # match key -> (event key, rows, values) it added
+        self._dirty = set()
+
+    def alliance_rows(self, match):
+        """(team keys, values) per alliance of a played qualification match, or None"""
+        if match['comp_level'] != 'qm':
+            return None
+        alliances = match['alliances']
+        red, blue = alliances['red'], alliances['blue']
+        if red['score'] is None or red['score'] < 0 or blue['score'] is None or blue['score'] < 0:
+            return None
+        breakdown = (match['score_breakdown'] if self.components else None) or {}
+        rows, values = [], []
+        for own, opponent, color in [(red, blue, 'red'), (blue, red, 'blue')]:
+            components = [(breakdown.get(color) or {}).get(field) or 0 for field in self.components]
+            rows.append(list(own['team_keys']))
+            values.append([own['score'], opponent['score']] + components)
+        return rows, values
+
+    def add_matches(self, matches):
+        """Add or replace matches; a match seen before has its old result taken out first.
+
+        A match that comes back unplayed (no score, or -1) is only taken out.
+        """
+        additions = {}
+        for match in matches:
+            previous = self._contributions.pop(match['key'], None)
+            if previous is not None:
+                self._system(previous[0]).update(previous[1], previous[2], -1)
+                self._system(previous[0]).matches -= 1
+                self._dirty.add(previous[0])
+            contribution = self.alliance_rows(match)
+            if contribution is None:
+                continue
+            event_key = match['event_key']
+            self._contributions[match['key']] = (event_key, *contribution)
+            batch = additions.setdefault(event_key, ([], []))
+            batch[0].extend(contribution[0])
+            batch[1].extend(contribution[1])
+        # One sparse design matrix per event for everything added together
+        for event_key, (rows, values) in additions.items():
+            system = self._system(event_key)
+            system.update(rows, values, 1)
+            system.matches += len(rows) // 2
+            self._dirty.add(event_key)
+
+    def _system(self, event_key):
+        if event_key not in self.events:
+            self.events[event_key] = EventSystem(len(self.columns))
+        return self.events[event_key]
+
+    def solve(self):
+        """Solve every event changed since the last solve; returns their keys"""
+        dirty, self._dirty = self._dirty, set()
+        for event_key in dirty:
+            self.events[event_key].solve()
+        return dirty
+
+    def event_ratings(self, event_key):
+        """{team key: {'opr', 'dpr', 'ccwm', component...}} at one event"""
+        if self._dirty:
+            self.solve()
+        system = self.events.get(event_key)
+        if system is None or system.solution is None:
+            return {}
+        ratings = {}
+        for team_key, column in system.teams.items():
+            row = dict(zip(self.columns, system.solution[column].tolist()))
+            row['ccwm'] = row['opr'] - row['dpr']
+            ratings[team_key] = row
+        return ratings
+
+    def team_ratings(self, event_order):
+        """{team key: ratings} from each team's latest event in `event_order` (event keys, oldest first)"""
+        latest = {}
+        for event_key in event_order:
+            for team_key, ratings in self.event_ratings(event_key).items():
+                latest[team_key] = dict(ratings, event_key=event_key)
+        return latest
+
+
+def season_engine(year, components=(), event_types=None):
+    """An OprEngine holding every event of `year`, and the event keys in end date order"""
+    import tba_structs
+
+    events = sorted(tba_structs.events(tba, year), key=lambda event: (event.end_date or '', event.key))
+    if event_types is not None:
+        events = [event for event in events if event.event_type in event_types]
+    engine = OprEngine(components)
+    executor = get_executor()
+    futures = [executor.submit(tba_structs.event_matches, tba, event.key) for event in events]
+    for event, future in tqdm(zip(events, futures), total=len(events), desc=f"Fetching {year} matches"):
+        try:
+            engine.add_matches(future.result())
+        except Exception as e:
+            tqdm.write(f"Failed to fetch matches for {event.key}: {str(e)}")
+    engine.solve()
+    return engine, [event.key for event in events]
+
+
+def season_table(year, components=(), event_types=None):
+    """DataFrame of each team's latest-event ratings in `year`, indexed by team registry ID.
+
+    'norm_opr' puts OPR on the same scale as Statbotics' norm_epa (mean 1500,
+    SD 250 across the season's teams), so it can stand in for it.
+    """
+    import pandas as pd
+
+    engine, event_order = season_engine(year, components, event_types)
+    latest = engine.team_ratings(event_order)
+    df = pd.DataFrame.from_dict(latest, orient='index')
+    if df.empty:
+        return df
+    df.insert(0, 'num', [team_number(team_key) for team_key in df.index])
+    df.index = list(registry.ids(df.index))
+    df['norm_opr'] = 1500 + 250 * (df['opr'] - df['opr'].mean()) / df['opr'].std(ddof=0)
+    return df
+
+
+def main(years=None, components=()):
+    if years is None:
+        years = [2024]
+    for year in years:
+        df = season_table(year, components)
+        if df.empty:
+            print(f"No played qualification matches in {year}")
+            continue
+        df.sort_values('opr', ascending=False).to_csv(f'{year}_opr.csv', index=False)
+        print(f"Wrote {year}_opr.csv ({len(df)} teams)")
+
+
+if __name__ == "__main__":
+    main([int(sys.argv[1])] if len(sys.argv) > 1 else None, sys.argv[2:])
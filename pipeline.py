@@ -0,0 +1,303 @@
+import hashlib
+import importlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from tqdm import tqdm
+import tba_utils
+from tba_utils import tba, get_executor, fetch_event_rankings, UNRANKED_EVENT_TYPES
+
+# Seasons that are scored by default, most recent first
+DEFAULT_YEARS = [2024, 2023, 2022]
+
+# District and regional events, the only ones FFBigData scores
+SCORED_EVENT_TYPES = [0, 1]
+
+
+class Stage:
+    """A unit of work that turns named input artifacts into named output artifacts.
+
+    Inputs and outputs are artifact names. Names starting with 'file:' refer to
+    files on disk and are hashed by content; every other name is an in-memory
+    value returned by another stage. Fetch stages (always_run=True) run on every
+    refresh since their inputs live on TBA; everything else is skipped when the
+    hashes of its inputs match the previous run and its output files still exist.
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), always_run=False):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs) or [name]
+        self.always_run = always_run
+
+
+def hash_value(value):
+    """Content hash of an in-memory artifact"""
+    encoded = json.dumps(value, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def hash_file(path):
+    """Content hash of a file artifact, or None if it doesn't exist"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+class Scheduler:
+    """Runs stages concurrently in dependency order, skipping unchanged work"""
+
+    def __init__(self, stages, state_path=None, workers=4):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = state_path or os.path.join(tba_utils.settings['cache_dir'], 'pipeline_state.json')
+        self.workers = workers
+        self.producers = {}
+        for stage in stages:
+            for output in stage.outputs:
+                if output in self.producers:
+                    raise ValueError(f"Artifact {output} is produced by both {self.producers[output]} and {stage.name}")
+                self.producers[output] = stage.name
+        self.dependencies = {
+            stage.name: {self.producers[name] for name in stage.inputs if name in self.producers}
+            for stage in stages
+        }
+        for stage in stages:
+            missing = [name for name in stage.inputs if name not in self.producers and not name.startswith('file:')]
+            if missing:
+                raise ValueError(f"Stage {stage.name} needs {', '.join(missing)}, which no stage produces")
+        self.artifacts = {}
+        self.hashes = {}
+        self.durations = {}
+        self.skipped = set()
+        self._lock = threading.Lock()
+
+    def load_state(self):
+        try:
+            with open(self.state_path, encoding='utf-8') as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save_state(self, state):
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        with open(self.state_path, 'w', encoding='utf-8') as file:
+            json.dump(state, file, indent=2, sort_keys=True)
+
+    def input_hash(self, stage):
+        digest = hashlib.sha256(stage.name.encode('utf-8'))
+        for name in sorted(stage.inputs):
+            if name.startswith('file:') and name not in self.hashes:
+                self.hashes[name] = hash_file(name[5:])
+            digest.update(f"{name}={self.hashes.get(name)}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def run_stage(self, stage, previous):
+        start = time.perf_counter()
+        key = self.input_hash(stage)
+        file_outputs = [name for name in stage.outputs if name.startswith('file:')]
+        value_outputs = [name for name in stage.outputs if not name.startswith('file:')]
+        # Only stages whose outputs all live on disk can be skipped, since
+        # in-memory outputs from a previous run are gone
+        outputs_exist = not value_outputs and all(hash_file(name[5:]) is not None for name in file_outputs)
+
+        if not stage.always_run and previous.get('input_hash') == key and outputs_exist:
+            with self._lock:
+                self.skipped.add(stage.name)
+                self.hashes.update(previous.get('output_hashes', {}))
+            result = {'input_hash': key, 'output_hashes': previous.get('output_hashes', {})}
+        else:
+            values = stage.func(*[self.artifacts.get(name) for name in stage.inputs])
+            if len(value_outputs) == 1:
+                values = {value_outputs[0]: values}
+            output_hashes = {}
+            for name in stage.outputs:
+                if name.startswith('file:'):
+                    output_hashes[name] = hash_file(name[5:])
+                else:
+                    output_hashes[name] = hash_value(values[name])
+            with self._lock:
+                for name in value_outputs:
+                    self.artifacts[name] = values[name]
+                self.hashes.update(output_hashes)
+            result = {'input_hash': key, 'output_hashes': output_hashes}
+
+        self.durations[stage.name] = time.perf_counter() - start
+        return result
+
+    def run(self, targets=None):
+        """Run every stage needed for `targets` (default: all) and return the critical path"""
+        needed = set(targets or self.stages)
+        pending = list(needed)
+        while pending:
+            for dependency in self.dependencies[pending.pop()]:
+                if dependency not in needed:
+                    needed.add(dependency)
+                    pending.append(dependency)
+
+        state = self.load_state()
+        done = set()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            running = {}
+            while len(done) < len(needed):
+                for name in sorted(needed - done - set(running.values())):
+                    if self.dependencies[name] <= done:
+                        running[executor.submit(self.run_stage, self.stages[name], state.get(name, {}))] = name
+                if not running:
+                    raise ValueError(f"Dependency cycle between {', '.join(sorted(needed - done))}")
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    state[name] = future.result()
+                    done.add(name)
+                    status = 'skipped' if name in self.skipped else 'done'
+                    tqdm.write(f"[pipeline] {name} {status} in {self.durations[name]:.1f}s")
+        self.save_state(state)
+
+        wall_time = time.perf_counter() - start
+        path, length = self.critical_path(needed)
+        tqdm.write(f"[pipeline] Finished in {wall_time:.1f}s; critical path {length:.1f}s: {' -> '.join(path)}")
+        return path, length
+
+    def critical_path(self, names):
+        """Longest chain of stage durations through the dependency graph"""
+        best = {}
+
+        def finish_time(name):
+            if name not in best:
+                before = max((finish_time(dep) for dep in self.dependencies[name] if dep in names),
+                             key=lambda item: item[0], default=(0.0, []))
+                best[name] = (before[0] + self.durations.get(name, 0.0), before[1] + [name])
+            return best[name]
+
+        length, path = max((finish_time(name) for name in names), key=lambda item: item[0], default=(0.0, []))
+        return path, length
+
+
+def fetch_all(func, keys, digest=False):
+    """Call func(key) for every key on the shared worker pool.
+
+    With digest=True only a content hash of each response is kept. The responses
+    themselves stay in the shared client cache, where compute stages pick them up,
+    so large payloads like matches aren't held twice.
+    """
+    executor = get_executor()
+    futures = {key: executor.submit(func, key) for key in keys}
+    results = {}
+    for key, future in futures.items():
+        try:
+            result = future.result()
+        except Exception as e:
+            tqdm.write(f"[pipeline] Failed to fetch {key}: {str(e)}")
+            result = None
+        results[key] = hash_value(result) if digest else result
+    return results
+
+
+def build_stages(years=None):
+    """The fetch and compute stages for a full refresh of every artifact.
+
+    `years` are the scored seasons. The Elo ratings keep their own seasons
+    (each script's DEFAULT_YEARS), as they do when the scripts run on their own.
+    """
+    import seedingELO
+    import bonusRpRanking
+
+    years = sorted(years or DEFAULT_YEARS, reverse=True)
+    season = years[0] + 1
+    all_years = [season] + years
+
+    def fetch_teams():
+        return list(tba_utils.iter_teams(tba, year=season, keys=True))
+
+    def fetch_events():
+        return {year: tba.events(year, simple=True) for year in all_years}
+
+    def fetch_team_events(teams):
+        # Same requests as FFBigData makes, so it reuses them
+        pairs = [(team, year) for team in teams for year in all_years]
+        results = fetch_all(lambda pair: tba.team_events(pair[0], year=pair[1]), pairs)
+        team_events = {}
+        for (team, year), events in results.items():
+            team_events.setdefault(team, {})[str(year)] = sorted(event['key'] for event in events or [])
+        return team_events
+
+    def fetch_rosters(events):
+        keys = [event['key'] for event in events[season]]
+        return fetch_all(lambda key: tba.event_teams(key, keys=True), keys, digest=True)
+
+    def scored_events(events):
+        return [event['key'] for year in years for event in events[year]
+                if event['event_type'] in SCORED_EVENT_TYPES]
+
+    def fetch_matches(events):
+        return fetch_all(tba.event_matches, scored_events(events), digest=True)
+
+    def fetch_awards(events):
+        return fetch_all(tba.event_awards, scored_events(events), digest=True)
+
+    def fetch_alliances(events):
+        return fetch_all(tba.event_alliances, scored_events(events), digest=True)
+
+    def fetch_rankings(ranking_years):
+        """A fetch stage for the rankings of every ranked event in `ranking_years`"""
+        def fetch(events):
+            # Seasons outside the events stage (the Elo history) are listed here; the client caches them
+            seasons = {year: events[year] if year in events else tba.events(year, simple=True)
+                       for year in ranking_years}
+            ranked = sorted((event for season_events in seasons.values() for event in season_events
+                             if event['event_type'] not in UNRANKED_EVENT_TYPES),
+                            key=lambda event: event['end_date'] or '')
+            return fetch_all(lambda key: fetch_event_rankings(tba, key), [event['key'] for event in ranked],
+                             digest=True)
+        return fetch
+
+    def run_script(module_name, **kwargs):
+        def compute(*_inputs):
+            importlib.import_module(module_name).main(**kwargs)
+        return compute
+
+    return [
+        Stage('teams', fetch_teams, always_run=True),
+        Stage('events', fetch_events, always_run=True),
+        Stage('team_events', fetch_team_events, ['teams'], always_run=True),
+        Stage('rosters', fetch_rosters, ['events'], always_run=True),
+        Stage('matches', fetch_matches, ['events'], always_run=True),
+        Stage('awards', fetch_awards, ['events'], always_run=True),
+        Stage('alliances', fetch_alliances, ['events'], always_run=True),
+        Stage('rankings', fetch_rankings(years), ['events'], always_run=True),
+        # Each rating script reads its own seasons' rankings, so skipping it is decided on those
+        Stage('elo_rankings', fetch_rankings(seedingELO.DEFAULT_YEARS), ['events'], always_run=True),
+        Stage('bonus_rp_rankings', fetch_rankings(bonusRpRanking.DEFAULT_YEARS), ['events'], always_run=True),
+        Stage('ffbigdata', run_script('FFBigData', years=years),
+              ['teams', 'team_events', 'matches', 'awards', 'alliances', 'rankings'],
+              ['file:BIG DATA.csv']),
+        Stage('event_strength', run_script('eventStrength', years=years),
+              ['rosters'] + [f'file:{year}_insights.csv' for year in years],
+              ['file:Event_Strength.csv', 'file:EPA_data.csv']),
+        Stage('elo', run_script('seedingELO', years=seedingELO.DEFAULT_YEARS), ['elo_rankings'],
+              ['file:updated_elo_ratings.csv']),
+        Stage('bonus_rp', run_script('bonusRpRanking', years=bonusRpRanking.DEFAULT_YEARS), ['bonus_rp_rankings'],
+              ['file:elo_total_rps.csv', 'file:elo_bonus_rps.csv']),
+        Stage('score_breakdowns', run_script('score_breakdowns', years=years), ['events', 'matches'],
+              [f'file:score_breakdowns/{year}_alliances.csv' for year in years]),
+        Stage('team_events_csv', run_script('team_events_ordered', years=[season]), ['teams', 'events', 'rosters'],
+              ['file:team_events.csv']),
+    ]
+
+
+def main(years=None, targets=None):
+    scheduler = Scheduler(build_stages(years), workers=tba_utils.settings['workers'])
+    return scheduler.run(targets)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""Profiling hooks shared by every script.
+
+- `@timed` counts calls and total time of a hot function. It costs a couple
+  of clock reads per call (or per sampled call, for the tiniest functions),
+  so it stays on in normal runs; timing_report() prints the totals.
+- profiled() wraps a run in cProfile (`.pstats`, for snakeviz or flameprof)
+  or a sampling profiler (`.collapsed` stacks for flamegraph.pl or
+  speedscope), optionally with tracemalloc (`.malloc.collapsed`, allocated
+  bytes per stack), and prints a top-N summary of each.
+
+tbascripts takes `--profile [sample|cprofile]`, `--trace-malloc` and
+`--timings`; any script can be run the same way with
+
+    python profiling.py --profile sample --trace-malloc FFBigData.py
+"""
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+DEFAULT_TOP = 20
+SAMPLE_INTERVAL = 0.005
+MALLOC_FRAMES = 25
+
+
+class Timing:
+    __slots__ = ('name', 'calls', 'timed_calls', 'total_ns')
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.timed_calls = 0
+        self.total_ns = 0
+
+    @property
+    def mean_ns(self):
+        return self.total_ns / self.timed_calls if self.timed_calls else 0.0
+
+    @property
+    def estimated_total_ns(self):
+        """Total time across every call, extrapolated from the calls that were timed"""
+        return self.mean_ns * self.calls
+
+
+# Function name -> Timing for every @timed function called in this process
+TIMINGS = {}
+
+
+def timed(function=None, *, sample_every=1):
+    """Count calls to `function` and the time spent in them (including nested calls).
+
+    Functions that run in a few hundred nanoseconds would be noticeably slowed
+    by two clock reads per call, so `sample_every=64` times only every 64th
+    call (all calls are still counted) and extrapolates the total.
+
+    The counters aren't locked: a function called from several threads at once
+    can lose the odd update, so its counts and totals are approximate.
+    """
+    if function is None:
+        return functools.partial(timed, sample_every=sample_every)
+    name = f'{function.__module__}.{function.__qualname__}'
+    timing = TIMINGS.setdefault(name, Timing(name))
+    clock = time.perf_counter_ns
+
+    if sample_every == 1:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timing.calls += 1
+                timing.timed_calls += 1
+                timing.total_ns += clock() - start
+    else:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            timing.calls += 1
+            if timing.calls % sample_every:
+                return function(*args, **kwargs)
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timing.timed_calls += 1
+                timing.total_ns += clock() - start
+
+    return wrapper
+
+
+def take_timings():
+    """{name: (calls, timed calls, total ns)} recorded in this process since the last call, then reset.
+
+    Worker processes return this with their results; the parent adds it to
+    its own TIMINGS with add_timings() so timing_report() covers the workers.
+    """
+    taken = {}
+    for name, timing in TIMINGS.items():
+        if timing.calls:
+            taken[name] = (timing.calls, timing.timed_calls, timing.total_ns)
+            timing.calls = timing.timed_calls = timing.total_ns = 0
+    return taken
+
+
+def add_timings(taken):
+    """Add counts from take_timings() in another process to this process's TIMINGS"""
+    for name, (calls, timed_calls, total_ns) in taken.items():
+        timing = TIMINGS.setdefault(name, Timing(name))
+        timing.calls += calls
+        timing.timed_calls += timed_calls
+        timing.total_ns += total_ns
+
+
+def timing_report():
+    """Print the calls, total and mean time of every @timed function that ran"""
+    timings = sorted((timing for timing in TIMINGS.values() if timing.timed_calls),
+                     key=lambda timing: timing.estimated_total_ns, reverse=True)
+    if not timings:
+        return
+    print(f"{'timed function':<48}{'calls':>12}{'total s':>10}{'mean us':>10}")
+    for timing in timings:
+        print(f"{timing.name:<48}{timing.calls:>12}{timing.estimated_total_ns / 1e9:>10.3f}"
+              f"{timing.mean_ns / 1e3:>10.2f}")
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class Sampler:
+    """Samples every thread's stack at a fixed interval from a background thread.
+
+    Stacks are counted in collapsed form ("thread;outer;...;inner"), so the
+    counts are proportional to wall-clock time, I/O waits included. Worker
+    processes aren't sampled.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write_collapsed(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f'{stack} {count}\n')
+
+    def report(self, top=DEFAULT_TOP, thread='MainThread'):
+        """Print the functions `thread` spent the most samples in, by own and total samples"""
+        own = Counter()
+        total = Counter()
+        samples = 0
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            if frames[0] != thread or len(frames) < 2:
+                continue
+            samples += count
+            own[frames[-1]] += count
+            for label in set(frames[1:]):
+                total[label] += count
+        if not samples:
+            return
+        print(f"{samples} samples of {thread} every {self.interval * 1000:g} ms")
+        print(f"{'function':<72}{'own %':>8}{'total %':>9}")
+        for label, count in own.most_common(top):
+            print(f"{label[:71]:<72}{100 * count / samples:>8.1f}{100 * total[label] / samples:>9.1f}")
+
+
+def write_malloc_snapshot(snapshot, path, top=DEFAULT_TOP):
+    """Write allocated bytes per stack in collapsed form and print the lines that allocated the most"""
+    with open(path, 'w', encoding='utf-8') as file:
+        for stat in snapshot.statistics('traceback'):
+            # Tracebacks run from the oldest frame to the allocating one
+            stack = ';'.join(f'{os.path.basename(frame.filename)}:{frame.lineno}' for frame in stat.traceback)
+            file.write(f'{stack} {stat.size}\n')
+    print(f"{'allocated at':<72}{'KiB':>10}{'blocks':>10}")
+    for stat in snapshot.statistics('lineno')[:top]:
+        frame = stat.traceback[0]
+        location = f'{frame.filename}:{frame.lineno}'
+        print(f"{location[-71:]:<72}{stat.size / 1024:>10.1f}{stat.count:>10}")
+
+
+@contextmanager
+def profiled(output_prefix, mode=None, trace_malloc=False, timings=False, top=DEFAULT_TOP):
+    """Profile the enclosed code.
+
+    `mode` is 'cprofile', 'sample' or None. Output files are named
+    `{output_prefix}.pstats`, `.collapsed` and `.malloc.collapsed`.
+    """
+    profiler = sampler = None
+    if trace_malloc:
+        import tracemalloc
+        tracemalloc.start(MALLOC_FRAMES)
+    if mode == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif mode == 'sample':
+        sampler = Sampler()
+        sampler.start()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            import pstats
+            profiler.disable()
+            profiler.dump_stats(f'{output_prefix}.pstats')
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(top)
+            print(f"Wrote {output_prefix}.pstats")
+        if sampler is not None:
+            sampler.stop()
+            sampler.write_collapsed(f'{output_prefix}.collapsed')
+            sampler.report(top)
+            print(f"Wrote {output_prefix}.collapsed")
+        if trace_malloc:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            write_malloc_snapshot(snapshot, f'{output_prefix}.malloc.collapsed', top)
+            print(f"Traced memory: {current / 2**20:.1f} MiB at exit, {peak / 2**20:.1f} MiB peak; "
+                  f"wrote {output_prefix}.malloc.collapsed")
+        if mode or trace_malloc or timings:
+            timing_report()
+
+
+def main(argv=None):
+    import argparse
+    import runpy
+
+    parser = argparse.ArgumentParser(description='Run a script under the profiling hooks.')
+    parser.add_argument('--profile', nargs='?', const='sample', choices=['sample', 'cprofile'],
+                        help='profile with the sampling profiler (default) or cProfile')
+    parser.add_argument('--trace-malloc', action='store_true', help='record allocations with tracemalloc')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help='rows in each summary')
+    parser.add_argument('--output', help='output file prefix (default: profile-<script name>)')
+    parser.add_argument('script', help='script to run, e.g. FFBigData.py')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='arguments for the script')
+    args = parser.parse_args(argv)
+
+    sys.argv = [args.script] + args.args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    prefix = args.output or 'profile-' + os.path.splitext(os.path.basename(args.script))[0]
+    with profiled(prefix, args.profile, args.trace_malloc, timings=True, top=args.top):
+        runpy.run_path(args.script, run_name='__main__')
+
+
+if __name__ == "__main__":
+    # Scripts import this file as `profiling`; run from that module so their @timed counts are the ones reported
+    import profiling
+    profiling.main()
@@ -0,0 +1,313 @@
+"""Local HTTP/JSON queries over the computed artifacts.
+
+Every artifact CSV is loaded into memory once, keyed by team number or event
+key. Each numeric column gets a sorted view up front, overall and per
+district (teams) or season (events), so top-N and percentile queries only
+walk or bisect a precomputed list. A background thread watches the files and
+reloads any that change. The new tables are built off to the side and
+swapped in whole, so readers never wait on a reload or see a half-loaded
+artifact.
+
+    python query_service.py 8000
+    curl 'localhost:8000/top?table=slff&metric=Full+Year+Avg+SLFF&district=FIM&exclude=33,67&n=50'
+    curl 'localhost:8000/team/254'
+    curl 'localhost:8000/percentile?table=epa&metric=Weighted+EPA&team=254'
+    curl 'localhost:8000/top?table=events&metric=Top8&year=2025&n=10'
+"""
+import csv
+import math
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import fast_json
+
+DEFAULT_PORT = 8000
+RELOAD_INTERVAL = 1.0
+DEFAULT_TOP_N = 50
+
+
+class Artifact:
+    """How to load one artifact: its file, key column, and the column holding its rows' group, if any"""
+
+    def __init__(self, path, key_column, kind, group_column=None):
+        self.path = path
+        self.key_column = key_column
+        self.kind = kind  # 'team' or 'event'
+        self.group_column = group_column
+
+
+# Table name -> artifact. Team tables are grouped by district, event tables by season.
+ARTIFACTS = {
+    'slff': Artifact('BIG DATA.csv', 'Team Number', 'team'),
+    'epa': Artifact('EPA_data.csv', 'Team Number', 'team'),
+    'districts': Artifact('team_rankings.csv', 'team', 'team', group_column='district'),
+    'events': Artifact('Event_Strength.csv', 'Event Code', 'event'),
+}
+
+
+def parse_value(text):
+    """int, float, None for an empty cell, or the text itself"""
+    if text == '':
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        value = float(text)
+    except ValueError:
+        return text
+    # float() also takes 'nan' and 'inf', which are team names here, not numbers
+    return value if math.isfinite(value) else text
+
+
+class Table:
+    """One artifact's rows by key, with sorted views of every numeric column.
+
+    `views[(column, group)]` holds the keys with a value in `column`, best
+    first, and the values ascending (for percentiles); group None is every
+    row.
+    """
+
+    def __init__(self, name, rows, key_column, groups_of, mtime=None):
+        self.name = name
+        self.mtime = mtime
+        self.loaded = time.time()
+        self.rows = {}
+        self.columns = list(rows[0]) if rows else []
+        self.groups = {}  # key -> tuple of groups
+        for row in rows:
+            key = row[key_column]
+            if key is None:
+                continue
+            # Teams listed under several districts (they moved) keep their first row and every district
+            self.rows.setdefault(key, row)
+            self.groups[key] = tuple(dict.fromkeys(self.groups.get(key, ()) + tuple(groups_of(key, row))))
+
+        self.numeric = [column for column in self.columns if column != key_column and
+                        any(isinstance(row.get(column), (int, float)) for row in self.rows.values())]
+        self.views = {}
+        for column in self.numeric:
+            members = {None: []}
+            for key, row in self.rows.items():
+                value = row.get(column)
+                if not isinstance(value, (int, float)):
+                    continue
+                members[None].append((value, key))
+                for group in self.groups[key]:
+                    members.setdefault(group, []).append((value, key))
+            for group, entries in members.items():
+                entries.sort(key=lambda entry: (-entry[0], str(entry[1])))
+                self.views[(column, group)] = ([key for _, key in entries],
+                                               [value for value, _ in reversed(entries)])
+
+    def top(self, column, n=DEFAULT_TOP_N, group=None, exclude=()):
+        """The best `n` rows by `column` (within `group`), skipping keys in `exclude`"""
+        keys, _ = self._view(column, group)
+        rows = []
+        for key in keys:
+            if key in exclude:
+                continue
+            rows.append(self.rows[key])
+            if len(rows) == n:
+                break
+        return rows
+
+    def percentile(self, column, value, group=None):
+        """Percentage of rows (within `group`) with a lower `column` than `value`"""
+        _, values = self._view(column, group)
+        # A text cell (say a team's entry in a mixed column) can't be compared with the sorted numbers
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"{column} value {value!r} isn't a number")
+        if not values:
+            return None
+        return 100.0 * bisect_left(values, value) / len(values)
+
+    def _view(self, column, group):
+        if column not in self.columns:
+            raise KeyError(f"{self.name} has no column {column!r}")
+        if column not in self.numeric:
+            raise ValueError(f"{self.name} column {column!r} isn't numeric")
+        return self.views.get((column, group), ([], []))
+
+
+def read_rows(path):
+    with open(path, newline='', encoding='utf-8') as file:
+        return [{column: parse_value(value) for column, value in row.items()} for row in csv.DictReader(file)]
+
+
+class QueryStore:
+    """Every artifact's Table, reloaded in the background when its file changes.
+
+    `tables` is replaced as a whole on reload, so a reader that takes it once
+    sees a consistent set of tables for the whole query.
+    """
+
+    def __init__(self, artifacts=None, directory='.'):
+        self.artifacts = artifacts or ARTIFACTS
+        self.directory = directory
+        self.tables = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.reload()
+
+    def path(self, name):
+        return os.path.join(self.directory, self.artifacts[name].path)
+
+    def reload(self):
+        """Load every artifact that changed since it was last loaded; returns the names reloaded"""
+        tables = dict(self.tables)
+        changed = []
+        # District membership feeds the team tables' groups, so it loads first
+        for name in sorted(self.artifacts, key=lambda name: name != 'districts'):
+            artifact = self.artifacts[name]
+            try:
+                mtime = os.stat(self.path(name)).st_mtime_ns
+            except FileNotFoundError:
+                if tables.pop(name, None) is not None:
+                    changed.append(name)
+                continue
+            districts_changed = 'districts' in changed and artifact.kind == 'team' and not artifact.group_column
+            if name in tables and tables[name].mtime == mtime and not districts_changed:
+                continue
+            try:
+                rows = read_rows(self.path(name))
+            except (OSError, ValueError, csv.Error) as e:
+                # Most likely caught mid-write; the old table stays until the next check
+                print(f"Couldn't load {artifact.path}: {str(e)}", file=sys.stderr)
+                continue
+            tables[name] = Table(name, rows, artifact.key_column, self._groups_of(artifact, tables), mtime)
+            changed.append(name)
+        if changed:
+            self.tables = tables
+        return changed
+
+    @staticmethod
+    def _groups_of(artifact, tables):
+        if artifact.group_column:
+            return lambda key, row: (row[artifact.group_column],) if row.get(artifact.group_column) else ()
+        if artifact.kind == 'event':
+            return lambda key, row: (int(key[:4]),) if key[:4].isdigit() else ()
+        districts = tables.get('districts')
+        return lambda key, row: districts.groups.get(key, ()) if districts else ()
+
+    def watch(self, interval=RELOAD_INTERVAL):
+        """Start reloading changed artifacts every `interval` seconds in a daemon thread"""
+        def run():
+            while not self._stop.wait(interval):
+                changed = self.reload()
+                if changed:
+                    print(f"Reloaded {', '.join(changed)}", file=sys.stderr)
+
+        self._thread = threading.Thread(target=run, name='artifact-reloader', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def team(self, number):
+        """{table: row} for one team across every team table"""
+        tables = self.tables
+        return {name: table.rows[number] for name, table in tables.items()
+                if self.artifacts[name].kind == 'team' and number in table.rows}
+
+    def status(self):
+        return {name: {'path': self.artifacts[name].path, 'rows': len(table.rows), 'loaded': table.loaded,
+                       'numeric_columns': table.numeric}
+                for name, table in self.tables.items()}
+
+
+def parse_group(table_kind, query):
+    if table_kind == 'event':
+        return int(query['year']) if 'year' in query else None
+    return query.get('district')
+
+
+def parse_exclude(text):
+    return {parse_value(item.strip()) for item in text.split(',') if item.strip()} if text else set()
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """GET /top, /percentile, /team/<number>, /event/<key> and /status"""
+
+    store = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        parts = [part for part in url.path.split('/') if part]
+        try:
+            body = self.answer(parts, query)
+        except KeyError as e:
+            return self.reply(404, {'error': str(e.args[0])})
+        except ValueError as e:
+            return self.reply(400, {'error': str(e)})
+        self.reply(200, body)
+
+    def answer(self, parts, query):
+        store = self.store
+        if parts == ['status']:
+            return store.status()
+        if len(parts) == 2 and parts[0] == 'team':
+            rows = store.team(int(parts[1]))
+            if not rows:
+                raise KeyError(f"No team {parts[1]}")
+            return rows
+        if len(parts) == 2 and parts[0] == 'event':
+            return store.tables['events'].rows[parts[1]]
+        if parts in (['top'], ['percentile']):
+            name = query.get('table', 'slff')
+            table = store.tables[name]
+            if 'metric' not in query:
+                raise ValueError("metric is required")
+            metric = query['metric']
+            group = parse_group(store.artifacts[name].kind, query)
+            if parts == ['top']:
+                return table.top(metric, int(query.get('n', DEFAULT_TOP_N)), group,
+                                 parse_exclude(query.get('exclude')))
+            if 'team' in query:
+                value = table.rows[parse_value(query['team'])].get(metric)
+            else:
+                value = float(query['value'])
+            return {'metric': metric, 'value': value,
+                    'percentile': None if value is None else table.percentile(metric, value, group)}
+        raise KeyError(f"Unknown query /{'/'.join(parts)}")
+
+    def reply(self, status, body):
+        data = fast_json.dumps(body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(store, port=DEFAULT_PORT):
+    """Answer queries until interrupted"""
+    handler = type('BoundQueryHandler', (QueryHandler,), {'store': store})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    print(f"Serving {', '.join(store.tables)} on http://127.0.0.1:{port}/")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def main(port=None, interval=RELOAD_INTERVAL):
+    store = QueryStore()
+    store.watch(interval)
+    try:
+        serve(store, port or DEFAULT_PORT)
+    finally:
+        store.stop()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,199 @@
+"""Flatten match score breakdowns into per-season tables.
+
+Each season gets two CSV tables in `score_breakdowns/`:
+
+- `{year}_alliances.csv`: one row per match alliance, with every breakdown
+  field as a column. Nested objects and lists become dotted columns
+  (`autoReef.topRow.nodeA`, `autoCommunity.B.0`).
+- `{year}_robots.csv`: one row per team in a match, holding the per-robot
+  fields (`endGameRobot1`..`3` become `endGameRobot`), keyed by the team that
+  drove in that station.
+
+Column types are inferred per season from the values TBA sent and saved in
+`{year}_schema.json`, so load() returns properly typed frames (nullable ints
+and booleans, categorical strings) without rescanning. Finished seasons are
+only ingested once; the current one is refreshed on every run.
+"""
+import datetime
+import json
+import os
+import re
+from itertools import chain
+from tqdm import tqdm
+from tba_utils import tba, get_executor
+
+DEFAULT_OUTPUT_DIR = 'score_breakdowns'
+
+# Identifies a match alliance; robot rows add the station and team
+MATCH_COLUMNS = ['match_key', 'event_key', 'comp_level', 'set_number', 'match_number', 'alliance', 'score']
+ROBOT_COLUMNS = MATCH_COLUMNS + ['station', 'team_key']
+
+ROBOT_FIELD = re.compile(r'^(.+Robot)([1-3])$')
+
+
+def flatten(value, prefix, row):
+    """Add `value` to `row`, expanding objects and lists into dotted columns"""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flatten(item, f'{prefix}.{key}' if prefix else key, row)
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            flatten(item, f'{prefix}.{i}', row)
+    else:
+        row[prefix] = value
+
+
+def flatten_match(match):
+    """(alliance rows, robot rows) for one match; empty if it has no score breakdown"""
+    breakdown = match['score_breakdown']
+    if not breakdown:
+        return [], []
+    alliance_rows = []
+    robot_rows = []
+    for color in ('red', 'blue'):
+        alliance = match['alliances'][color]
+        base = {
+            'match_key': match['key'],
+            'event_key': match['event_key'],
+            'comp_level': match['comp_level'],
+            'set_number': match['set_number'],
+            'match_number': match['match_number'],
+            'alliance': color,
+            'score': alliance['score'],
+        }
+        alliance_row = dict(base)
+        robots = [dict(base, station=station, team_key=team_key)
+                  for station, team_key in enumerate(alliance['team_keys'], start=1)]
+        for field, value in (breakdown.get(color) or {}).items():
+            robot_field = ROBOT_FIELD.match(field)
+            if robot_field is None:
+                flatten(value, field, alliance_row)
+                continue
+            station = int(robot_field.group(2))
+            if station <= len(robots):
+                flatten(value, robot_field.group(1), robots[station - 1])
+        alliance_rows.append(alliance_row)
+        robot_rows.extend(robots)
+    return alliance_rows, robot_rows
+
+
+def infer_type(values):
+    """pandas dtype for a column from its Python values"""
+    kinds = {type(value) for value in values if value is not None}
+    if not kinds:
+        return 'object'
+    if kinds == {bool}:
+        return 'boolean'
+    if kinds == {int}:
+        return 'Int64'
+    if kinds <= {int, float}:
+        return 'float64'
+    if kinds == {str}:
+        return 'category'
+    return 'string'
+
+
+def infer_schema(rows):
+    """{column: dtype}, with columns in order of first appearance"""
+    columns = {}
+    for row in rows:
+        for column, value in row.items():
+            columns.setdefault(column, []).append(value)
+    return {column: infer_type(values) for column, values in columns.items()}
+
+
+def build_tables(matches):
+    """Flatten matches into (alliances, robots) DataFrames and the schema inferred for them"""
+    import pandas as pd
+
+    alliance_rows = []
+    robot_rows = []
+    for match in matches:
+        alliances, robots = flatten_match(match)
+        alliance_rows.extend(alliances)
+        robot_rows.extend(robots)
+    schema = {'alliances': infer_schema(alliance_rows), 'robots': infer_schema(robot_rows)}
+    frames = []
+    for table, rows, key_columns in [('alliances', alliance_rows, MATCH_COLUMNS),
+                                     ('robots', robot_rows, ROBOT_COLUMNS)]:
+        schema[table] = {**{column: schema[table].get(column, 'object') for column in key_columns}, **schema[table]}
+        frame = pd.DataFrame.from_records(rows, columns=list(schema[table]))
+        frames.append(frame.astype(schema[table]))
+    return frames[0], frames[1], schema
+
+
+def table_path(year, table, output_dir=DEFAULT_OUTPUT_DIR):
+    return os.path.join(output_dir, f'{year}_{table}.csv')
+
+
+def schema_path(year, output_dir=DEFAULT_OUTPUT_DIR):
+    return os.path.join(output_dir, f'{year}_schema.json')
+
+
+def load_schema(year, output_dir=DEFAULT_OUTPUT_DIR):
+    try:
+        with open(schema_path(year, output_dir), encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def ingest(year, output_dir=DEFAULT_OUTPUT_DIR, rebuild=False):
+    """Fetch every match of `year` and write its tables and schema; skips finished seasons already ingested"""
+    import tba_structs
+
+    finished = year < datetime.date.today().year
+    if finished and not rebuild and load_schema(year, output_dir) is not None:
+        return False
+
+    executor = get_executor()
+    events = tba_structs.events(tba, year)
+    futures = [executor.submit(tba_structs.event_matches, tba, event.key) for event in events]
+    matches = []
+    for event, future in tqdm(zip(events, futures), total=len(events), desc=f"Fetching {year} matches"):
+        try:
+            matches.append(future.result())
+        except Exception as e:
+            tqdm.write(f"Failed to fetch matches for {event.key}: {str(e)}")
+
+    alliances, robots, schema = build_tables(chain.from_iterable(matches))
+    os.makedirs(output_dir, exist_ok=True)
+    alliances.to_csv(table_path(year, 'alliances', output_dir), index=False)
+    robots.to_csv(table_path(year, 'robots', output_dir), index=False)
+    with open(schema_path(year, output_dir), 'w', encoding='utf-8') as file:
+        json.dump(schema, file, indent=2)
+    return True
+
+
+def load(years, table='alliances', output_dir=DEFAULT_OUTPUT_DIR):
+    """One typed DataFrame of `table` ('alliances' or 'robots') across `years`, with a 'year' column"""
+    import pandas as pd
+
+    frames = []
+    for year in years:
+        schema = load_schema(year, output_dir)
+        if schema is None:
+            raise FileNotFoundError(f"No score breakdowns for {year} in {output_dir}; "
+                                    f"run `python tbascripts.py breakdowns --years {year}` first")
+        # Categories and nullable types can't all be parsed directly; read as text where needed, then cast.
+        # Only empty cells are missing: TBA uses 'None' as a real value (endgame, auto line)
+        dtypes = schema[table]
+        frame = pd.read_csv(table_path(year, table, output_dir), keep_default_na=False, na_values=[''],
+                            dtype={column: 'string' if dtype == 'category' else dtype
+                                   for column, dtype in dtypes.items() if dtype != 'object'})
+        frames.append(frame.astype(dtypes).assign(year=year))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def main(years=None, output_dir=DEFAULT_OUTPUT_DIR, rebuild=False):
+    if years is None:
+        years = [2024]
+    for year in sorted(years):
+        if ingest(year, output_dir, rebuild):
+            print(f"Wrote {year} score breakdowns to {output_dir}")
+        else:
+            print(f"{year} score breakdowns are up to date")
+
+
+if __name__ == "__main__":
+    main()
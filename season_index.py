@@ -0,0 +1,149 @@
+import sqlite3
+import sys
+import threading
+from itertools import chain
+from typing import NamedTuple
+from tqdm import tqdm
+from slff_score_cache import is_final
+from tba_utils import get_executor
+
+DEFAULT_INDEX_PATH = 'season_index.sqlite3'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS events (
+    event_key TEXT PRIMARY KEY,
+    year INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    event_type INTEGER NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    week INTEGER,
+    has_roster INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS events_year ON events (year);
+CREATE TABLE IF NOT EXISTS rosters (
+    event_key TEXT NOT NULL,
+    team_key TEXT NOT NULL,
+    PRIMARY KEY (event_key, team_key)
+);
+'''
+
+
+class IndexedEvent(NamedTuple):
+    """The parts of a TBA event the index keeps"""
+    key: str
+    year: int
+    name: str
+    event_type: int
+    start_date: str
+    end_date: str
+    week: int = None
+
+
+class SeasonIndex:
+    """Every event of the indexed seasons with its dates and roster, persisted in SQLite.
+
+    refresh() builds it from the bulk endpoints: one events request per season
+    and one roster request per event, instead of an events request per team.
+    Rosters of finished events never change, so later refreshes only refetch
+    rosters for events that haven't finished yet. Per-team schedules are then
+    derived in memory with one pass over the events in date order, so
+    team_events() is a dictionary lookup.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.events = {}
+        self.rosters = {}
+        self._schedules = {}
+        self._load()
+
+    def years(self):
+        return sorted({event.year for event in self.events.values()})
+
+    def refresh(self, tba, years):
+        """Bring the given seasons up to date from TBA and rebuild the schedules"""
+        import tba_structs
+
+        executor = get_executor()
+        stale = []
+        for year, season in zip(years, executor.map(lambda year: tba_structs.events(tba, year), years)):
+            stale.extend(self._store_events(year, season))
+        rosters = executor.map(lambda key: tba.event_teams(key, keys=True), stale)
+        for event_key, roster in tqdm(zip(stale, rosters), total=len(stale), desc="Fetching rosters"):
+            self._store_roster(event_key, roster)
+        self._load()
+
+    def _store_events(self, year, season):
+        """Store one season's events; returns the keys whose rosters need fetching"""
+        stored = {key: has_roster for key, has_roster in self.connection.execute(
+            'SELECT event_key, has_roster FROM events WHERE year = ?', (year,))}
+        stale = []
+        with self._lock, self.connection:
+            for event in season:
+                self.connection.execute(
+                    'INSERT INTO events (event_key, year, name, event_type, start_date, end_date, week) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (event_key) DO UPDATE SET year = excluded.year, '
+                    'name = excluded.name, event_type = excluded.event_type, start_date = excluded.start_date, '
+                    'end_date = excluded.end_date, week = excluded.week',
+                    (event.key, year, event.name, event.event_type, event.start_date or '', event.end_date or '',
+                     event.week))
+                if not stored.get(event.key) or not is_final(event):
+                    stale.append(event.key)
+            # Events TBA no longer lists for the season (cancelled or re-keyed)
+            removed = set(stored) - {event.key for event in season}
+            self.connection.executemany('DELETE FROM events WHERE event_key = ?', [(key,) for key in removed])
+            self.connection.executemany('DELETE FROM rosters WHERE event_key = ?', [(key,) for key in removed])
+        return stale
+
+    def _store_roster(self, event_key, team_keys):
+        with self._lock, self.connection:
+            self.connection.execute('DELETE FROM rosters WHERE event_key = ?', (event_key,))
+            self.connection.executemany('INSERT INTO rosters VALUES (?, ?)',
+                                        [(event_key, team_key) for team_key in team_keys])
+            self.connection.execute('UPDATE events SET has_roster = 1 WHERE event_key = ?', (event_key,))
+
+    def _load(self):
+        with self._lock:
+            events = {}
+            for key, year, name, event_type, start_date, end_date, week, _ in self.connection.execute(
+                    'SELECT * FROM events'):
+                events[key] = IndexedEvent(sys.intern(key), year, name, event_type, start_date, end_date, week)
+            rosters = {}
+            for event_key, team_key in self.connection.execute('SELECT * FROM rosters'):
+                rosters.setdefault(event_key, []).append(sys.intern(team_key))
+
+        # Walking the events in date order appends each to its teams' schedules
+        # already sorted, so no per-team sorting is needed
+        schedules = {}
+        for event in sorted(events.values(), key=lambda event: (event.end_date, event.start_date, event.key)):
+            for team_key in rosters.get(event.key, ()):
+                schedules.setdefault(team_key, {}).setdefault(event.year, []).append(event.key)
+        self.events = events
+        self.rosters = {event_key: tuple(team_keys) for event_key, team_keys in rosters.items()}
+        self._schedules = {team_key: {year: tuple(keys) for year, keys in by_year.items()}
+                           for team_key, by_year in schedules.items()}
+
+    def team_events(self, team_key, year=None):
+        """Keys of the events `team_key` attends, by end date; across every indexed season if `year` is None"""
+        by_year = self._schedules.get(team_key)
+        if not by_year:
+            return ()
+        if year is not None:
+            return by_year.get(year, ())
+        return tuple(chain.from_iterable(by_year[year] for year in sorted(by_year)))
+
+    def teams(self, year=None):
+        """Team keys with at least one indexed event (in `year`, if given)"""
+        return [team_key for team_key, by_year in self._schedules.items() if year is None or year in by_year]
+
+    def reset(self):
+        with self._lock, self.connection:
+            self.connection.execute('DELETE FROM events')
+            self.connection.execute('DELETE FROM rosters')
+        self._load()
+
+    def close(self):
+        self.connection.close()
@@ -1,16 +1,19 @@
-import tbapy
 import csv
 from tqdm import tqdm
-from dotenv import load_dotenv
-import os
+from tba_utils import tba, fetch_event_rankings, season_rankings, report_missing_rankings
+from team_registry import registry
+from elo_store import EloStore, DEFAULT_STORE_PATH, years_namespace
+from profiling import timed
 
 # Performs pretty trash
 
-load_dotenv()
-tba = tbapy.TBA(os.getenv("TBAKEY"))
+# Seasons rated when none are given
+DEFAULT_YEARS = list(range(2007, 2024))
 
+# Ratings keyed by team registry ID; converted back to team keys on output
 elo_ratings = {}
 
+@timed(sample_every=64)
 def calculate_elo_rank(higher_rank_elo, lower_rank_elo, K=32):
     """Calculate the new Elo rankings based on ranks."""
     expected_score_higher = 1 / (1 + 10 ** ((lower_rank_elo - higher_rank_elo) / 400))
@@ -21,48 +24,75 @@ def calculate_elo_rank(higher_rank_elo, lower_rank_elo, K=32):
 
     return new_higher_rank_elo, new_lower_rank_elo
 
-def calculate_event(key):
-    rankings = tba.event_rankings(key)
-    # Update Elo ratings based on ranks
-    for i, higher_rank_team in enumerate(rankings["rankings"]):
-        higher_rank_team_key = higher_rank_team['team_key']
-
+def apply_rankings(ranked_ids, ratings):
+    """Update ratings in place from one event's ranking order (best team first)"""
+    for i, higher_rank_id in enumerate(ranked_ids):
         # Initialize Elo rating for the team if it doesn't exist
-        if higher_rank_team_key not in elo_ratings:
-            elo_ratings[higher_rank_team_key] = 1500
-
-        for lower_rank_team in rankings["rankings"][i+1:]:
-            lower_rank_team_key = lower_rank_team['team_key']
+        if higher_rank_id not in ratings:
+            ratings[higher_rank_id] = 1500
 
+        for lower_rank_id in ranked_ids[i+1:]:
             # Initialize Elo rating for the team if it doesn't exist
-            if lower_rank_team_key not in elo_ratings:
-                elo_ratings[lower_rank_team_key] = 1500
+            if lower_rank_id not in ratings:
+                ratings[lower_rank_id] = 1500
 
             # Update Elo ratings based on a "win" for the higher-ranked team
-            elo_ratings[higher_rank_team_key], elo_ratings[lower_rank_team_key] = \
-                calculate_elo_rank(elo_ratings[higher_rank_team_key], elo_ratings[lower_rank_team_key])
-
-def calculate_year(year):                  
-    events = tba.events(year, simple=True)
-    events.sort(key=lambda x: x['end_date'], reverse=False)
-    for event in tqdm(events, desc="Processing Events"):
-        if event['event_type'] == 99 or event['event_type'] == 100:
-            pass
-        else:
-            try:
-                calculate_event(event['key'])
-                tqdm.write(f"{event['key']} {event['event_type']}") 
-            except:
-                tqdm.write(f"Error {event['key']} {event['event_type']}")
-            
-years = list(range(2007, 2024))
-
-for year in years:
-    calculate_year(year)
-
-csv_path = 'updated_elo_ratings.csv'
-with open(csv_path, 'w', newline='') as file:
-    writer = csv.writer(file)
-    writer.writerow(['Team', 'Elo Rating'])
-    for team_key, rating in elo_ratings.items():
-        writer.writerow([team_key, rating])
\ No newline at end of file
+            ratings[higher_rank_id], ratings[lower_rank_id] = \
+                calculate_elo_rank(ratings[higher_rank_id], ratings[lower_rank_id])
+
+def apply_event(state, ranked_keys):
+    """EloStore update for one event: its ranking order as team keys"""
+    apply_rankings(registry.ids(ranked_keys), state.setdefault('elo', {}))
+
+def open_store(years=None, path=DEFAULT_STORE_PATH):
+    """The stored ratings for `years` (default DEFAULT_YEARS); each year range is kept separately"""
+    return EloStore(years_namespace('seeding', years or DEFAULT_YEARS), apply_event, path)
+
+def apply_event_rankings(key, end_date, rankings, store=None):
+    """Update Elo ratings from one event's ranking rows"""
+    ranked_keys = [team['team_key'] for team in rankings]
+    if store is None:
+        apply_rankings(registry.ids(ranked_keys), elo_ratings)
+    else:
+        store.apply(key, end_date, ranked_keys)
+
+def calculate_event(key, store=None, end_date=None):
+    rankings = fetch_event_rankings(tba, key)
+    if rankings is not None:
+        apply_event_rankings(key, end_date, rankings, store)
+
+def calculate_years(years, store=None):
+    # Events already in the store were applied on an earlier run
+    processed = store.processed_events() if store is not None else set()
+    # Rankings are all fetched up front; only the Elo updates run in end_date order
+    ranked, missing = season_rankings(tba, years, skip=processed)
+    for event, rankings in tqdm(ranked, desc="Processing Events"):
+        apply_event_rankings(event['key'], event['end_date'], rankings, store)
+    report_missing_rankings(missing)
+
+def main(years=None, output='updated_elo_ratings.csv', store_path=DEFAULT_STORE_PATH, rebuild=False, as_of=None):
+    """Bring the stored ratings up to date and write them out.
+
+    Only events the store hasn't seen are fetched and applied. `rebuild` starts
+    from scratch; `as_of` writes the ratings as they stood right after that event.
+    """
+    if years is None:
+        years = DEFAULT_YEARS
+
+    store = open_store(years, store_path)
+    if rebuild:
+        store.reset()
+    calculate_years(years, store)
+
+    elo_ratings.clear()
+    elo_ratings.update(store.values_as_of(as_of, 'elo') if as_of else store.current('elo'))
+    store.close()
+
+    with open(output, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Team', 'Elo Rating'])
+        for team_id, rating in elo_ratings.items():
+            writer.writerow([registry.key(team_id), rating])
+
+if __name__ == "__main__":
+    main()
@@ -1,94 +1,71 @@
-import os
-import pandas as pd
-from dotenv import load_dotenv
-import tbapy
+import tba_structs
+from tba_utils import tba
+from score_breakdowns import build_tables
 
 # Constants
 EXPECTED_ENTRIES_PER_MATCH = 6
 ONSTAGE_STATUSES = ['StageLeft', 'StageRight', 'CenterStage']
 VALID_PARKED_STATUSES = ['Parked', 'None']
 
-# Load environment variables
-load_dotenv()
-tba_key = os.getenv("TBAKEY")
-tba = tbapy.TBA(tba_key)
+# Scouting column -> alliance score breakdown field it should add up to
+NOTE_COUNTS = {
+    'AutoSpeaker': 'autoSpeakerNoteCount',
+    'AutoAmp': 'autoAmpNoteCount',
+    'TeleAmp': 'teleopAmpNoteCount',
+    'TeleSpeaker': 'teleopSpeakerNoteCount',
+}
 
-# Retrieve matches from The Blue Alliance
-matches = tba.event_matches('2024mnmi')
+def main(event_key='2024mnmi', scouting_csv="2470_10klakes_data.csv"):
+    import pandas as pd
 
-# Load the CSV file
-df = pd.read_csv("2470_10klakes_data.csv")
+    # Retrieve matches from The Blue Alliance, flattened to one row per alliance and per robot
+    alliances, robots, _ = build_tables(tba_structs.event_matches(tba, event_key))
+    alliances = alliances[alliances['comp_level'] == 'qm']  # Focus on qualification matches
+    robots = robots[robots['comp_level'] == 'qm']
 
-# Normalize team numbers in the DataFrame to remove the '.0' and prepend 'frc'
-df['Team Number'] = df['Team Number'].apply(lambda x: 'frc' + str(int(x)) if pd.notna(x) else None)
+    # Load the CSV file
+    df = pd.read_csv(scouting_csv)
 
-# Drop rows where 'Qualification Match Number' is NaN before converting to int
-df = df.dropna(subset=['Qualification Match Number'])
-df['Qualification Match Number'] = df['Qualification Match Number'].astype(int)
+    # Normalize team numbers in the DataFrame to remove the '.0' and prepend 'frc'
+    df['Team Number'] = df['Team Number'].apply(lambda x: 'frc' + str(int(x)) if pd.notna(x) else None)
 
-# Validation and analysis variables
-correct_pairings = 0
-incorrect_pairings = 0
-auto_speaker_differences = []
-auto_amp_differences = []
-tele_amp_differences = []
-tele_speaker_differences = []
+    # Drop rows where 'Qualification Match Number' is NaN before converting to int
+    df = df.dropna(subset=['Qualification Match Number'])
+    df['Qualification Match Number'] = df['Qualification Match Number'].astype(int)
+    # Only a team's first entry for a match counts
+    df = df.drop_duplicates(subset=['Qualification Match Number', 'Team Number'])
 
-# Validate team entries per match and alliance, and compute differences
-for match in matches:
-    if 'comp_level' in match and match['comp_level'] == 'qm':  # Focus on qualification matches
-        match_number = match['match_number']
-        for color, alliance in match['alliances'].items():
-            teams = alliance['team_keys']
-            score_breakdown = match['score_breakdown'][color]
+    # Pair every robot with its scouting entry
+    paired = robots.astype({'match_number': int, 'team_key': object}).merge(
+        df, how='left', indicator=True,
+        left_on=['match_number', 'team_key'], right_on=['Qualification Match Number', 'Team Number'])
+    scouted = paired['_merge'] == 'both'
+    onstage_csv = paired['Did they get On Stage?']
+    onstage_status = paired['endGameRobot'].astype(object)
+    correct = scouted & (
+        (onstage_csv.isin(['Yes, solo', 'Yes, with another robot']) & onstage_status.isin(ONSTAGE_STATUSES))
+        | (onstage_csv.isin(['Did not attempt', 'Tried and Failed']) & onstage_status.isin(VALID_PARKED_STATUSES)))
+    correct_pairings = int(correct.sum())
+    incorrect_pairings = int((scouted & ~correct).sum())
 
-            auto_speaker_note_count = score_breakdown['autoSpeakerNoteCount']
-            auto_amp_note_count = score_breakdown['autoAmpNoteCount']
-            tele_amp_note_count = score_breakdown['teleopAmpNoteCount']
-            tele_speaker_note_count = score_breakdown['teleopSpeakerNoteCount']
+    # Alliances where every robot was scouted and its endgame agrees with TBA
+    paired['correct'] = correct
+    by_alliance = paired.groupby(['match_key', 'alliance'], observed=True)
+    totals = by_alliance[list(NOTE_COUNTS)].sum()
+    totals = totals[by_alliance['correct'].all()]
+    valid = alliances.set_index(['match_key', 'alliance']).astype({field: float for field in NOTE_COUNTS.values()})
+    valid = valid.loc[valid.index.intersection(totals.index)]
+    differences = {column: (totals.loc[valid.index, column] - valid[field]).abs()
+                   for column, field in NOTE_COUNTS.items()}
 
-            csv_auto_speaker_total = 0
-            csv_auto_amp_total = 0
-            csv_tele_amp_total = 0
-            csv_tele_speaker_total = 0
+    # Summary of results and average differences
+    print(f"Total correct pairings: {correct_pairings}")
+    print(f"Total incorrect pairings: {incorrect_pairings}")
+    for column, difference in differences.items():
+        if len(difference):
+            print(f"Average {column} difference: {difference.mean():.2f}")
 
-            valid_alliance = True
-            for i, team in enumerate(teams, start=1):
-                onstage_key = f'endGameRobot{i}'
-                onstage_status = score_breakdown.get(onstage_key)
-                team_data = df[(df['Qualification Match Number'] == match_number) & (df['Team Number'] == team)]
+    print(len(valid))
 
-                if not team_data.empty:
-                    onstage_csv = team_data['Did they get On Stage?'].iloc[0]
-                    if (onstage_csv in ['Yes, solo', 'Yes, with another robot'] and onstage_status in ONSTAGE_STATUSES) \
-                            or (onstage_csv in ['Did not attempt', 'Tried and Failed'] and onstage_status in VALID_PARKED_STATUSES):
-                        correct_pairings += 1
-                        csv_auto_speaker_total += team_data['AutoSpeaker'].iloc[0]
-                        csv_auto_amp_total += team_data['AutoAmp'].iloc[0]
-                        csv_tele_amp_total += team_data['TeleAmp'].iloc[0]
-                        csv_tele_speaker_total += team_data['TeleSpeaker'].iloc[0]
-                    else:
-                        incorrect_pairings += 1
-                        valid_alliance = False
-                else:
-                    valid_alliance = False
-
-            if valid_alliance:
-                auto_speaker_differences.append(abs(csv_auto_speaker_total - auto_speaker_note_count))
-                auto_amp_differences.append(abs(csv_auto_amp_total - auto_amp_note_count))
-                tele_amp_differences.append(abs(csv_tele_amp_total - tele_amp_note_count))
-                tele_speaker_differences.append(abs(csv_tele_speaker_total - tele_speaker_note_count))
-
-# Summary of results and average differences
-print(f"Total correct pairings: {correct_pairings}")
-print(f"Total incorrect pairings: {incorrect_pairings}")
-if auto_speaker_differences:
-    print(f"Average AutoSpeaker difference: {sum(auto_speaker_differences) / len(auto_speaker_differences):.2f}")
-if auto_amp_differences:
-    print(f"Average AutoAmp difference: {sum(auto_amp_differences) / len(auto_amp_differences):.2f}")
-if tele_amp_differences:
-    print(f"Average TeleAmp difference: {sum(tele_amp_differences) / len(tele_amp_differences):.2f}")
-if tele_speaker_differences:
-    print(f"Average TeleSpeaker difference: {sum(tele_speaker_differences) / len(tele_speaker_differences):.2f}")
-
-print(len(auto_speaker_differences))
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import datetime
+import sqlite3
+import threading
+from typing import NamedTuple
+
+DEFAULT_CACHE_PATH = 'slff_scores.sqlite3'
+
+# Events are only stored once TBA has had time to post final awards and district points
+FINAL_AFTER_DAYS = 7
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    event_key TEXT PRIMARY KEY,
+    year INTEGER NOT NULL,
+    end_date TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scores (
+    event_key TEXT NOT NULL,
+    team_key TEXT NOT NULL,
+    district_points INTEGER NOT NULL,
+    playoff_points INTEGER NOT NULL,
+    award_points INTEGER NOT NULL,
+    impact INTEGER NOT NULL,
+    engineering INTEGER NOT NULL,
+    robot INTEGER NOT NULL,
+    sustainability INTEGER NOT NULL,
+    PRIMARY KEY (event_key, team_key)
+);
+'''
+
+
+class EventScore(NamedTuple):
+    """One team's SLFF components at one event"""
+    district_points: int = 0
+    playoff_points: int = 0
+    award_points: int = 0
+    impact: int = 0
+    engineering: int = 0
+    robot: int = 0
+    sustainability: int = 0
+
+    @property
+    def total(self):
+        return self.district_points + self.playoff_points + self.award_points
+
+
+# Teams that earned nothing at an event have no stored row
+NO_SCORE = EventScore()
+
+
+def is_final(event, today=None):
+    """Whether `event` ended FINAL_AFTER_DAYS ago; events TBA hasn't dated yet aren't final"""
+    today = today or datetime.date.today()
+    end_date = event['end_date']
+    return bool(end_date) and end_date <= (today - datetime.timedelta(days=FINAL_AFTER_DAYS)).isoformat()
+
+
+class EventScoreCache:
+    """Per-(team, event) SLFF components, persisted for events that are over.
+
+    Scores are keyed by team key, so any year window or weighting can be
+    assembled from stored rows without refetching or rescoring past events.
+    Events that are still running (or just finished) are only kept in memory
+    for the current run. Changing `version` discards everything stored under
+    a different version, for when the scoring rules change.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, version=1):
+        # Sharded runs have several worker processes writing here at once: WAL lets
+        # readers carry on during a write, and writers wait their turn rather than fail
+        self.connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._recent = {}
+        with self._lock, self.connection:
+            row = self.connection.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+            if row is None or row[0] != str(version):
+                self._clear()
+                self.connection.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('version', ?)",
+                                        (str(version),))
+
+    def _clear(self):
+        self.connection.execute('DELETE FROM events')
+        self.connection.execute('DELETE FROM scores')
+        self._recent.clear()
+
+    def reset(self):
+        with self._lock, self.connection:
+            self._clear()
+
+    def get_many(self, event_keys):
+        """{event key: {team key: EventScore}} for every requested event that's been scored"""
+        event_keys = list(event_keys)
+        found = {}
+        with self._lock:
+            for event_key in event_keys:
+                if event_key in self._recent:
+                    found[event_key] = self._recent[event_key]
+            stored = [event_key for event_key in event_keys if event_key not in found]
+            # Stay under SQLite's bound parameter limit
+            for start in range(0, len(stored), 500):
+                chunk = stored[start:start + 500]
+                placeholders = ', '.join('?' * len(chunk))
+                for (event_key,) in self.connection.execute(
+                        f'SELECT event_key FROM events WHERE event_key IN ({placeholders})', chunk):
+                    found[event_key] = {}
+                for event_key, team_key, *components in self.connection.execute(
+                        f'SELECT * FROM scores WHERE event_key IN ({placeholders})', chunk):
+                    found[event_key][team_key] = EventScore(*components)
+        return found
+
+    def put(self, event, team_scores):
+        """Record every team's components at `event`; only finished events are persisted"""
+        with self._lock:
+            if not is_final(event):
+                self._recent[event['key']] = team_scores
+                return
+            with self.connection:
+                self.connection.execute('INSERT OR REPLACE INTO events (event_key, year, end_date) VALUES (?, ?, ?)',
+                                        (event['key'], event['year'], event['end_date']))
+                self.connection.execute('DELETE FROM scores WHERE event_key = ?', (event['key'],))
+                self.connection.executemany(
+                    'INSERT INTO scores VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    [(event['key'], team_key, *score) for team_key, score in team_scores.items()])
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,207 @@
+"""Per-event order statistics over team ratings, for event strength and what-if roster changes.
+
+Every rated team gets a fixed position in one global order, best rating
+first. Each event keeps a Fenwick tree over those positions counting which
+teams are registered, so adding or removing a team and finding the k-th best
+rating at an event each take O(log n) steps, and nothing is re-sorted.
+
+what_if() applies a batch of hypothetical roster changes (teams registering,
+withdrawing or moving between events), reports the Top-k of every event
+they touch before and after, and undoes them, so hundreds of scenarios can
+be evaluated against one loaded index.
+
+    python strength_index.py 2025 +254@2025casj,+1678@2025casj '1690@2025isde1>2025isde2'
+"""
+import sys
+from typing import NamedTuple
+
+# eventStrength's Top2, Top4, Top8 and Top24: the 2nd, 4th, 8th and 24th best ratings at an event
+TOP_KS = (2, 4, 8, 24)
+
+
+class Change(NamedTuple):
+    """A hypothetical roster change; `event_key` is the event left for 'move'"""
+    action: str  # 'add', 'remove' or 'move'
+    team_id: int
+    event_key: str
+    to_event: str = None
+
+
+class FenwickCounts:
+    """Counts over positions 1..size with O(log size) updates, prefix sums and k-th lookups"""
+
+    __slots__ = ('tree', 'size', 'total', '_top_bit')
+
+    def __init__(self, size):
+        self.tree = [0] * (size + 1)
+        self.size = size
+        self.total = 0
+        self._top_bit = 1 << (size.bit_length() - 1) if size else 0
+
+    def add(self, position, delta):
+        self.total += delta
+        tree = self.tree
+        while position <= self.size:
+            tree[position] += delta
+            position += position & -position
+
+    def kth(self, k):
+        """The position holding the k-th counted item (1 = first), or None if there are fewer than k"""
+        if k < 1 or k > self.total:
+            return None
+        tree = self.tree
+        position = 0
+        bit = self._top_bit
+        while bit:
+            step = position + bit
+            if step <= self.size and tree[step] < k:
+                position = step
+                k -= tree[step]
+            bit >>= 1
+        return position + 1
+
+
+class StrengthIndex:
+    """Rosters of many events with each event's rating order statistics kept up to date.
+
+    `ratings` is {team ID: rating}; teams without a rating are ignored, as
+    eventStrength ignores them.
+    """
+
+    def __init__(self, ratings, rosters=None):
+        order = sorted(ratings, key=lambda team_id: (-ratings[team_id], team_id))
+        self.ratings = ratings
+        self.position = {team_id: position for position, team_id in enumerate(order, start=1)}
+        self.by_position = [None] + [ratings[team_id] for team_id in order]
+        self.counts = {}
+        self.rosters = {}
+        for event_key, team_ids in (rosters or {}).items():
+            self.add_event(event_key, team_ids)
+
+    def add_event(self, event_key, team_ids=()):
+        self.counts[event_key] = FenwickCounts(len(self.position))
+        self.rosters[event_key] = set()
+        for team_id in team_ids:
+            self.add(event_key, team_id)
+
+    def add(self, event_key, team_id):
+        """Register a team at an event; returns False if it's unrated or already there"""
+        if team_id not in self.position or team_id in self.rosters[event_key]:
+            return False
+        self.rosters[event_key].add(team_id)
+        self.counts[event_key].add(self.position[team_id], 1)
+        return True
+
+    def remove(self, event_key, team_id):
+        """Withdraw a team from an event; returns False if it wasn't registered"""
+        if team_id not in self.rosters[event_key]:
+            return False
+        self.rosters[event_key].discard(team_id)
+        self.counts[event_key].add(self.position[team_id], -1)
+        return True
+
+    def kth(self, event_key, k):
+        """The k-th best rating at an event, or None if fewer than k rated teams are registered"""
+        position = self.counts[event_key].kth(k)
+        return None if position is None else self.by_position[position]
+
+    def strength(self, event_key, ks=TOP_KS):
+        return [self.kth(event_key, k) for k in ks]
+
+    def _apply(self, change):
+        """Apply one change; returns the (undo function, event keys touched)"""
+        if change.action == 'add':
+            added = self.add(change.event_key, change.team_id)
+            return (lambda: self.remove(change.event_key, change.team_id)) if added else None, [change.event_key]
+        if change.action == 'remove':
+            removed = self.remove(change.event_key, change.team_id)
+            return (lambda: self.add(change.event_key, change.team_id)) if removed else None, [change.event_key]
+        if change.action == 'move':
+            removed = self.remove(change.event_key, change.team_id)
+            added = self.add(change.to_event, change.team_id)
+
+            def undo():
+                if added:
+                    self.remove(change.to_event, change.team_id)
+                if removed:
+                    self.add(change.event_key, change.team_id)
+            return undo, [change.event_key, change.to_event]
+        raise ValueError(f"Unknown roster change {change.action!r}")
+
+    def what_if(self, changes, ks=TOP_KS):
+        """{event key: (Top-k before, Top-k after)} for every event a batch of changes touches.
+
+        The changes are applied together and then undone, leaving the index as it was.
+        """
+        touched = dict.fromkeys(key for change in changes
+                                for key in (change.event_key, change.to_event) if key is not None)
+        missing = [key for key in touched if key not in self.counts]
+        if missing:
+            raise KeyError(f"Unknown events: {', '.join(missing)}")
+        before = {key: self.strength(key, ks) for key in touched}
+        undo = []
+        try:
+            for change in changes:
+                revert, _ = self._apply(change)
+                if revert is not None:
+                    undo.append(revert)
+            return {key: (before[key], self.strength(key, ks)) for key in touched}
+        finally:
+            for revert in reversed(undo):
+                revert()
+
+    def evaluate(self, scenarios, ks=TOP_KS):
+        """what_if() for each scenario (a list of Changes) in turn, each against the unchanged index"""
+        return [self.what_if(changes, ks) for changes in scenarios]
+
+
+def parse_scenario(text):
+    """Changes from '+254@2025casj' (register), '-254@2025casj' (withdraw) and
+    '254@2025casj>2025cada' (move), separated by commas"""
+    from team_registry import registry
+
+    changes = []
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        action = {'+': 'add', '-': 'remove'}.get(item[0])
+        team, _, events = (item[1:] if action else item).partition('@')
+        team_id = registry.id(f'frc{int(team)}')
+        if action:
+            changes.append(Change(action, team_id, events))
+        else:
+            from_event, _, to_event = events.partition('>')
+            if not to_event:
+                raise ValueError(f"Can't parse roster change {item!r}")
+            changes.append(Change('move', team_id, from_event, to_event))
+    return changes
+
+
+def load_index(event_year, years=None, ratings='epa'):
+    """A StrengthIndex of every `event_year` event's roster, from weighted EPA over `years`"""
+    import eventStrength
+    from season_index import SeasonIndex
+    from tba_utils import tba
+
+    if years is None:
+        years = [event_year - 1, event_year - 2, event_year - 3]
+    eventStrength.load_epa_data(years, ratings)
+    team_data = eventStrength.build_team_data()
+    index = SeasonIndex()
+    index.refresh(tba, [event_year])
+    rosters = eventStrength.event_rosters(index, event_year)
+    index.close()
+    return StrengthIndex({team_id: team['weighted_epa'] for team_id, team in team_data.items()}, rosters)
+
+
+def main(event_year, scenarios, years=None, ratings='epa'):
+    strength_index = load_index(event_year, years, ratings)
+    header = ''.join(f'{f"Top{k}":>16}' for k in TOP_KS)
+    for text, result in zip(scenarios, strength_index.evaluate([parse_scenario(text) for text in scenarios])):
+        print(f"{text}\n{'event':<16}{header}")
+        for event_key, (before, after) in result.items():
+            cells = ''.join(f'{"-" if b is None else round(b):>7} -> {"-" if a is None else round(a):<5}'
+                            for b, a in zip(before, after))
+            print(f"{event_key:<16}{cells}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]), sys.argv[2:])
@@ -0,0 +1,137 @@
+import email.utils
+import random
+import time
+import requests
+import tbapy
+import fast_json
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from tba_utils import MISSING, OfflineCacheMiss, AdaptiveLimiter, ResponseCache
+
+# Kept out of tba_utils so importing a script doesn't pull in requests and tbapy;
+# tba_utils.get_client() imports this on first use
+
+# Responses worth another attempt, and the ones that mean the server wants us to slow down
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+THROTTLE_STATUSES = {429, 503}
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CachedTBA(tbapy.TBA):
+    """tbapy client that routes every GET through a shared cache and adaptive limiter.
+
+    This is the only place requests are retried: connection errors, 429s and
+    5xx responses share one budget of `max_retries` attempts, with Retry-After
+    honored when the server sends it and jittered exponential backoff otherwise.
+    """
+
+    def __init__(self, auth_key, cache=None, limiter=None, offline=False, pool_size=25, max_retries=4,
+                 backoff_factor=0.5, base_url=None, timeout=30):
+        # tbapy shares one session across all instances; give this client its own,
+        # without urllib3's retries so they don't stack with ours
+        self.session = requests.Session()
+        adapter = HTTPAdapter(max_retries=0, pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Always ask for a compressed body, including brotli/zstd when urllib3 can decode them
+        self.session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+        super().__init__(auth_key)
+        self.response_cache = cache if cache is not None else ResponseCache()
+        self.limiter = limiter if limiter is not None else AdaptiveLimiter()
+        self.offline = offline
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.base_url = base_url or self.READ_URL_PRE
+        self.timeout = timeout
+
+    def _request(self, url, headers=None):
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            backoff = self.backoff_factor * 2 ** attempt * random.uniform(0.5, 1.0)
+            self.limiter.acquire()
+            start = time.monotonic()
+            response = None
+            try:
+                response = self.session.get(self.base_url + url, headers=headers or {}, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt:
+                    raise
+            finally:
+                # Whatever session.get raised (ChunkedEncodingError, InvalidURL, ...), give the slot back
+                if response is None:
+                    self.limiter.release()
+            if response is None:
+                time.sleep(backoff)
+                continue
+
+            throttled = response.status_code in THROTTLE_STATUSES
+            retry_after = parse_retry_after(response.headers.get('Retry-After')) if throttled else None
+            self.limiter.release(time.monotonic() - start, throttled, retry_after)
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            if last_attempt:
+                response.raise_for_status()
+            # With Retry-After the limiter already holds every request back until it passes
+            if retry_after is None:
+                time.sleep(backoff)
+
+    def _fetch_body(self, url):
+        """Response body bytes for `url`, from the cache or fetched (and cached) if absent"""
+        body = self.response_cache.get_body(url, allow_stale=self.offline)
+        if body is MISSING:
+            if self.offline:
+                raise OfflineCacheMiss(f"{url} is not in the cache and --offline was given")
+            response = self._request(url)
+            body = response.content
+            if not 200 <= response.status_code < 300:
+                # 401/404 payloads ({"Error": ...}) aren't data; hand them back as tbapy would, but never cache them
+                self._detect_errors(fast_json.loads(body) if body else None)
+                return body
+            # Error payloads are small objects; don't parse a whole season just to rule one out
+            if b'"Errors"' in body[:256]:
+                self._detect_errors(fast_json.loads(body))
+            self.response_cache.put(url, etag=response.headers.get('ETag'), body=body)
+        return body
+
+    def _get(self, url):
+        # Parsed fresh from the cached bytes, so callers can sort returned lists in place
+        return fast_json.loads(self._fetch_body(url))
+
+    def get_typed(self, url, type):
+        """GET `url` decoded straight into `type` (see tba_structs), skipping the fields it doesn't declare"""
+        import tba_structs
+        return tba_structs.decode(self._fetch_body(url), type)
+
+    def poll(self, url):
+        """Conditional GET that ignores the cache TTL.
+
+        Returns (changed, data). TBA answers 304 Not Modified when the ETag from
+        the last fetch still matches, which costs no body transfer.
+        """
+        if self.offline:
+            cached = self.response_cache.get(url, allow_stale=True)
+            return False, None if cached is MISSING else cached
+        etag = self.response_cache.etag(url)
+        response = self._request(url, headers={'If-None-Match': etag} if etag else {})
+        if response.status_code == 304:
+            return False, self.response_cache.get(url, allow_stale=True)
+        raw = fast_json.loads(response.content)
+        self._detect_errors(raw)
+        if not 200 <= response.status_code < 300:
+            # Nothing new to report, and the error payload mustn't replace the cached data or its ETag
+            return False, self.response_cache.get(url, allow_stale=True)
+        self.response_cache.put(url, etag=response.headers.get('ETag'), body=response.content)
+        return True, raw
@@ -0,0 +1,164 @@
+"""A local stand-in for the TBA API that rate-limits like a busy server.
+
+Runs the real client (cache, adaptive limiter and retries) against it and
+reports how the limiter behaved:
+
+    python tba_standin.py
+    python tba_standin.py --requests 500 --rate 40 --max-concurrent 6 --retry-after 1
+"""
+import argparse
+import json
+import math
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import tba_utils
+
+
+class StandinServer(ThreadingHTTPServer):
+    """Serves any /api/v3/ path with a small JSON body.
+
+    Requests beyond `rate` per second (with `burst` headroom) get a 429 with
+    Retry-After, requests beyond `max_concurrent` in flight get a 503, and
+    latency grows with the number of requests in flight.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, rate=50.0, burst=10, max_concurrent=8, latency=0.02, latency_per_request=0.005,
+                 retry_after=None, port=0):
+        super().__init__(('127.0.0.1', port), StandinHandler)
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.latency = latency
+        self.latency_per_request = latency_per_request
+        self.retry_after = retry_after
+        self.stats = {'served': 0, 'throttled': 0, 'overloaded': 0, 'peak_in_flight': 0}
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/api/v3/'
+
+    def admit(self):
+        """Returns (status, retry_after) for a new request and counts it in flight if admitted"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if self._tokens < 1:
+                self.stats['throttled'] += 1
+                wait = self.retry_after if self.retry_after is not None else (1 - self._tokens) / self.rate
+                return 429, wait
+            if self._in_flight >= self.max_concurrent:
+                self.stats['overloaded'] += 1
+                return 503, None
+            self._tokens -= 1
+            self._in_flight += 1
+            self.stats['peak_in_flight'] = max(self.stats['peak_in_flight'], self._in_flight)
+            return 200, None
+
+    def finish(self):
+        with self._lock:
+            self._in_flight -= 1
+            self.stats['served'] += 1
+            return self._in_flight
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        status, retry_after = self.server.admit()
+        if status != 200:
+            self.send_response(status)
+            if retry_after is not None:
+                self.send_header('Retry-After', str(math.ceil(retry_after)))
+            self.end_headers()
+            return
+        try:
+            time.sleep(self.server.latency + self.server.latency_per_request * self.server._in_flight)
+            body = json.dumps({'path': self.path}).encode('utf-8')
+        finally:
+            self.server.finish()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_load(server, requests=300, workers=32, max_retries=6):
+    """Fetch `requests` distinct URLs through a fresh client and limiter; returns a summary dict"""
+    from tba_client import CachedTBA
+
+    limiter = tba_utils.AdaptiveLimiter(initial=min(4, workers), max_limit=workers)
+    samples = []
+    failures = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        client = CachedTBA('', cache=tba_utils.ResponseCache(cache_dir), limiter=limiter,
+                           max_retries=max_retries, backoff_factor=0.1, base_url=server.url)
+
+        def fetch(i):
+            data = client._get(f'standin/{i}')
+            samples.append(limiter.limit)
+            return data
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(fetch, i) for i in range(requests)]
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    failures.append(str(e))
+        elapsed = time.monotonic() - start
+
+    return {
+        'requests': requests,
+        'failed': len(failures),
+        'elapsed': elapsed,
+        'throughput': (requests - len(failures)) / elapsed,
+        'final_limit': limiter.limit,
+        'peak_limit': max(samples, default=limiter.limit),
+        'mean_limit': sum(samples) / len(samples) if samples else limiter.limit,
+        **server.stats,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=32, help='client threads, and the limiter ceiling')
+    parser.add_argument('--rate', type=float, default=50.0, help='requests per second the server allows')
+    parser.add_argument('--burst', type=int, default=10)
+    parser.add_argument('--max-concurrent', type=int, default=8, help='in-flight requests before the server 503s')
+    parser.add_argument('--retry-after', type=float, help='fixed Retry-After seconds on 429 (default: time to next token)')
+    args = parser.parse_args(argv)
+
+    server = StandinServer(rate=args.rate, burst=args.burst, max_concurrent=args.max_concurrent,
+                           retry_after=args.retry_after)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        summary = run_load(server, args.requests, args.workers)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    for name, value in summary.items():
+        print(f"{name:<16}{value:.2f}" if isinstance(value, float) else f"{name:<16}{value}")
+    # Every request should get through once its retries are spent on throttling, not errors
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""Typed records for the TBA payloads the analyses read most.
+
+With msgspec installed, responses are decoded straight from the cached bytes
+into these structs, skipping every field they don't declare (videos,
+timestamps, surrogate teams...) instead of building dicts for the whole
+payload; on a season of matches that is several times faster than parsing the
+JSON and wrapping it in tbapy models. Score breakdowns are kept as raw JSON
+and only parsed when read.
+
+Records support attribute and item access alike (match.alliances.red.score or
+match['alliances']['red']['score']), so code written against tbapy models
+works unchanged. Without msgspec they are attribute-accessible dicts instead.
+"""
+import json
+from typing import Optional
+import fast_json
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+if msgspec is not None:
+
+    # Read-only, and never part of a reference cycle, so the garbage collector can skip them
+    class Record(msgspec.Struct, frozen=True, gc=False):
+        """Base for the typed records; adds the dict-style reads tbapy models allow"""
+
+        def __getitem__(self, name):
+            try:
+                return getattr(self, name)
+            except AttributeError:
+                raise KeyError(name) from None
+
+        def get(self, name, default=None):
+            return getattr(self, name, default)
+
+        def __contains__(self, name):
+            return hasattr(self, name)
+
+    class MatchAlliance(Record):
+        team_keys: list[str] = []
+        score: Optional[int] = None
+
+    class MatchAlliances(Record):
+        red: MatchAlliance = MatchAlliance()
+        blue: MatchAlliance = MatchAlliance()
+
+    class Match(Record):
+        key: str = ''
+        event_key: str = ''
+        comp_level: str = ''
+        set_number: int = 0
+        match_number: int = 0
+        alliances: MatchAlliances = MatchAlliances()
+        winning_alliance: Optional[str] = None
+        time: Optional[int] = None
+        actual_time: Optional[int] = None
+        score_breakdown_json: msgspec.Raw = msgspec.field(name='score_breakdown', default_factory=msgspec.Raw)
+
+        @property
+        def score_breakdown(self):
+            """The match's score breakdown, parsed from the raw JSON each time it's read"""
+            if not self.score_breakdown_json:
+                return None
+            return fast_json.loads(bytes(self.score_breakdown_json))
+
+    class Event(Record):
+        key: str = ''
+        name: str = ''
+        event_code: str = ''
+        event_type: int = -1
+        year: int = 0
+        start_date: Optional[str] = None
+        end_date: Optional[str] = None
+        week: Optional[int] = None
+
+    class AwardRecipient(Record):
+        team_key: Optional[str] = None
+        awardee: Optional[str] = None
+
+    class Award(Record):
+        award_type: int = -1
+        name: str = ''
+        event_key: str = ''
+        year: int = 0
+        recipient_list: list[AwardRecipient] = []
+
+    class WLTRecord(Record):
+        wins: int = 0
+        losses: int = 0
+        ties: int = 0
+
+    class Ranking(Record):
+        team_key: str = ''
+        rank: Optional[int] = None
+        matches_played: int = 0
+        dq: int = 0
+        record: Optional[WLTRecord] = None
+        sort_orders: Optional[list[Optional[float]]] = None
+
+    class Rankings(Record):
+        rankings: Optional[list[Ranking]] = None
+
+    class Alliance(Record):
+        name: Optional[str] = None
+        picks: list[str] = []
+
+    def decode(body, type):
+        """Decode a JSON response body into `type`, e.g. list[Match]"""
+        return msgspec.json.decode(body, type=type)
+
+else:
+
+    class Record(dict):
+        """Fallback record: a parsed JSON object that also allows attribute access"""
+
+        def __getattr__(self, name):
+            try:
+                return self[name]
+            except KeyError:
+                raise AttributeError(name) from None
+
+    MatchAlliance = MatchAlliances = Match = Event = AwardRecipient = Award = Record
+    WLTRecord = Ranking = Rankings = Alliance = Record
+
+    def decode(body, type):
+        """Parse a JSON response body into Records; `type` only matters when msgspec is installed"""
+        return json.loads(body, object_hook=Record)
+
+
+def event_matches(tba, event_key):
+    return tba.get_typed(f'event/{event_key}/matches', list[Match])
+
+
+def team_matches(tba, team, year):
+    return tba.get_typed(f'team/{tba.team_key(team)}/matches/{year}', list[Match])
+
+
+def event_awards(tba, event_key):
+    return tba.get_typed(f'event/{event_key}/awards', list[Award])
+
+
+def event_alliances(tba, event_key):
+    # TBA returns null rather than [] before alliance selection
+    return tba.get_typed(f'event/{event_key}/alliances', Optional[list[Alliance]]) or []
+
+
+def event_rankings(tba, event_key):
+    """Ranking rows for an event, or None when it has none posted"""
+    rankings = tba.get_typed(f'event/{event_key}/rankings', Optional[Rankings])
+    return (rankings.rankings or None) if rankings else None
+
+
+def events(tba, year):
+    return tba.get_typed(f'events/{year}', list[Event])
+
+
+def team_events(tba, team, year):
+    return tba.get_typed(f'team/{tba.team_key(team)}/events/{year}', list[Event])
@@ -0,0 +1,348 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from tqdm import tqdm
+import fast_json
+from compression import Codec
+
+# TBA serves teams in pages of 500
+TEAMS_PER_PAGE = 500
+
+DEFAULT_CACHE_DIR = '.tba_cache'
+
+# Offseason and preseason events don't feed the Elo ratings
+UNRANKED_EVENT_TYPES = [99, 100]
+
+# Settings shared by every script running in this process
+# 'workers' also caps how far the adaptive limiter lets in-flight requests grow
+settings = {
+    'workers': 10,
+    'offline': False,
+    'cache_dir': DEFAULT_CACHE_DIR,
+    'cache_ttl': 3600,
+    # Attempts after the first for a request that fails, is throttled or gets a 5xx
+    'max_retries': 4,
+}
+
+# Marks a cache miss, since None is a legitimate TBA response
+MISSING = object()
+
+_client = None
+_executor = None
+_shared_lock = threading.Lock()
+
+
+class OfflineCacheMiss(Exception):
+    """Raised in offline mode when a request is not in the on-disk cache"""
+
+
+class AdaptiveLimiter:
+    """AIMD limit on how many requests are in flight at once.
+
+    While latency stays near the best seen, the limit grows by about one
+    request per round trip (additive increase). A 429 or 503 halves it
+    (multiplicative decrease), at most once per round trip so a burst of
+    throttled responses counts as one signal, and a Retry-After header holds
+    back every new request until it has passed. Growth then pauses for
+    `throttle_hold` seconds, since a rate-limited server only signals again
+    once the limit has overshot. Latency well above the baseline trims the
+    limit a little, before the server starts refusing.
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=10, backoff=0.5, latency_tolerance=2.0,
+                 throttle_hold=2.0):
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.throttle_hold = throttle_hold
+        self.in_flight = 0
+        # Smoothed best-case latency; drifts up slowly so a lucky fast response doesn't stick
+        self.baseline = None
+        self._resume_at = 0.0
+        self._last_decrease = 0.0
+        self._hold_until = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Block until a request may start"""
+        with self._condition:
+            while True:
+                wait = self._resume_at - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                elif self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                else:
+                    self._condition.wait()
+
+    def _decrease(self, factor):
+        """Caller holds the lock"""
+        now = time.monotonic()
+        if now - self._last_decrease >= (self.baseline or 0.1):
+            self.limit = max(self.min_limit, self.limit * factor)
+            self._last_decrease = now
+
+    def release(self, latency=None, throttled=False, retry_after=None):
+        """Record how a request finished; latency is None when it never got a response"""
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self._decrease(self.backoff)
+                now = time.monotonic()
+                if retry_after:
+                    self._resume_at = max(self._resume_at, now + retry_after)
+                self._hold_until = max(self._hold_until, now + (retry_after or 0) + self.throttle_hold)
+            elif latency is not None:
+                if self.baseline is None or latency < self.baseline:
+                    self.baseline = latency
+                else:
+                    self.baseline = 0.95 * self.baseline + 0.05 * latency
+                if latency > self.baseline * self.latency_tolerance:
+                    self._decrease(0.9)
+                elif time.monotonic() >= self._hold_until:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class ResponseCache:
+    """TBA responses cached on disk as compressed JSON files, with the most recently used kept in memory.
+
+    Entries are compressed with zstd and a dictionary trained on TBA responses
+    when zstandard is installed, and gzip otherwise (see compression.Codec);
+    either is read back transparently, as are uncompressed entries from older
+    caches. Memory holds raw response bodies rather than parsed objects, which
+    are several times larger, and is capped at `max_memory_bytes`; least
+    recently used responses are evicted first and re-read from disk when
+    needed again. Bodies are parsed on each get(), or decoded straight into
+    typed records via get_body().
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=3600, max_memory_bytes=256 * 1024 * 1024, codec=None):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_memory_bytes = max_memory_bytes
+        self.codec = codec if codec is not None else Codec(os.path.join(cache_dir, 'dictionaries'))
+        self._memory = OrderedDict()  # url -> response body bytes
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.json.z')
+
+    def _read_entry(self, url):
+        """(header, response body bytes) from disk, or (None, None) if absent or unreadable"""
+        path = self._path(url)
+        # Fall back to the uncompressed file an older cache would have written
+        for candidate in (path, path[:-len('.z')]):
+            try:
+                with open(candidate, 'rb') as file:
+                    encoded = self.codec.decompress(file.read())
+                header, separator, body = encoded.partition(b'\n')
+                if not separator:
+                    # Older entries are one JSON object with the response under 'data'
+                    entry = fast_json.loads(encoded)
+                    return entry, fast_json.dumps(entry.pop('data'))
+                return fast_json.loads(header), body
+            except FileNotFoundError:
+                continue
+            except (ValueError, OSError, EOFError):
+                return None, None
+        return None, None
+
+    def _remember(self, url, body):
+        """Add a response body to the in-memory LRU; caller holds the lock"""
+        if url in self._memory:
+            self._memory_bytes -= len(self._memory.pop(url))
+        if len(body) > self.max_memory_bytes:
+            return
+        self._memory[url] = body
+        self._memory_bytes += len(body)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def get_body(self, url, allow_stale=False):
+        """Return the cached response body (JSON bytes) for `url`, or MISSING if absent or expired"""
+        with self._lock:
+            if url in self._memory:
+                self._memory.move_to_end(url)
+                return self._memory[url]
+        header, body = self._read_entry(url)
+        if header is None:
+            return MISSING
+        if not allow_stale and time.time() - header['fetched'] > self.ttl:
+            return MISSING
+        with self._lock:
+            self._remember(url, body)
+        return body
+
+    def get(self, url, allow_stale=False):
+        """Return the cached response for `url` parsed, or MISSING if absent or expired"""
+        body = self.get_body(url, allow_stale)
+        return body if body is MISSING else fast_json.loads(body)
+
+    def etag(self, url):
+        """ETag the cached response for `url` was served with, if any"""
+        header, _ = self._read_entry(url)
+        return header.get('etag') if header else None
+
+    def put(self, url, data=None, etag=None, body=None):
+        """Cache a response, given either its parsed `data` or its raw `body` bytes"""
+        if body is None:
+            body = fast_json.dumps(data)
+        header = fast_json.dumps({'url': url, 'fetched': time.time(), 'etag': etag})
+        with self._lock:
+            self._remember(url, body)
+        encoded = header + b'\n' + body
+        self.codec.observe(encoded)
+        path = self._path(url)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(self.codec.compress(encoded))
+        os.replace(tmp_path, path)
+
+
+def configure(**overrides):
+    """Update shared settings; must be called before the client is first used"""
+    unknown = set(overrides) - set(settings)
+    if unknown:
+        raise ValueError(f"Unknown settings: {', '.join(sorted(unknown))}")
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+
+
+def get_client():
+    """Return the process-wide TBA client, creating it on first use"""
+    global _client
+    with _shared_lock:
+        if _client is None:
+            from dotenv import load_dotenv
+            from tba_client import CachedTBA
+            load_dotenv()
+            tba_key = os.getenv("TBAKEY")
+            if not tba_key and not settings['offline']:
+                raise Exception("TBA API key not found in environment variables")
+            if tba_key:
+                tqdm.write(f"Loaded TBA API key: {tba_key[:4]}...")  # Only show first 4 chars for security
+            _client = CachedTBA(
+                tba_key or '',
+                cache=ResponseCache(settings['cache_dir'], settings['cache_ttl']),
+                limiter=AdaptiveLimiter(initial=min(4, settings['workers']), max_limit=settings['workers']),
+                offline=settings['offline'],
+                pool_size=max(25, settings['workers']),
+                max_retries=settings['max_retries'],
+            )
+        return _client
+
+
+def get_executor():
+    """Return the process-wide worker pool for I/O-bound fetches"""
+    global _executor
+    with _shared_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings['workers'])
+        return _executor
+
+
+class _SharedClient:
+    """Stand-in for a TBA client that defers to get_client() on first attribute access"""
+
+    def __getattr__(self, name):
+        return getattr(get_client(), name)
+
+
+# Scripts import this instead of building their own client at import time
+tba = _SharedClient()
+
+
+def fetch_team_page(tba, page, year=None, simple=False, keys=False):
+    """Fetch a single page of teams; the client retries transient failures"""
+    return tba.teams(page=page, year=year, simple=simple, keys=keys)
+
+
+def fetch_event_rankings(tba, event_key):
+    """Fetch one event's ranking rows; None if the event has no rankings.
+
+    Network errors, 429s and 5xx responses are retried by the client.
+    """
+    import tba_structs
+    return tba_structs.event_rankings(tba, event_key)
+
+
+def season_rankings(tba, years, skip=()):
+    """Fetch rankings for every ranked event in `years` on the shared worker pool.
+
+    Returns (ranked, missing). `ranked` is [(event, ranking rows)] sorted by
+    end_date, ready to be applied in order; `missing` is [(event, reason)] for
+    events whose rankings couldn't be fetched or were never posted. Events with
+    keys in `skip` aren't fetched at all.
+    """
+    executor = get_executor()
+    events = [event for season in executor.map(lambda year: tba.events(year, simple=True), sorted(years))
+              for event in season
+              if event['event_type'] not in UNRANKED_EVENT_TYPES and event['key'] not in skip]
+    events.sort(key=lambda event: event['end_date'] or '')
+
+    futures = [executor.submit(fetch_event_rankings, tba, event['key']) for event in events]
+    ranked = []
+    missing = []
+    for event, future in tqdm(zip(events, futures), total=len(events), desc="Fetching rankings"):
+        try:
+            rankings = future.result()
+        except Exception as e:
+            missing.append((event, str(e)))
+            continue
+        if rankings is None:
+            missing.append((event, 'no rankings posted'))
+        else:
+            ranked.append((event, rankings))
+    return ranked, missing
+
+
+def report_missing_rankings(missing):
+    for event, reason in missing:
+        tqdm.write(f"Missing rankings for {event['key']} (event type {event['event_type']}): {reason}")
+    if missing:
+        tqdm.write(f"{len(missing)} events were left out of the ratings")
+
+
+def iter_teams(tba, year=None, simple=False, keys=False, window=4):
+    """Yield teams page by page while later pages are still being fetched.
+
+    At most `window` pages are in flight or buffered at once, so peak memory
+    is bounded by window * TEAMS_PER_PAGE teams regardless of how many exist.
+    Teams are yielded in page order as soon as each page arrives.
+    """
+    executor = ThreadPoolExecutor(max_workers=window)
+    pending = deque()
+    next_page = 0
+    try:
+        while True:
+            while len(pending) < window:
+                pending.append(executor.submit(fetch_team_page, tba, next_page, year, simple, keys))
+                next_page += 1
+
+            teams = pending.popleft().result()
+            if not teams:
+                # Pages are contiguous, so everything after the first empty page is empty too
+                break
+            yield from teams
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def batched(iterable, size):
+    """Group an iterable into lists of at most `size` items"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,134 @@
+import argparse
+import importlib
+import time
+from tqdm import tqdm
+import tba_utils
+from profiling import profiled
+
+# Subcommand name -> (module, description)
+COMMANDS = {
+    'ffbigdata': ('FFBigData', 'Fantasy FIRST team scores (BIG DATA.csv)'),
+    'ffbigdata-shards': ('ffbigdata_shards', 'ffbigdata split into shards run by several worker processes, one per '
+                                             'API key in TBAKEYS'),
+    'elo': ('seedingELO', 'Seeding Elo ratings (updated_elo_ratings.csv)'),
+    'elo-sweep': ('elo_sweep', 'Seeding Elo K, newcomer rating, season regression and rank margin scored by '
+                               'log-loss on each next event (elo_sweep.csv)'),
+    'bonus-rp': ('bonusRpRanking', 'Total and bonus RP Elo ratings'),
+    'event-strength': ('eventStrength', 'Event strength from weighted EPA (Event_Strength.csv, EPA_data.csv)'),
+    'district-points': ('all_lifetime_district_points', 'Lifetime district points (team_rankings.csv)'),
+    'vs-record': ('vs_record', 'Win/loss records with and against other teams'),
+    'youtube': ('youtube', 'Team YouTube channel stats'),
+    'validate': ('simple-data-validation-2024', 'Validate 2024 scouting data against TBA'),
+    'opr': ('opr', 'OPR, DPR and CCWM per team solved from qualification matches ({year}_opr.csv)'),
+    'simulate': ('event_sim', 'Monte Carlo seed and win probabilities for every event (Event_Simulations.csv)'),
+    'team-events': ('team_events_ordered', 'Ordered team event schedules (team_events.csv)'),
+    'breakdowns': ('score_breakdowns', 'Match score breakdowns flattened into per-season tables (score_breakdowns/)'),
+    'pipeline': ('pipeline', 'Refresh every artifact, running independent stages concurrently'),
+    'serve': ('query_service', 'Local HTTP/JSON queries over the computed CSVs, reloaded as they change'),
+    'watch': ('event_tracking', 'Live SLFF, district point and Elo updates from webhooks or polling'),
+}
+
+# Commands whose main() accepts a list of seasons
+YEAR_COMMANDS = {'ffbigdata', 'ffbigdata-shards', 'elo', 'elo-sweep', 'bonus-rp', 'event-strength', 'district-points',
+                 'vs-record', 'team-events', 'breakdowns', 'opr', 'simulate', 'pipeline'}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='tbascripts',
+        description='Run one or more TBA scripts in a single process so they share one client, cache and worker pool.',
+        epilog='Commands: ' + '; '.join(f'{name}: {info[1]}' for name, info in COMMANDS.items()),
+    )
+    parser.add_argument('commands', nargs='+', choices=list(COMMANDS), metavar='command',
+                        help='one or more of: ' + ', '.join(COMMANDS))
+    parser.add_argument('--years', type=int, nargs='+', help='seasons to process (default: each script\'s own)')
+    parser.add_argument('--workers', type=int, help='size of the shared worker pool (default: 10)')
+    parser.add_argument('--offline', action='store_true', default=None,
+                        help='only use responses already in the on-disk cache')
+    parser.add_argument('--cache-dir', help=f'on-disk response cache (default: {tba_utils.DEFAULT_CACHE_DIR})')
+    parser.add_argument('--team', type=int, help='team number for vs-record, or to print one schedule with team-events')
+    parser.add_argument('--event', help='event key for validate')
+    parser.add_argument('--scouting-csv', help='scouting data CSV for validate')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='discard stored Elo state, SLFF event scores, the season index or flattened score '
+                             'breakdowns and recompute everything (elo, bonus-rp, ffbigdata, ffbigdata-shards, '
+                             'team-events, breakdowns)')
+    parser.add_argument('--as-of', help='write Elo ratings as they stood right after this event key (elo, bonus-rp)')
+    parser.add_argument('--ratings', choices=['epa', 'opr', 'elo'],
+                        help='team ratings for event-strength and simulate: Statbotics {year}_insights.csv exports '
+                             '(default), OPR solved from TBA matches, or seeding Elo (simulate only)')
+    parser.add_argument('--runs', type=int, help='simulated runs per event for simulate (default: 2000)')
+    parser.add_argument('--components', nargs='+',
+                        help='score breakdown fields to solve component OPRs for (opr), e.g. autoPoints')
+    parser.add_argument('--events', nargs='+', help='event keys for watch to poll (default: events running today)')
+    parser.add_argument('--port', type=int,
+                        help='listen for TBA webhooks on this port instead of polling (watch), or answer queries on '
+                             'it (serve, default: 8000)')
+    parser.add_argument('--interval', type=int, help='seconds between polls for watch (default: 60)')
+    parser.add_argument('--replay', help='send recorded webhooks from this JSON Lines file to a watcher on --port')
+    parser.add_argument('--record', help='append every webhook the watcher receives to this JSON Lines file')
+    parser.add_argument('--profile', nargs='?', const='sample', choices=['sample', 'cprofile'],
+                        help='profile the run with the sampling profiler (default, writes collapsed stacks for a '
+                             'flame graph) or cProfile (writes .pstats), and print the top functions')
+    parser.add_argument('--trace-malloc', action='store_true',
+                        help='trace allocations with tracemalloc and write allocated bytes per stack')
+    parser.add_argument('--timings', action='store_true', help='print call counts and times of the hot functions')
+    return parser
+
+
+def command_kwargs(command, args):
+    """Translate shared command-line flags into keyword arguments for a command's main()"""
+    kwargs = {}
+    if command in YEAR_COMMANDS and args.years:
+        kwargs['years'] = args.years
+    if command in ('vs-record', 'team-events') and args.team:
+        kwargs['team'] = args.team
+    if command in ('elo', 'bonus-rp', 'ffbigdata', 'ffbigdata-shards', 'team-events', 'breakdowns') and args.rebuild:
+        kwargs['rebuild'] = True
+    if command in ('elo', 'bonus-rp') and args.as_of:
+        kwargs['as_of'] = args.as_of
+    if command in ('event-strength', 'simulate') and args.ratings:
+        kwargs['ratings'] = args.ratings
+    if command == 'simulate' and args.runs:
+        kwargs['runs'] = args.runs
+    if command == 'opr' and args.components:
+        kwargs['components'] = args.components
+    if command == 'validate':
+        if args.event:
+            kwargs['event_key'] = args.event
+        if args.scouting_csv:
+            kwargs['scouting_csv'] = args.scouting_csv
+    if command == 'serve' and args.port:
+        kwargs['port'] = args.port
+    if command == 'watch':
+        for option, name in [('events', 'events'), ('port', 'port'), ('interval', 'interval'),
+                             ('replay', 'replay_path'), ('record', 'record_path')]:
+            if getattr(args, option):
+                kwargs[name] = getattr(args, option)
+    return kwargs
+
+
+def run_commands(commands, args):
+    for command in commands:
+        module = importlib.import_module(COMMANDS[command][0])
+        tqdm.write(f"Running {command}...")
+        start = time.perf_counter()
+        module.main(**command_kwargs(command, args))
+        tqdm.write(f"Finished {command} in {time.perf_counter() - start:.1f}s")
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.ratings == 'elo' and 'event-strength' in args.commands:
+        parser.error('event-strength rates teams by EPA or OPR; --ratings elo only applies to simulate')
+    tba_utils.configure(workers=args.workers, offline=args.offline, cache_dir=args.cache_dir)
+    # Commands run one after another against the same client, so later
+    # commands reuse everything earlier ones already fetched
+    commands = list(dict.fromkeys(args.commands))
+    with profiled('profile-' + '-'.join(commands), args.profile, args.trace_malloc, args.timings):
+        run_commands(commands, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import threading
+from array import array
+
+
+def team_number(team_key):
+    """Team number from a key as an int, or as the suffix string for offseason B/C teams ('frc1678B' -> '1678B')"""
+    suffix = team_key[3:]
+    return int(suffix) if suffix.isdigit() else suffix
+
+
+def team_sort_key(team_key):
+    """Sorts keys by team number, with B/C teams right after their A team"""
+    suffix = team_key[3:]
+    digits = suffix.rstrip('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+    return int(digits) if digits.isdigit() else 0, suffix
+
+
+class TeamRegistry:
+    """Maps TBA team keys ('frc254') to dense integer IDs (0, 1, 2, ...) and back.
+
+    Keys are registered the first time they're seen, so IDs are only meaningful
+    within the process that assigned them. Work shipped to other processes should
+    carry IDs assigned in the parent rather than re-registering keys.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._keys = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, team_key):
+        return team_key in self._ids
+
+    def id(self, team_key):
+        """ID for a team key, registering it if it's new"""
+        team_id = self._ids.get(team_key)
+        if team_id is None:
+            with self._lock:
+                team_id = self._ids.get(team_key)
+                if team_id is None:
+                    team_id = len(self._keys)
+                    self._keys.append(team_key)
+                    self._ids[team_key] = team_id
+        return team_id
+
+    def id_for_number(self, team_number):
+        return self.id(f'frc{int(team_number)}')
+
+    def key(self, team_id):
+        return self._keys[team_id]
+
+    def number(self, team_id):
+        return team_number(self._keys[team_id])
+
+    def sort_key(self, team_id):
+        return team_sort_key(self._keys[team_id])
+
+    def ids(self, team_keys):
+        """IDs for many team keys as a packed int32 array"""
+        return array('i', (self.id(team_key) for team_key in team_keys))
+
+    def ids_for_numbers(self, team_numbers):
+        return array('i', (self.id_for_number(team_number) for team_number in team_numbers))
+
+    def keys(self, team_ids):
+        return [self._keys[team_id] for team_id in team_ids]
+
+    def numbers(self, team_ids):
+        return [team_number(self._keys[team_id]) for team_id in team_ids]
+
+    def as_numpy(self, team_ids):
+        """View packed IDs as a numpy int32 array without copying"""
+        import numpy as np
+        return np.frombuffer(team_ids if isinstance(team_ids, array) else array('i', team_ids), dtype=np.int32)
+
+
+# Shared by every script in the process
+registry = TeamRegistry()
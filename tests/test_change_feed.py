@@ -0,0 +1,62 @@
+import csv
+
+import fast_json
+from change_feed import ChangeFeed, apply_changes, feed_path, row_hash
+
+HEADER = ['Team Number', 'Score']
+
+
+def run(output, rows, partial=False):
+    """Write `rows` to the CSV at `output` as FFBigData does, feeding each one to the change feed"""
+    feed = ChangeFeed(output, HEADER, ['Team Number'])
+    with open(output, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(HEADER)
+        for row in rows:
+            writer.writerow(row)
+            feed.add(row)
+    return feed.close(partial=partial)
+
+
+def csv_digest(output):
+    """The digest ChangeFeed gives an artifact, computed from the CSV on disk"""
+    with open(output, newline='', encoding='utf-8') as file:
+        header, *rows = list(csv.reader(file))
+    return ChangeFeed._digest(header, {row[0]: [row_hash(row)] for row in rows})
+
+
+def run_record(output):
+    with open(feed_path(output), 'rb') as file:
+        return fast_json.loads(file.readline())
+
+
+def test_partial_run_skips_rows_it_could_not_produce(tmp_path):
+    output = str(tmp_path / 'BIG DATA.csv')
+    run(output, [['1', 10], ['2', 20], ['3', 30]])
+    assert run_record(output)['result'] == csv_digest(output)
+    consumer = {}
+    apply_changes(consumer, feed_path(output))
+
+    # Team 2's shard failed: consumers keep their row, but the feed still describes the CSV written
+    counts = run(output, [['1', 11], ['3', 30]], partial=True)
+    assert counts == {'insert': 0, 'update': 1, 'delete': 0}
+    record = apply_changes(consumer, feed_path(output))
+    assert record['skipped'] == ['2']
+    assert record['result'] == csv_digest(output)
+    assert consumer == {'1': {'Team Number': '1', 'Score': '11'}, '2': {'Team Number': '2', 'Score': '20'},
+                        '3': {'Team Number': '3', 'Score': '30'}}
+
+    # The next complete run sends the skipped row again, and the feed chain stays unbroken
+    counts = run(output, [['1', 11], ['2', 20], ['3', 30]])
+    assert counts == {'insert': 1, 'update': 0, 'delete': 0}
+    record = apply_changes(consumer, feed_path(output), base=record['result'])
+    assert 'skipped' not in record
+    assert record['result'] == csv_digest(output)
+    assert consumer['2'] == {'Team Number': '2', 'Score': '20'}
+
+
+def test_complete_run_deletes_missing_rows(tmp_path):
+    output = str(tmp_path / 'BIG DATA.csv')
+    run(output, [['1', 10], ['2', 20]])
+    assert run(output, [['1', 10]])['delete'] == 1
+    assert run_record(output)['result'] == csv_digest(output)
@@ -0,0 +1,47 @@
+import pytest
+from compression import Codec
+from tba_utils import MISSING, ResponseCache
+
+
+def gzip_codec():
+    codec = Codec()
+    # As on a machine without the zstandard package
+    codec.zstandard = None
+    return codec
+
+
+def damaged_copies(blob):
+    return blob[:len(blob) // 2], blob[:6], blob[:4] + b'\xff' * 20
+
+
+def test_corrupt_zstd_frame_raises_value_error():
+    pytest.importorskip('zstandard')
+    blob = Codec().compress(b'{"key": "2024test"}' * 100)
+    for damaged in damaged_copies(blob):
+        with pytest.raises(ValueError):
+            Codec().decompress(damaged)
+
+
+def test_corrupt_gzip_entry_raises_value_error():
+    blob = gzip_codec().compress(b'{"key": "2024test", "name": "Test Event"}' * 100)
+    middle = len(blob) // 2
+    # gzip checks a CRC, so flipped bytes are caught as well as truncation
+    flipped = blob[:middle] + bytes(byte ^ 0xff for byte in blob[middle:middle + 8]) + blob[middle + 8:]
+    for damaged in damaged_copies(blob) + (flipped,):
+        with pytest.raises(ValueError):
+            gzip_codec().decompress(damaged)
+
+
+@pytest.mark.parametrize('codec', ['zstd', 'gzip'])
+def test_truncated_cache_entry_reads_as_missing(tmp_path, codec):
+    if codec == 'zstd':
+        pytest.importorskip('zstandard')
+    make_codec = Codec if codec == 'zstd' else gzip_codec
+    cache = ResponseCache(str(tmp_path), codec=make_codec())
+    cache.put('event/2024test', {'key': '2024test', 'name': 'Test Event' * 50})
+    path = cache._path('event/2024test')
+    with open(path, 'rb') as file:
+        blob = file.read()
+    with open(path, 'wb') as file:
+        file.write(blob[:len(blob) // 2])
+    assert ResponseCache(str(tmp_path), codec=make_codec()).get('event/2024test') is MISSING
@@ -0,0 +1,70 @@
+import glob
+import json
+import os
+import pytest
+import tba_structs
+from district_points import DistrictPoints, published_and_local
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+RECORD_COMMAND = ('python district_points.py --record tests/fixtures/district_points 2022miket 2024mibb 2023micmp '
+                  '(needs TBAKEY)')
+
+
+def load_fixture(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+# Responses recorded from TBA by district_points.record_fixture(): the published points are TBA's own
+RECORDED = sorted(path for path in glob.glob(os.path.join(FIXTURE_DIR, 'district_points', '*.json'))
+                  if load_fixture(path)['source'] == 'recorded from the TBA API')
+# Small events worked through by hand from the Game Manual's rules; they check the rules, not TBA
+RULES_EXAMPLES = sorted(glob.glob(os.path.join(FIXTURE_DIR, 'district_points_rules', '*.json')))
+
+
+class FixtureTBA:
+    """Answers the requests district_points makes from responses saved by district_points.record_fixture()"""
+
+    def __init__(self, path):
+        self.responses = load_fixture(path)['responses']
+
+    def _get(self, url):
+        # A fresh copy each time, as CachedTBA parses one from the cached bytes
+        return json.loads(json.dumps(self.responses[url]))
+
+    def get_typed(self, url, type):
+        return tba_structs.decode(json.dumps(self.responses[url]).encode('utf-8'), type)
+
+    def event(self, event_key, simple=False):
+        return self._get(f'event/{event_key}/simple')
+
+
+def fixture_id(path):
+    return os.path.basename(path)[:-len('.json')]
+
+
+def assert_points_match(path):
+    published, local = published_and_local(FixtureTBA(path), fixture_id(path))
+    assert published
+    for team_key in sorted(set(published) | set(local)):
+        assert local.get(team_key, DistrictPoints()) == published.get(team_key, DistrictPoints()), team_key
+
+
+NOT_RECORDED = pytest.mark.skip(reason=f"no recorded TBA fixtures; record them with {RECORD_COMMAND}")
+
+
+@pytest.mark.parametrize('path', [pytest.param(path, id=fixture_id(path)) for path in RECORDED]
+                         or [pytest.param(None, id='none-recorded', marks=NOT_RECORDED)])
+def test_local_points_match_published(path):
+    assert_points_match(path)
+
+
+@pytest.mark.skipif(not RECORDED, reason=NOT_RECORDED.kwargs['reason'])
+def test_recorded_fixtures_cover_both_playoff_formats():
+    years = {fixture_id(path)[:4] for path in RECORDED}
+    assert '2022' in years and any(year >= '2023' for year in years)
+
+
+@pytest.mark.parametrize('path', RULES_EXAMPLES, ids=fixture_id)
+def test_local_points_match_rules_examples(path):
+    assert_points_match(path)
@@ -0,0 +1,91 @@
+import seedingELO
+from elo_store import EloStore
+from team_registry import registry
+
+EVENTS = [
+    ('2023mike', '2023-03-05', ['frc1', 'frc2', 'frc3']),
+    ('2023mitry', '2023-03-12', ['frc3', 'frc4', 'frc1']),
+    ('2023micmp', '2023-04-08', ['frc2', 'frc4', 'frc5', 'frc3']),
+]
+
+
+def open_store(tmp_path, name='store'):
+    return EloStore('seeding:test', seedingELO.apply_event, str(tmp_path / f'{name}.sqlite3'))
+
+
+def in_order(tmp_path, events, name='reference'):
+    """Ratings from applying `events` one by one to a fresh store"""
+    store = open_store(tmp_path, name)
+    for event in events:
+        store.apply(*event)
+    ratings = store.current('elo')
+    store.close()
+    return ratings
+
+
+def test_only_changed_values_are_recorded(tmp_path):
+    store = open_store(tmp_path)
+    store.apply(*EVENTS[0])
+    # frc5 wasn't at the event, so an event it missed leaves no snapshot for it
+    store.apply('2023miwmi', '2023-03-06', ['frc5', 'frc6'])
+    keys = {team_key for (team_key,) in store.connection.execute(
+        'SELECT team_key FROM snapshots WHERE seq = 1')}
+    assert keys == {'frc5', 'frc6'}
+    assert store.current('elo') == in_order(tmp_path, [EVENTS[0], ('2023miwmi', '2023-03-06', ['frc5', 'frc6'])])
+
+
+def test_out_of_order_event_replays_later_events(tmp_path):
+    store = open_store(tmp_path)
+    store.apply(*EVENTS[0])
+    store.apply(*EVENTS[2])
+    assert store.apply(*EVENTS[1])
+    assert not store.apply(*EVENTS[1])
+    assert store.current('elo') == in_order(tmp_path, EVENTS)
+    assert [key for (key,) in store.connection.execute('SELECT event_key FROM events ORDER BY seq')] == \
+        [key for key, _, _ in EVENTS]
+
+    # A reopened store reloads the replayed state
+    store.close()
+    assert open_store(tmp_path).current('elo') == in_order(tmp_path, EVENTS)
+
+
+def test_rollback(tmp_path):
+    store = open_store(tmp_path)
+    for event in EVENTS:
+        store.apply(*event)
+    store.rollback('2023mitry')
+    assert store.processed_events() == {'2023mike', '2023mitry'}
+    assert store.current('elo') == in_order(tmp_path, EVENTS[:2])
+
+    store.rollback(before_date='2023-03-10')
+    assert store.current('elo') == in_order(tmp_path, EVENTS[:1], 'first')
+    store.rollback(before_date='2023-01-01')
+    assert store.processed_events() == set()
+    assert store.current('elo') == {}
+
+    # Rolled-back events can be applied again
+    assert store.apply(*EVENTS[0])
+
+
+def test_values_as_of(tmp_path):
+    store = open_store(tmp_path)
+    for event in EVENTS:
+        store.apply(*event)
+    after_first = in_order(tmp_path, EVENTS[:1], 'first')
+    after_second = in_order(tmp_path, EVENTS[:2], 'second')
+    assert store.values_as_of('2023mike', 'elo') == after_first
+    assert store.values_as_of('2023mitry', 'elo') == after_second
+    assert store.value_as_of('frc4', '2023mike', 'elo') is None
+    assert store.value_as_of('frc4', '2023mitry', 'elo') == after_second[registry.id('frc4')]
+    # frc1 missed the last event, so its value as of then is the one it had before
+    assert store.value_as_of('frc1', '2023micmp', 'elo') == after_second[registry.id('frc1')]
+
+
+def test_undated_event(tmp_path):
+    store = open_store(tmp_path)
+    store.apply(*EVENTS[0])
+    # Undated events sort before every dated one, so this one replays the first
+    assert store.apply('2023mixyz', None, ['frc2', 'frc1'])
+    assert store.apply('2023miabc', None, ['frc1', 'frc2'])
+    assert store.current('elo') == in_order(
+        tmp_path, [('2023mixyz', '', ['frc2', 'frc1']), ('2023miabc', '', ['frc1', 'frc2']), EVENTS[0]])
@@ -0,0 +1,113 @@
+import json
+import threading
+
+import pytest
+import requests
+import event_tracking
+from tba_client import CachedTBA
+from tba_utils import AdaptiveLimiter, ResponseCache
+from team_registry import registry
+
+EVENT_KEY = '2024test'
+
+
+def match(number, red, blue, winner, comp_level='qm', set_number=1):
+    return {'key': f'{EVENT_KEY}_{comp_level}{number}', 'comp_level': comp_level, 'set_number': set_number,
+            'match_number': number, 'winning_alliance': winner,
+            'alliances': {'red': {'team_keys': [f'frc{team}' for team in red]},
+                          'blue': {'team_keys': [f'frc{team}' for team in blue]}}}
+
+
+# What TBA serves for the event, as recorded while it ran
+RESPONSES = {
+    f'event/{EVENT_KEY}/simple': {'key': EVENT_KEY, 'year': 2024, 'event_type': 1},
+    f'event/{EVENT_KEY}/matches': [match(1, [1, 2, 3], [4, 5, 6], 'red'),
+                                   match(1, [1, 2, 3], [4, 5, 6], 'blue', comp_level='f')],
+    f'event/{EVENT_KEY}/alliances': [{'picks': ['frc1', 'frc2', 'frc3']}, {'picks': ['frc4', 'frc5', 'frc6']}],
+    f'event/{EVENT_KEY}/awards': [{'award_type': 1, 'recipient_list': [{'team_key': 'frc4', 'awardee': None}]}],
+    f'event/{EVENT_KEY}/rankings': {'rankings': [{'team_key': f'frc{team}'} for team in (4, 1, 5, 2, 6, 3)]},
+}
+
+
+class ReplaySession(requests.Session):
+    """Serves RESPONSES with an ETag each, answering 304 when the request's If-None-Match matches"""
+
+    def __init__(self):
+        super().__init__()
+        self.statuses = []
+        self.paths = []
+
+    def get(self, url, headers=None, timeout=None):
+        path = url.split('/api/v3/', 1)[1]
+        self.paths.append(path)
+        etag = f'"{len(path)}"'
+        if (headers or {}).get('If-None-Match') == etag:
+            self.statuses.append(304)
+            return Response(304, b'', {})
+        self.statuses.append(200)
+        return Response(200, json.dumps(RESPONSES[path]).encode('utf-8'), {'ETag': etag})
+
+
+class Response:
+    def __init__(self, status_code, content, headers):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def start_process(tmp_path, monkeypatch):
+    """A fresh client and watcher over the same on-disk response cache, as after a restart"""
+    def start():
+        client = CachedTBA('key', cache=ResponseCache(str(tmp_path / 'cache')),
+                           limiter=AdaptiveLimiter(initial=1, max_limit=1), backoff_factor=0)
+        client.session = ReplaySession()
+        monkeypatch.setattr(event_tracking, 'tba', client)
+        monkeypatch.setattr(event_tracking, 'get_client', lambda: client)
+        return client, event_tracking.EventWatcher(output=str(tmp_path / 'live.csv'))
+    return start
+
+
+def test_restart_applies_cached_data_the_server_reports_unchanged(start_process, tmp_path):
+    client, watcher = start_process()
+    event_tracking.poll_event(watcher, EVENT_KEY)
+    before = watcher.events[EVENT_KEY]
+    written = (tmp_path / 'live.csv').read_text()
+    assert before['slff'] and before['awards'] and before['alliances']
+    # District points come from the rankings and alliances already held, not another request
+    assert not any(path.endswith('/district_points') for path in client.session.paths)
+    assert before['district_points'][registry.id('frc4')] == 22 + 15
+
+    client, watcher = start_process()
+    event_tracking.poll_event(watcher, EVENT_KEY)
+    assert 200 not in client.session.statuses
+    after = watcher.events[EVENT_KEY]
+    for field in ('matches', 'alliances', 'awards', 'district_points', 'slff', 'elo_baseline'):
+        assert after[field] == before[field]
+    assert (tmp_path / 'live.csv').read_text() == written
+
+    # Later polls that come back unchanged apply nothing
+    watcher.apply = lambda message_type, data: pytest.fail(f"applied an unchanged {message_type}")
+    event_tracking.poll_event(watcher, EVENT_KEY)
+
+
+def test_webhook_watcher_updates_elo_after_qualification_matches(start_process, tmp_path):
+    client, watcher = start_process()
+    handler = type('BoundWebhookHandler', (event_tracking.WebhookHandler,), {'watcher': watcher})
+    server = event_tracking.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    recorded = tmp_path / 'webhooks.jsonl'
+    recorded.write_text(''.join(
+        json.dumps({'message_type': 'match_score', 'message_data': {'event_key': EVENT_KEY, 'match': match}}) + '\n'
+        for match in RESPONSES[f'event/{EVENT_KEY}/matches'][:1]))
+    try:
+        event_tracking.replay(str(recorded), f'http://127.0.0.1:{server.server_address[1]}/')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert watcher.events[EVENT_KEY]['rankings']
+    assert watcher.elo_ratings[registry.id('frc4')] > 1500 > watcher.elo_ratings[registry.id('frc3')]
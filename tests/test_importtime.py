@@ -0,0 +1,23 @@
+import os
+
+import pytest
+import bench_importtime
+
+# Import times depend on the machine and its load, so the budget is only checked on request
+# (bench_importtime.py always checks it)
+check_budget = pytest.mark.skipif(not os.environ.get('IMPORT_BUDGET'),
+                                  reason='set IMPORT_BUDGET=1 to check the import time budget')
+
+
+@pytest.mark.parametrize('module', bench_importtime.MODULES)
+def test_module_imports_no_heavy_libraries(module):
+    _, heavy = bench_importtime.measure(module)
+    assert heavy == [], f"{module} imports {', '.join(heavy)} eagerly"
+
+
+@check_budget
+@pytest.mark.parametrize('module', bench_importtime.MODULES)
+def test_module_is_cheap_to_import(module):
+    best_ms = min(bench_importtime.measure(module)[0] for _ in range(3))
+    assert best_ms <= bench_importtime.DEFAULT_BUDGET_MS, \
+        f"{module} takes {best_ms:.1f} ms to import, over the {bench_importtime.DEFAULT_BUDGET_MS} ms budget"
@@ -0,0 +1,88 @@
+import random
+
+import numpy as np
+from opr import OprEngine
+
+
+def match(key, red_score, blue_score, comp_level='qm', red=('frc1', 'frc2', 'frc3'), blue=('frc4', 'frc5', 'frc6'),
+          score_breakdown=None):
+    return {'key': key, 'event_key': '2024test', 'comp_level': comp_level, 'score_breakdown': score_breakdown,
+            'alliances': {'red': {'team_keys': list(red), 'score': red_score},
+                          'blue': {'team_keys': list(blue), 'score': blue_score}}}
+
+
+def synthetic_schedule(teams=10, matches=24, seed=0):
+    """Qualification matches with random alliances, scores and autoPoints breakdowns"""
+    rng = random.Random(seed)
+    team_keys = [f'frc{number}' for number in range(1, teams + 1)]
+    schedule = []
+    for number in range(1, matches + 1):
+        lineup = rng.sample(team_keys, 6)
+        auto = {'red': {'autoPoints': rng.randint(0, 30)}, 'blue': {'autoPoints': rng.randint(0, 30)}}
+        schedule.append(match(f'2024test_qm{number}', rng.randint(20, 120), rng.randint(20, 120),
+                              red=lineup[:3], blue=lineup[3:], score_breakdown=auto))
+    return schedule
+
+
+def lstsq_reference(schedule):
+    """{team key: {'opr', 'dpr', 'autoPoints'}} from numpy.linalg.lstsq over every alliance row"""
+    team_keys = sorted({key for m in schedule for color in ('red', 'blue')
+                        for key in m['alliances'][color]['team_keys']})
+    design, values = [], []
+    for m in schedule:
+        for own, opponent in [('red', 'blue'), ('blue', 'red')]:
+            design.append([key in m['alliances'][own]['team_keys'] for key in team_keys])
+            values.append([m['alliances'][own]['score'], m['alliances'][opponent]['score'],
+                           m['score_breakdown'][own]['autoPoints']])
+    solution = np.linalg.lstsq(np.array(design, dtype=float), np.array(values, dtype=float), rcond=None)[0]
+    return {key: dict(zip(['opr', 'dpr', 'autoPoints'], solution[column])) for column, key in enumerate(team_keys)}
+
+
+def assert_matches_reference(ratings, reference):
+    assert ratings.keys() == reference.keys()
+    for team_key, expected in reference.items():
+        for column, value in expected.items():
+            assert np.isclose(ratings[team_key][column], value, atol=1e-4), (team_key, column)
+        assert np.isclose(ratings[team_key]['ccwm'], expected['opr'] - expected['dpr'], atol=1e-4)
+
+
+def test_ratings_match_lstsq():
+    schedule = synthetic_schedule()
+    engine = OprEngine(['autoPoints'])
+    # Playoff matches aren't rated
+    playoff = match('2024test_sf1m1', 500, 0, 'sf', score_breakdown=schedule[0]['score_breakdown'])
+    engine.add_matches(schedule + [playoff])
+    assert_matches_reference(engine.event_ratings('2024test'), lstsq_reference(schedule))
+
+
+def test_ratings_match_lstsq_as_matches_arrive_and_are_corrected():
+    schedule = synthetic_schedule(seed=1)
+    engine = OprEngine(['autoPoints'])
+    engine.add_matches(schedule[:16])
+    assert_matches_reference(engine.event_ratings('2024test'), lstsq_reference(schedule[:16]))
+    engine.add_matches(schedule[16:])
+    # A corrected score replaces the one first posted
+    corrected = dict(schedule[3], alliances={'red': dict(schedule[3]['alliances']['red'], score=5),
+                                             'blue': schedule[3]['alliances']['blue']})
+    engine.add_matches([corrected])
+    schedule[3] = corrected
+    assert_matches_reference(engine.event_ratings('2024test'), lstsq_reference(schedule))
+
+
+def test_match_that_comes_back_unplayed_is_taken_out():
+    engine = OprEngine()
+    engine.add_matches([match('2024test_qm1', 50, 40), match('2024test_qm2', 30, 60)])
+    only_second = OprEngine()
+    only_second.add_matches([match('2024test_qm2', 30, 60)])
+
+    # A score TBA posted by mistake is reset to -1
+    engine.add_matches([match('2024test_qm1', -1, -1)])
+    system, expected = engine.events['2024test'], only_second.events['2024test']
+    assert system.matches == 1
+    assert np.allclose(system.normal, expected.normal)
+    assert np.allclose(system.rhs, expected.rhs)
+    assert engine.event_ratings('2024test') == only_second.event_ratings('2024test')
+
+    engine.add_matches([match('2024test_qm2', None, None)])
+    assert engine.events['2024test'].matches == 0
+    assert not engine.events['2024test'].rhs.any()
@@ -0,0 +1,35 @@
+import pipeline
+import bonusRpRanking
+import seedingELO
+
+
+class EventsTBA:
+    """Lists one ranked event and one offseason event per season, recording the seasons asked for"""
+
+    def __init__(self):
+        self.years = []
+
+    def events(self, year, simple=False):
+        self.years.append(year)
+        return [{'key': f'{year}test', 'event_type': 0, 'end_date': f'{year}-03-01'},
+                {'key': f'{year}off', 'event_type': 99, 'end_date': f'{year}-10-01'}]
+
+
+def test_rating_stages_depend_on_rankings_of_their_own_seasons(monkeypatch):
+    tba = EventsTBA()
+    monkeypatch.setattr(pipeline, 'tba', tba)
+    monkeypatch.setattr(pipeline, 'fetch_event_rankings', lambda client, key: [{'team_key': 'frc1', 'event': key}])
+    stages = {stage.name: stage for stage in pipeline.build_stages([2024, 2023, 2022])}
+
+    for stage_name, rankings, years in [('elo', 'elo_rankings', seedingELO.DEFAULT_YEARS),
+                                        ('bonus_rp', 'bonus_rp_rankings', bonusRpRanking.DEFAULT_YEARS)]:
+        assert stages[stage_name].inputs == [rankings]
+        # The events stage's seasons are reused; the rest are listed by the fetch stage itself
+        tba.years.clear()
+        events = {2022: tba.events(2022), 2023: tba.events(2023)}
+        tba.years.clear()
+        fetched = stages[rankings].func(events)
+        assert sorted(fetched) == sorted(f'{year}test' for year in years)
+        assert sorted(tba.years) == sorted(year for year in years if year not in events)
+
+    assert stages['ffbigdata'].inputs.count('rankings') == 1
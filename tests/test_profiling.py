@@ -0,0 +1,29 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import FFBigData
+import profiling
+from team_registry import registry
+from compact_records import compact_awards
+
+
+def test_worker_timings_reach_the_parent_report(capsys):
+    event = {'key': '2024test', 'year': 2024, 'event_type': 1, 'end_date': '2024-03-03'}
+    event_data = FFBigData.compact_event_data({
+        'district_points': {registry.id('frc1'): 30, registry.id('frc2'): 12},
+        'awards': compact_awards([{'award_type': 9, 'recipient_list': [{'team_key': 'frc1', 'awardee': None}]}]),
+    })
+    profiling.take_timings()
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        scores, timings = pool.submit(FFBigData.score_event_shard, [(event, event_data)]).result()
+        # The worker's counts were reset, so its next shard only reports its own calls
+        _, second = pool.submit(FFBigData.score_event_shard, [(event, event_data)]).result()
+    assert scores[0][1][registry.id('frc1')].district_points == 30
+    assert timings['FFBigData.score_events'][0] == 1
+    assert timings['FFBigData.event_components'][0] == 2
+    assert second['FFBigData.score_events'][0] == 1
+    assert 'FFBigData.score_events' not in profiling.take_timings()
+
+    profiling.add_timings(timings)
+    profiling.timing_report()
+    assert profiling.TIMINGS['FFBigData.event_components'].calls == 2
+    assert 'FFBigData.score_events' in capsys.readouterr().out
@@ -0,0 +1,66 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+from query_service import Artifact, QueryHandler, QueryStore
+
+CSV = '''Team Number,Nickname,Score,Notes
+1,One,10,
+2,Two,20.5,
+3,Three,30,n/a
+4,Four,DQ,
+'''
+
+
+@pytest.fixture
+def store(tmp_path):
+    (tmp_path / 'scores.csv').write_text(CSV, encoding='utf-8')
+    return QueryStore({'scores': Artifact('scores.csv', 'Team Number', 'team')}, str(tmp_path))
+
+
+@pytest.fixture
+def get(store):
+    handler = type('BoundQueryHandler', (QueryHandler,), {'store': store})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def get(path):
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{server.server_port}{path}') as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    yield get
+    server.shutdown()
+    server.server_close()
+
+
+def test_percentile(store):
+    table = store.tables['scores']
+    assert table.numeric == ['Score']
+    assert table.percentile('Score', 20.5) == 100.0 / 3
+    assert table.percentile('Score', 31) == 100.0
+
+
+def test_percentile_rejects_text(store):
+    table = store.tables['scores']
+    with pytest.raises(ValueError):
+        table.percentile('Nickname', 10)
+    with pytest.raises(ValueError):
+        table.percentile('Score', 'n/a')
+    with pytest.raises(KeyError):
+        table.percentile('Missing', 10)
+
+
+def test_text_queries_are_bad_requests(get):
+    assert get('/percentile?table=scores&metric=Score&team=2') == \
+        (200, {'metric': 'Score', 'value': 20.5, 'percentile': 100.0 / 3})
+    assert get('/percentile?table=scores&metric=Nickname&team=2')[0] == 400
+    assert get('/top?table=scores&metric=Nickname')[0] == 400
+    # Team 4's Score is text in an otherwise numeric column
+    assert get('/percentile?table=scores&metric=Score&team=4')[0] == 400
+    assert get('/percentile?table=scores&metric=Missing&value=1')[0] == 404
@@ -0,0 +1,21 @@
+import datetime
+
+from slff_score_cache import EventScore, EventScoreCache, is_final
+
+TODAY = datetime.date(2024, 4, 1)
+
+
+def test_undated_events_are_not_final():
+    assert is_final({'end_date': '2024-03-01'}, TODAY)
+    assert not is_final({'end_date': '2024-03-30'}, TODAY)
+    assert not is_final({'end_date': None}, TODAY)
+    assert not is_final({'end_date': ''}, TODAY)
+
+
+def test_undated_event_scores_are_kept_for_this_run_only(tmp_path):
+    path = str(tmp_path / 'scores.sqlite3')
+    cache = EventScoreCache(path)
+    cache.put({'key': '2024tbd', 'year': 2024, 'end_date': None}, {'frc1': EventScore(district_points=12)})
+    assert cache.get_many(['2024tbd']) == {'2024tbd': {'frc1': EventScore(district_points=12)}}
+    cache.close()
+    assert EventScoreCache(path).get_many(['2024tbd']) == {}
@@ -0,0 +1,102 @@
+import random
+
+import pytest
+from strength_index import Change, FenwickCounts, StrengthIndex
+
+KS = (1, 2, 3, 4, 8)
+
+
+def reference_top_k(ratings, roster, ks=KS):
+    """Top-k ratings of a roster by sorting it"""
+    ordered = sorted((ratings[team_id] for team_id in roster if team_id in ratings), reverse=True)
+    return [ordered[k - 1] if k <= len(ordered) else None for k in ks]
+
+
+def small_league(seed):
+    rng = random.Random(seed)
+    # Ties, and a team (99) without a rating
+    ratings = {team_id: rng.choice([1400, 1450, 1500, 1550, 1600, rng.uniform(1300, 1700)])
+               for team_id in range(1, 13)}
+    rosters = {'a': set(rng.sample(range(1, 13), 5)), 'b': set(rng.sample(range(1, 13), 3)), 'c': set()}
+    return rng, ratings, rosters
+
+
+@pytest.mark.parametrize('size', range(1, 18))
+def test_fenwick_kth(size):
+    rng = random.Random(size)
+    counts = FenwickCounts(size)
+    counted = set()
+    for _ in range(40):
+        position = rng.randint(1, size)
+        if position in counted:
+            counted.discard(position)
+            counts.add(position, -1)
+        else:
+            counted.add(position)
+            counts.add(position, 1)
+        ordered = sorted(counted)
+        for k in range(0, size + 2):
+            assert counts.kth(k) == (ordered[k - 1] if 1 <= k <= len(ordered) else None)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_top_k_matches_sorted_after_adds_removes_and_moves(seed):
+    rng, ratings, rosters = small_league(seed)
+    index = StrengthIndex(ratings, rosters)
+    rosters = {key: {team_id for team_id in roster if team_id in ratings} for key, roster in rosters.items()}
+    for _ in range(60):
+        team_id = rng.choice(list(ratings) + [99])
+        event_key, to_event = rng.sample(sorted(rosters), 2)
+        action = rng.choice(['add', 'remove', 'move'])
+        if action == 'add':
+            assert index.add(event_key, team_id) == (team_id in ratings and team_id not in rosters[event_key])
+            if team_id in ratings:
+                rosters[event_key].add(team_id)
+        elif action == 'remove':
+            assert index.remove(event_key, team_id) == (team_id in rosters[event_key])
+            rosters[event_key].discard(team_id)
+        else:
+            # Moves are what-if changes; apply one without undoing it
+            _, touched = index._apply(Change('move', team_id, event_key, to_event))
+            assert touched == [event_key, to_event]
+            rosters[event_key].discard(team_id)
+            if team_id in ratings:
+                rosters[to_event].add(team_id)
+        for key, roster in rosters.items():
+            assert index.rosters[key] == roster
+            assert index.strength(key, KS) == reference_top_k(ratings, roster)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_what_if_matches_sorted_and_undoes(seed):
+    rng, ratings, rosters = small_league(seed)
+    index = StrengthIndex(ratings, rosters)
+    original = {key: set(roster) for key, roster in index.rosters.items()}
+    for _ in range(20):
+        changes = []
+        expected = {key: set(roster) for key, roster in original.items()}
+        for _ in range(rng.randint(1, 4)):
+            team_id = rng.choice(list(ratings) + [99])
+            event_key, to_event = rng.sample(sorted(rosters), 2)
+            action = rng.choice(['add', 'remove', 'move'])
+            changes.append(Change(action, team_id, event_key, to_event if action == 'move' else None))
+            if action != 'add':
+                expected[event_key].discard(team_id)
+            if action != 'remove' and team_id in ratings:
+                expected[event_key if action == 'add' else to_event].add(team_id)
+
+        result = index.what_if(changes, KS)
+        for key, (before, after) in result.items():
+            assert before == reference_top_k(ratings, original[key])
+            assert after == reference_top_k(ratings, expected[key])
+        # Undone: the rosters and every event's order statistics are as they were
+        assert index.rosters == original
+        for key, roster in original.items():
+            assert index.strength(key, KS) == reference_top_k(ratings, roster)
+
+
+def test_what_if_rejects_unknown_events():
+    index = StrengthIndex({1: 1500, 2: 1600}, {'a': [1]})
+    with pytest.raises(KeyError):
+        index.what_if([Change('move', 1, 'a', 'zzz')])
+    assert index.rosters == {'a': {1}}
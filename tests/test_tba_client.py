@@ -0,0 +1,118 @@
+import pytest
+import requests
+from tba_client import CachedTBA
+from tba_utils import MISSING, AdaptiveLimiter, ResponseCache
+
+
+class StubResponse:
+    def __init__(self, status_code=200, content=b'{}', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error", response=self)
+
+
+class StubSession:
+    """Plays back responses (or raises exceptions) in order, recording each request"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append((url, headers))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def client(tmp_path):
+    def make(*outcomes, max_retries=2):
+        tba = CachedTBA('key', cache=ResponseCache(str(tmp_path)), limiter=AdaptiveLimiter(initial=1, max_limit=1),
+                        max_retries=max_retries, backoff_factor=0)
+        tba.session = StubSession(*outcomes)
+        return tba
+    return make
+
+
+def test_retries_server_errors_then_returns(client):
+    tba = client(StubResponse(503), StubResponse(500), StubResponse(200, b'[1]'))
+    assert tba._request('events/2024').status_code == 200
+    assert len(tba.session.requests) == 3
+    assert tba.limiter.in_flight == 0
+
+
+def test_raises_once_retries_are_used_up(client):
+    tba = client(requests.ConnectionError(), requests.Timeout(), StubResponse(502))
+    with pytest.raises(requests.HTTPError):
+        tba._request('events/2024')
+    assert len(tba.session.requests) == 3
+    assert tba.limiter.in_flight == 0
+
+
+def test_connection_error_on_last_attempt_propagates(client):
+    tba = client(requests.ConnectionError(), requests.ConnectionError(), max_retries=1)
+    with pytest.raises(requests.ConnectionError):
+        tba._request('events/2024')
+    assert tba.limiter.in_flight == 0
+
+
+@pytest.mark.parametrize('error', [requests.exceptions.ChunkedEncodingError(),
+                                   requests.exceptions.ContentDecodingError(),
+                                   requests.exceptions.InvalidURL()])
+def test_other_errors_give_their_slot_back(client, error):
+    tba = client(error, StubResponse(200, b'[]'))
+    with pytest.raises(type(error)):
+        tba._request('events/2024')
+    assert tba.limiter.in_flight == 0
+    # With a limit of one, a leaked slot would block this request forever
+    assert tba._request('events/2024').status_code == 200
+
+
+def test_client_errors_are_not_retried(client):
+    tba = client(StubResponse(404, b'{"Error": "not found"}'))
+    assert tba._request('event/nope').status_code == 404
+    assert len(tba.session.requests) == 1
+
+
+def test_throttling_halves_the_limit_and_honors_retry_after(client):
+    tba = client(StubResponse(429, headers={'Retry-After': '0'}), StubResponse(200))
+    tba.limiter.limit = 8.0
+    tba.limiter.max_limit = 8
+    assert tba._request('events/2024').status_code == 200
+    assert tba.limiter.limit < 8
+    assert tba.limiter.in_flight == 0
+
+
+def test_limiter_blocks_at_the_limit_until_a_release():
+    import threading
+
+    limiter = AdaptiveLimiter(initial=1, max_limit=1)
+    limiter.acquire()
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()), daemon=True)
+    thread.start()
+    assert not acquired.wait(0.1)
+    limiter.release(0.01)
+    assert acquired.wait(1)
+    limiter.release(0.01)
+    assert limiter.in_flight == 0
+
+
+def test_error_responses_are_not_cached(client):
+    tba = client(StubResponse(404, b'{"Error": "event/2099xx does not exist"}'), StubResponse(200, b'{"key": 1}'))
+    assert tba._get('event/2099xx') == {'Error': 'event/2099xx does not exist'}
+    assert tba.response_cache.get('event/2099xx') is MISSING
+    assert tba._get('event/2099xx') == {'key': 1}
+
+
+def test_poll_keeps_cached_data_on_error_responses(client):
+    tba = client(StubResponse(200, b'[1]', headers={'ETag': 'W/"a"'}), StubResponse(401, b'{"Error": "bad key"}'))
+    assert tba.poll('event/2024mil/matches') == (True, [1])
+    assert tba.poll('event/2024mil/matches') == (False, [1])
+    assert tba.response_cache.etag('event/2024mil/matches') == 'W/"a"'
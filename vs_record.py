@@ -1,17 +1,12 @@
 import os
-import requests
-import tbapy
-import pandas as pd
-import matplotlib.pyplot as plt
-from PIL import Image, ImageDraw, ImageFont
-from dotenv import load_dotenv
 from tqdm import tqdm
 from shutil import rmtree
-import PIL
+import tba_structs
+from tba_utils import tba
+from team_registry import registry
+from profiling import timed
 
 TEAM = 7902
-load_dotenv()
-tba = tbapy.TBA(os.getenv("TBAKEY"))
 
 def ensure_folder_exists(folder):
     if os.path.exists(folder):
@@ -25,6 +20,7 @@ def fetch_team_data(team_key):
     return team_name, team_colors
 
 def get_team_colors(team_number):
+    import requests
     try:
         response = requests.get(f"https://api.frc-colors.com/v1/team/{team_number}")
         if response.ok:
@@ -39,7 +35,7 @@ def get_team_colors(team_number):
 def process_matches(years):
     all_time_records = {}
     for year in years:
-        matches = tba.team_matches(TEAM, year=year)
+        matches = tba_structs.team_matches(tba, TEAM, year)
         team_records = {}
         for match in tqdm(matches, desc=f"Processing year {year}"):
             process_match(match, team_records, all_time_records)
@@ -69,9 +65,11 @@ def determine_result_and_alliances(match, team_key):
         result = 'tie'
     return result, alliance, opponents
 
+@timed
 def update_records(records, match, result, side, relation):
-    team_key = f'frc{TEAM}'
-    teams = [key[3:] for key in match['alliances'][side]['team_keys'] if key != team_key]
+    # Records are keyed by team registry ID and converted to team numbers by records_frame()
+    own_id = registry.id(f'frc{TEAM}')
+    teams = [team_id for team_id in registry.ids(match['alliances'][side]['team_keys']) if team_id != own_id]
     for team in teams:
         if team not in records:
             records[team] = {'Total Matches With': 0, 'Wins With': 0, 'Losses With': 0,
@@ -81,9 +79,17 @@ def update_records(records, match, result, side, relation):
         postfix = 'With' if relation == 'partner' else 'Against'
         records[team][f'{key_suffix} {postfix}'] += 1
 
+def records_frame(records):
+    """DataFrame of records indexed by team number"""
+    import pandas as pd
+    df = pd.DataFrame.from_dict(records, orient='index')
+    # Suffixes rather than numbers, so offseason B/C teams ('1678B') keep their own rows
+    df.index = [registry.key(team_id)[3:] for team_id in df.index]
+    return df
+
 def save_year_data(team_records, year):
     if team_records:
-        df_year = pd.DataFrame.from_dict(team_records, orient='index')
+        df_year = records_frame(team_records)
         df_year['Delta Against'] = df_year['Wins Against'] - df_year['Losses Against']
         df_year['Delta With'] = df_year['Wins With'] - df_year['Losses With']
         df_year.to_csv(os.path.join('vs records', f'team_records_{year}.csv'), index_label='Team')
@@ -98,6 +104,7 @@ def plot_dataframes(df_all):
     plot_dataframe(df_all.sort_values(by='Delta With').head(25), "Bottom 25 Teams by Delta With", 'bottom_25_delta_with.png')
 
 def plot_dataframe(df, title, filename):
+    import matplotlib.pyplot as plt
     fig, ax = plt.subplots(figsize=(10, 8))
     ax.axis('off')
     ax.axis('tight')
@@ -109,6 +116,7 @@ def plot_dataframe(df, title, filename):
     plt.savefig(os.path.join('vs records', filename))
 
 def create_infographic(team_name, team_number, colors, lifetime_wins, lifetime_losses, top_teams):
+    from PIL import Image, ImageDraw, ImageFont
     font_path = 'C:\\Windows\\Fonts\\GOTHICB.ttf'  # Path to your font file
     font_size_team = 50  # Font size for the team name
     font_size_lifetime = 30  # Font size for the lifetime wins
@@ -168,11 +176,14 @@ def create_infographic(team_name, team_number, colors, lifetime_wins, lifetime_l
 
 
 
-def main():
+def main(team=None, years=None):
+    global TEAM
+    if team is not None:
+        TEAM = team
     ensure_folder_exists('vs records')
     team_name, team_colors = fetch_team_data(f'frc{TEAM}')
-    all_time_records = process_matches(tba.team_years(TEAM))
-    df_all = pd.DataFrame.from_dict(all_time_records, orient='index')
+    all_time_records = process_matches(years or tba.team_years(TEAM))
+    df_all = records_frame(all_time_records)
     top_teams = df_all['Total Matches With'].nlargest(5).to_dict()
     print("Top 5 Teams:", top_teams)  # Add this line to check top_teams
     lifetime_wins = df_all['Wins With'].sum()
@@ -1,15 +1,10 @@
-import tbapy
-from dotenv import load_dotenv
 import os
 from tqdm import tqdm
-import requests
 import csv
-
-load_dotenv()
-tba = tbapy.TBA(os.getenv("TBAKEY"))
-API_KEY_YOUTUBE = os.getenv("YT_API_KEY")
+from tba_utils import tba, iter_teams
 
 def get_channel_id_from_custom_url(api_key, custom_url):
+    import requests
     base_url = "https://www.googleapis.com/youtube/v3/channels"
     params = {
         "part": "id",
@@ -26,6 +21,7 @@ def get_channel_id_from_custom_url(api_key, custom_url):
 
 
 def get_channel_id_from_username(api_key, username):
+    import requests
     base_url = "https://www.googleapis.com/youtube/v3/channels"
     params = {
         "part": "id",
@@ -43,6 +39,7 @@ def get_channel_id_from_username(api_key, username):
 
 
 def get_youtube_channel_stats(api_key, channel_id):
+    import requests
     base_url = "https://www.googleapis.com/youtube/v3/channels"
     params = {
         "part": "snippet,statistics",
@@ -69,27 +66,34 @@ def get_youtube_channel_stats(api_key, channel_id):
     else:
         return None
 
-print("Loading teams")
-teams = tba.teams()
-print("loaded teams")
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+    api_key_youtube = os.getenv("YT_API_KEY")
+
+    # Teams are streamed page by page so profile lookups start before the full list arrives
+    teams = iter_teams(tba)
+
+    # Initialize the CSV file with headers
+    with open('youtube_channel_stats.csv', 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['Team', 'Title', 'Published At', 'Subscriber Count', 'View Count', 'Video Count'])
+    print("Initialized CSV file")
 
-# Initialize the CSV file with headers
-with open('youtube_channel_stats.csv', 'w', newline='') as csv_file:
-    writer = csv.writer(csv_file)
-    writer.writerow(['Team', 'Title', 'Published At', 'Subscriber Count', 'View Count', 'Video Count'])
-print("Initialized CSV file")
+    for team in tqdm(teams):
+        team_profile = tba.team_profiles(team.team_number)
+        for profile in team_profile:
+            if profile.type == "youtube-channel":
+                channel_id = get_channel_id_from_username(api_key_youtube, profile.foreign_key)
+                if channel_id:  # Ensure we got a channel ID
+                    result = get_youtube_channel_stats(api_key_youtube, channel_id)
+                    if result:  # Check if we got valid results
+                        # Append the result to the CSV
+                        with open('youtube_channel_stats.csv', 'a', newline='') as csv_file:
+                            writer = csv.writer(csv_file)
+                            writer.writerow([team.team_number, result['title'], result['publishedAt'], result['subscriberCount'], result['viewCount'], result['videoCount']])
 
-for team in tqdm(teams):
-    team_profile = tba.team_profiles(team.team_number)
-    for profile in team_profile:
-        if profile.type == "youtube-channel":
-            channel_id = get_channel_id_from_username(API_KEY_YOUTUBE, profile.foreign_key)
-            if channel_id:  # Ensure we got a channel ID
-                result = get_youtube_channel_stats(API_KEY_YOUTUBE, channel_id)
-                if result:  # Check if we got valid results
-                    # Append the result to the CSV
-                    with open('youtube_channel_stats.csv', 'a', newline='') as csv_file:
-                        writer = csv.writer(csv_file)
-                        writer.writerow([team.team_number, result['title'], result['publishedAt'], result['subscriberCount'], result['viewCount'], result['videoCount']])
+    # print("Done")
 
-# print("Done")
+if __name__ == "__main__":
+    main()